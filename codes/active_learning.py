@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Active-Learning Selection
+Scores unlabeled conveyor frames with the trained detector (the
+DOWNLOAD_LARGE_best.pt exported by 01_swm_large.py) and picks the K most
+uncertain ones for labeling.
+
+Per detection the model gives a confidence p. Each detection's uncertainty is
+either:
+  - entropy: binary entropy of p, in bits (1.0 at p=0.5)
+  - margin:  1 - |p - (1 - p)|, i.e. how close p is to the decision boundary
+Per image the detection values are aggregated (max, mean or sum). Images
+without detections above min_conf count as confidently empty (score 0).
+
+Images are streamed from the folder in batches and only a K-sized min-heap
+is kept, so memory is constant however much footage there is. The
+selection is exported in the <split>/images + <split>/labels layout that
+merge_yolo_datasets.py consumes. Labels hold the model's boxes as
+pre-annotations to correct.
+"""
+
+import heapq
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from checkpoint import atomic_copy, atomic_write_text
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+METHODS = ('entropy', 'margin')
+AGGREGATES = {'max': np.max, 'mean': np.mean, 'sum': np.sum}
+
+
+def iter_images(folder):
+    """Yield image paths under folder (recursive, sorted per directory) without listing it all first"""
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def detection_uncertainty(conf, method='entropy'):
+    """Per-detection uncertainty from confidences (array in [0, 1])"""
+    p = np.clip(np.asarray(conf, np.float64), 1e-7, 1 - 1e-7)
+    if method == 'entropy':
+        return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+    if method == 'margin':
+        return 1 - np.abs(2 * p - 1)
+    raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+
+
+def image_uncertainty(conf, method='entropy', aggregate='max'):
+    if len(conf) == 0:
+        return 0.0
+    return float(AGGREGATES[aggregate](detection_uncertainty(conf, method)))
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def select_uncertain(weights, image_dir, k=500, method='entropy', aggregate='max', min_conf=0.05,
+                     batch=32, imgsz=640, device=None):
+    """
+    Stream images through the model and keep the k most uncertain
+
+    Returns:
+        (selected list of (score, path, boxes) sorted most uncertain first,
+        number of images scored); boxes is an (n, 6) array of
+        [cls, x_center, y_center, w, h, conf] normalized
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    heap = []
+    scored = 0
+    t0 = time.perf_counter()
+    for paths in _batches(iter_images(image_dir), batch):
+        results = model.predict(paths, conf=min_conf, imgsz=imgsz, device=device, verbose=False)
+        for path, result in zip(paths, results):
+            boxes = result.boxes
+            conf = boxes.conf.cpu().numpy()
+            score = image_uncertainty(conf, method, aggregate)
+            scored += 1
+            if len(heap) >= k and score <= heap[0][0]:
+                continue
+            dets = np.column_stack([boxes.cls.cpu().numpy(), boxes.xywhn.cpu().numpy(), conf]).astype(np.float32)
+            # The path breaks score ties so heap items always compare
+            item = (score, path, dets)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heapreplace(heap, item)
+        elapsed = time.perf_counter() - t0
+        print(f"  {scored} images scored ({scored / max(elapsed, 1e-9):.1f} img/s), "
+              f"heap min {heap[0][0] if heap else 0:.3f}", end='\r')
+    print()
+    return sorted(heap, key=lambda item: (-item[0], item[1])), scored
+
+
+def export_selection(selected, image_dir, output_dir, split='train', label_conf=0.25, names=None):
+    """
+    Copy selected images into <output_dir>/<split>/images with pre-annotation labels
+
+    File names are made unique by prefixing their sub-folder path, so the
+    export can be merged with merge_yolo_datasets.py as another dataset.
+    """
+    output_dir = Path(output_dir)
+    images_out = output_dir / split / 'images'
+    labels_out = output_dir / split / 'labels'
+    images_out.mkdir(parents=True, exist_ok=True)
+    labels_out.mkdir(parents=True, exist_ok=True)
+
+    rows = ["image\tsource\tscore\tdetections\tpre_annotations\n"]
+    for score, path, dets in selected:
+        rel = os.path.relpath(path, image_dir)
+        name = rel.replace(os.sep, '_')
+        atomic_copy(path, images_out / name)
+        kept = dets[dets[:, 5] >= label_conf]
+        atomic_write_text(labels_out / f"{os.path.splitext(name)[0]}.txt", ''.join(
+            f"{int(c)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n" for c, x, y, w, h, _ in kept))
+        rows.append(f"{name}\t{os.path.abspath(path)}\t{score:.6f}\t{len(dets)}\t{len(kept)}\n")
+    atomic_write_text(output_dir / 'selection.tsv', ''.join(rows))
+
+    if names:
+        with open(output_dir / 'data.yaml', 'w') as f:
+            f.write("# Active-learning selection (labels are model pre-annotations)\n")
+            f.write(f"{split}: {split}/images\n\n")
+            f.write(f"nc: {len(names)}\n")
+            f.write("names:\n")
+            for idx, class_name in sorted(names.items()):
+                f.write(f"  {idx}: {class_name}\n")
+    return output_dir
+
+
+def active_learning(weights, image_dir, output_dir, k=500, method='entropy', aggregate='max',
+                    min_conf=0.05, label_conf=0.25, batch=32, imgsz=640, split='train', device=None):
+    """Score an unlabeled folder and export the k most uncertain images for labeling"""
+    from ultralytics import YOLO
+
+    print("="*70)
+    print("Active-Learning Selection")
+    print("="*70)
+    print(f"Model:  {weights}")
+    print(f"Images: {image_dir}")
+    print(f"Score:  {aggregate} {method} over detections >= {min_conf}, keep top {k}\n")
+
+    selected, scored = select_uncertain(weights, image_dir, k, method, aggregate, min_conf,
+                                        batch, imgsz, device)
+    names = YOLO(weights).names
+    export_selection(selected, image_dir, output_dir, split, label_conf, names)
+
+    scores = np.array([s for s, _, _ in selected])
+    print(f"\n✓ Selected {len(selected)} of {scored} images -> {output_dir}")
+    if len(scores):
+        print(f"  Uncertainty: max {scores.max():.3f}, min {scores.min():.3f}, mean {scores.mean():.3f}")
+    print(f"  Pre-annotations: {sum(int((d[:, 5] >= label_conf).sum()) for _, _, d in selected)} boxes "
+          f"(conf >= {label_conf})")
+    print(f"\nAfter correcting the labels, add {output_dir} to merge_yolo_datasets() "
+          f"as another dataset (e.g. named 'al')")
+    return selected
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pick the most uncertain unlabeled frames for labeling")
+    parser.add_argument('weights', help="trained detector, e.g. DOWNLOAD_LARGE_best.pt")
+    parser.add_argument('images', help="folder of unlabeled images (searched recursively)")
+    parser.add_argument('output', help="export folder (<split>/images + labels)")
+    parser.add_argument('-k', type=int, default=500, help="images to select")
+    parser.add_argument('--method', choices=METHODS, default='entropy')
+    parser.add_argument('--aggregate', choices=list(AGGREGATES), default='max')
+    parser.add_argument('--min-conf', type=float, default=0.05, help="detections considered for uncertainty")
+    parser.add_argument('--label-conf', type=float, default=0.25, help="detections written as pre-annotations")
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--split', default='train')
+    parser.add_argument('--device', default=None)
+    args = parser.parse_args()
+
+    active_learning(args.weights, args.images, args.output, args.k, args.method, args.aggregate,
+                    args.min_conf, args.label_conf, args.batch, args.imgsz, args.split, args.device)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Columnar Annotation Table
+Exports every label line of a YOLO dataset into one zstd-compressed Parquet
+file (<dataset>/annotations.parquet), one row per annotation:
+
+    image       file name (dictionary encoded, like split/source/class_name)
+    split       '' for a flat layout
+    source      source dataset from provenance.db, else the filename prefix
+    class_id    int16, null for an image without labels (one row per negative)
+    class_name  from classes.txt / data.yaml
+    x y w h     float32 normalized box; polygons store their extent
+    polygon     list<float32> x1 y1 x2 y2 ..., null for box labels
+
+Analytics then run on the columnar engine instead of re-parsing text, e.g.
+box size per source or objects per image by class (see `summary`).
+sampling_weights.py and model_training/evaluate.py read their labels from
+the table when it is up to date, i.e. when the image and label file counts
+and the labels' total size and newest mtime still match its metadata.
+
+pyarrow is optional: without it export fails with an install hint and the
+readers fall back to the label files.
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from dataset_diff import class_names, index_dataset
+from sampling_weights import image_sources
+
+FILENAME = 'annotations.parquet'
+ROW_GROUP_SIZE = 100_000
+
+
+def _pyarrow():
+    """(pyarrow, pyarrow.parquet), or None when pyarrow is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow, pyarrow.parquet
+
+
+def table_path(dataset_root):
+    return os.path.join(dataset_root, FILENAME)
+
+
+def labels_signature(index):
+    """(images, label files, total label bytes, newest label mtime) of an index_dataset() result"""
+    images = files = size = 0
+    newest = 0.0
+    for image, _, label in index.values():
+        images += image is not None
+        if label is not None:
+            stat = os.stat(label)
+            files += 1
+            size += stat.st_size
+            newest = max(newest, stat.st_mtime)
+    return [images, files, size, round(newest, 6)]
+
+
+def _schema(pa):
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('image', text), ('split', text), ('source', text),
+        ('class_id', pa.int16()), ('class_name', text),
+        ('x', pa.float32()), ('y', pa.float32()), ('w', pa.float32()), ('h', pa.float32()),
+        ('polygon', pa.list_(pa.float32())),
+    ])
+
+
+class _Columns:
+    """Row buffer for one row group, flushed as Arrow arrays"""
+
+    def __init__(self):
+        self.image, self.split, self.source, self.class_id, self.class_name = [], [], [], [], []
+        self.boxes = []
+        self.poly_values, self.poly_offsets, self.poly_null = [], [0], []
+
+    def __len__(self):
+        return len(self.image)
+
+    def add(self, image, split, source, class_id, class_name, box, polygon):
+        self.image.append(image)
+        self.split.append(split)
+        self.source.append(source)
+        self.class_id.append(class_id)
+        self.class_name.append(class_name)
+        self.boxes.append(box)
+        if polygon is not None:
+            self.poly_values.append(polygon)
+        self.poly_offsets.append(self.poly_offsets[-1] + (len(polygon) if polygon is not None else 0))
+        self.poly_null.append(polygon is None)
+
+    def to_batch(self, pa, schema):
+        boxes = np.array(self.boxes, np.float32).reshape(-1, 4)
+        values = (np.concatenate(self.poly_values).astype(np.float32) if self.poly_values
+                  else np.zeros(0, np.float32))
+        polygon = pa.ListArray.from_arrays(pa.array(self.poly_offsets, pa.int32()), pa.array(values),
+                                           mask=pa.array(self.poly_null))
+        text = [pa.array(col, pa.string()).dictionary_encode()
+                for col in (self.image, self.split, self.source)]
+        return pa.RecordBatch.from_arrays(
+            text + [pa.array(self.class_id, pa.int16()),
+                    pa.array(self.class_name, pa.string()).dictionary_encode()]
+            + [pa.array(boxes[:, i]) for i in range(4)] + [polygon],
+            schema=schema)
+
+
+def export_annotations(dataset_root, output=None, compression='zstd'):
+    """
+    Write one Parquet row per annotation (and per negative image) of a YOLO dataset
+
+    Args:
+        dataset_root: Flat or split YOLO dataset
+        output: Parquet file (default: <dataset_root>/annotations.parquet)
+        compression: Parquet codec (zstd, snappy, gzip, none)
+
+    Returns:
+        Output path
+    """
+    modules = _pyarrow()
+    if modules is None:
+        print("❌ pyarrow is not installed: pip install pyarrow")
+        sys.exit(1)
+    pa, pq = modules
+
+    output = output or table_path(dataset_root)
+    index = index_dataset(dataset_root)
+    names = class_names(dataset_root)
+    keys = sorted(index, key=lambda key: (key[0], key[1]))
+    image_names = [os.path.basename(index[key][0]) if index[key][0] else f"{key[1]}" for key in keys]
+    sources = image_sources(dataset_root, image_names)
+    schema = _schema(pa).with_metadata({
+        'dataset': os.path.abspath(dataset_root),
+        'labels_signature': json.dumps(labels_signature(index)),
+        'names': json.dumps(names),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+
+    print("="*60)
+    print("ANNOTATION TABLE EXPORT")
+    print("="*60)
+    print(f"Dataset: {os.path.abspath(dataset_root)} ({len(keys)} images)")
+
+    t0 = time.perf_counter()
+    rows = negatives = 0
+    tmp = f"{output}.tmp"
+    with pq.ParquetWriter(tmp, schema, compression=compression) as writer:
+        columns = _Columns()
+        for key, image, source in zip(keys, image_names, sources):
+            split = key[0]
+            label = index[key][2]
+            empty = True
+            if label is not None:
+                with open(label) as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) < 5:
+                            continue
+                        cls = int(parts[0])
+                        values = np.asarray(parts[1:], np.float32)
+                        if len(values) == 4:
+                            box, polygon = values, None
+                        else:
+                            polygon = values[:len(values) // 2 * 2]
+                            xy = polygon.reshape(-1, 2)
+                            lo, hi = xy.min(0), xy.max(0)
+                            box = np.concatenate([(lo + hi) / 2, hi - lo])
+                        columns.add(image, split, source, cls, names[cls] if cls < len(names) else str(cls),
+                                    box, polygon)
+                        empty = False
+            if empty:
+                columns.add(image, split, source, None, None, (np.nan,) * 4, None)
+                negatives += 1
+            if len(columns) >= ROW_GROUP_SIZE:
+                rows += len(columns)
+                writer.write_batch(columns.to_batch(pa, schema))
+                columns = _Columns()
+        if len(columns):
+            rows += len(columns)
+            writer.write_batch(columns.to_batch(pa, schema))
+    os.replace(tmp, output)
+
+    seconds = time.perf_counter() - t0
+    print(f"✓ {rows - negatives} annotations + {negatives} negative images in {seconds:.1f}s "
+          f"-> {output} ({os.path.getsize(output) / 1024:.0f} KB, {compression})")
+    return output
+
+
+def load_annotations(dataset_root, columns=None, filters=None, check=True):
+    """
+    Read the annotation table of a dataset as a pyarrow Table
+
+    Returns None when pyarrow is missing, the table was never exported, or
+    (with check) the label files changed since it was written, so callers
+    can fall back to parsing the label files.
+    """
+    modules = _pyarrow()
+    path = table_path(dataset_root)
+    if modules is None or not os.path.exists(path):
+        return None
+    _, pq = modules
+    if check:
+        meta = pq.read_schema(path).metadata or {}
+        stored = json.loads(meta.get(b'labels_signature', b'null'))
+        if stored != labels_signature(index_dataset(dataset_root)):
+            print(f"⚠ {path} is older than the label files, reading labels instead "
+                  "(re-run annotation_table.py export)")
+            return None
+    return pq.read_table(path, columns=columns, filters=filters)
+
+
+def _keys(table):
+    """(split, image) per row; to_numpy is much faster than to_pylist on dictionary columns"""
+    return zip(table.column('split').to_numpy(zero_copy_only=False).tolist(),
+               table.column('image').to_numpy(zero_copy_only=False).tolist())
+
+
+def image_classes(table):
+    """{(split, image name): set of class ids} from an annotation table"""
+    import pyarrow.compute as pc
+
+    classes = {}
+    for key, class_id in zip(_keys(table), pc.fill_null(table.column('class_id'), -1).to_numpy().tolist()):
+        found = classes.setdefault(key, set())
+        if class_id >= 0:
+            found.add(class_id)
+    return classes
+
+
+def image_boxes(table):
+    """{(split, image name): (class ids int16, xyxy float32)} from an annotation table"""
+    import pyarrow.compute as pc
+
+    columns = {name: table.column(name).to_numpy(zero_copy_only=False) for name in ('x', 'y', 'w', 'h')}
+    class_id = pc.fill_null(table.column('class_id'), -1).to_numpy()
+    labelled = ~np.isnan(columns['x'])
+    xyxy = np.stack([columns['x'] - columns['w'] / 2, columns['y'] - columns['h'] / 2,
+                     columns['x'] + columns['w'] / 2, columns['y'] + columns['h'] / 2], axis=1)
+    rows = {}
+    for i, key in enumerate(_keys(table)):
+        rows.setdefault(key, [])
+        if labelled[i]:
+            rows[key].append(i)
+    return {key: (class_id[idx].astype(np.int16), xyxy[idx].astype(np.float32).reshape(-1, 4))
+            for key, idx in rows.items()}
+
+
+def summary(dataset_root, by='source'):
+    """Annotations, objects per image and box size quantiles per class and `by` column"""
+    table = load_annotations(dataset_root, check=False)
+    if table is None:
+        print(f"❌ No readable {table_path(dataset_root)} (export it first; needs pyarrow)")
+        sys.exit(1)
+    import pyarrow.compute as pc
+
+    labelled = table.filter(pc.is_valid(table.column('class_id')))
+    print(f"{table_path(dataset_root)}: {labelled.num_rows} annotations, "
+          f"{table.group_by(['split', 'image']).aggregate([]).num_rows} images\n")
+
+    # Group results are small: sorted in Python (Arrow cannot sort dictionary columns)
+    counts = labelled.group_by([by, 'class_name']).aggregate([('x', 'count')]).to_pylist()
+    per_image = (labelled.group_by(['split', 'image', 'class_name']).aggregate([('x', 'count')])
+                 .group_by('class_name').aggregate([('x_count', 'mean'), ('x_count', 'max')]).to_pylist())
+    sized = labelled.append_column('area', pc.multiply(labelled.column('w'), labelled.column('h')))
+    areas = sized.group_by(by).aggregate([('area', 'approximate_median'), ('area', 'mean'),
+                                          ('area', 'min'), ('area', 'max')]).to_pylist()
+
+    print(f"Annotations per {by} and class:")
+    for row in sorted(counts, key=lambda r: (r[by], r['class_name'])):
+        print(f"  {row[by]:<16} {row['class_name']:<16} {row['x_count']:>8}")
+    print("\nObjects per image (images containing the class):")
+    for row in sorted(per_image, key=lambda r: r['class_name']):
+        print(f"  {row['class_name']:<16} mean {row['x_count_mean']:6.2f}  max {row['x_count_max']:>4}")
+    print(f"\nBox area (fraction of image) per {by}:")
+    for row in sorted(areas, key=lambda r: r[by]):
+        print(f"  {row[by]:<16} median {row['area_approximate_median']:.4f}  mean {row['area_mean']:.4f}  "
+              f"min {row['area_min']:.5f}  max {row['area_max']:.4f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Columnar (Parquet) annotation table for a YOLO dataset")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="write <dataset>/annotations.parquet")
+    export.add_argument('dataset')
+    export.add_argument('--output', default=None)
+    export.add_argument('--compression', default='zstd')
+    summarize = sub.add_parser('summary', help="per-class counts, objects per image, box sizes")
+    summarize.add_argument('dataset')
+    summarize.add_argument('--by', default='source', choices=['source', 'split'])
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_annotations(args.dataset, args.output, args.compression)
+    else:
+        summary(args.dataset, args.by)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Offline Augmentation Cache
+Precomputes K augmented variants of every training image, so the HSV /
+rotation / translation / scale / flip augmentation listed in data.yaml is
+paid for once instead of on the trainer's CPU workers every epoch.
+
+Per variant (seeded by image name + variant index, so re-runs are identical):
+  - random affine: rotation +-degrees, scale 1 +- scale, translation +-translate
+    (same parameterisation as YOLOv8's random_perspective), grey border
+  - horizontal flip with probability fliplr
+  - HSV gains hsv_h / hsv_s / hsv_v via lookup tables
+Box labels are transformed by their four corners and dropped when less than
+10% of the box stays in the image; polygon labels are transformed point by
+point and clipped to the image.
+
+Variants are written by a process pool into shards of shard_size samples:
+
+    <output>/shard_00000/images + labels
+    <output>/index.tsv          variant -> shard, source image, variant index
+    <output>/train_augmented.txt  originals + all variants
+    <output>/data.yaml          trains on that list; val/test point at the source
+
+The generated data.yaml records the precomputed parameters under
+precomputed_augmentation; model_training/train.py then switches the same
+online augmentations off. Mosaic stays online (it mixes images).
+"""
+
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from checkpoint import ProgressJournal, atomic_write_bytes, atomic_write_text
+from pipeline_metrics import PipelineMetrics, get_metrics
+from relocate import list_entry, relative_path
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+AUGMENT_KEYS = ('hsv_h', 'hsv_s', 'hsv_v', 'degrees', 'translate', 'scale', 'fliplr')
+DEFAULT_AUGMENT = {'hsv_h': 0.015, 'hsv_s': 0.7, 'hsv_v': 0.4, 'degrees': 0.0, 'translate': 0.1,
+                   'scale': 0.5, 'fliplr': 0.5}
+BORDER_VALUE = (114, 114, 114)
+
+
+# ---------------------------------------------------------------------------
+# Transforms
+# ---------------------------------------------------------------------------
+
+def augment_hsv(image, rng, hgain, sgain, vgain):
+    """Random HSV gains applied through lookup tables (in place on a copy)"""
+    if not (hgain or sgain or vgain):
+        return image
+    r = rng.uniform(-1, 1, 3) * [hgain, sgain, vgain] + 1
+    hue, sat, val = cv2.split(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
+    x = np.arange(256, dtype=r.dtype)
+    lut_hue = ((x * r[0]) % 180).astype(np.uint8)
+    lut_sat = np.clip(x * r[1], 0, 255).astype(np.uint8)
+    lut_val = np.clip(x * r[2], 0, 255).astype(np.uint8)
+    hsv = cv2.merge((cv2.LUT(hue, lut_hue), cv2.LUT(sat, lut_sat), cv2.LUT(val, lut_val)))
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def random_affine_matrix(width, height, rng, degrees, translate, scale):
+    """2x3 pixel affine: rotate/scale about the centre, then translate"""
+    centre = np.eye(3)
+    centre[0, 2], centre[1, 2] = -width / 2, -height / 2
+    rotate = np.eye(3)
+    rotate[:2] = cv2.getRotationMatrix2D((0, 0), rng.uniform(-degrees, degrees),
+                                         rng.uniform(1 - scale, 1 + scale))
+    shift = np.eye(3)
+    shift[0, 2] = rng.uniform(0.5 - translate, 0.5 + translate) * width
+    shift[1, 2] = rng.uniform(0.5 - translate, 0.5 + translate) * height
+    return (shift @ rotate @ centre)[:2]
+
+
+def parse_labels(text):
+    """Split label lines into (class, box xywhn) and (class, polygon Nx2 normalized) lists"""
+    boxes, polygons = [], []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 5:
+            boxes.append((int(parts[0]), np.array(parts[1:], np.float64)))
+        elif len(parts) > 5 and len(parts) % 2 == 1:
+            polygons.append((int(parts[0]), np.array(parts[1:], np.float64).reshape(-1, 2)))
+    return boxes, polygons
+
+
+def transform_boxes(boxes, matrix, width, height, flip, min_visible=0.1, min_size=2):
+    """Affine + flip for (class, xywhn) boxes; boxes mostly pushed out of the image are dropped"""
+    out = []
+    for cls, (x, y, w, h) in boxes:
+        x1, y1, x2, y2 = (x - w / 2) * width, (y - h / 2) * height, (x + w / 2) * width, (y + h / 2) * height
+        corners = np.array([[x1, y1, 1], [x2, y1, 1], [x2, y2, 1], [x1, y2, 1]]) @ matrix.T
+        nx1, ny1 = corners.min(0)
+        nx2, ny2 = corners.max(0)
+        full_area = (nx2 - nx1) * (ny2 - ny1)
+        cx1, cy1 = np.clip([nx1, ny1], 0, [width, height])
+        cx2, cy2 = np.clip([nx2, ny2], 0, [width, height])
+        if cx2 - cx1 < min_size or cy2 - cy1 < min_size or (cx2 - cx1) * (cy2 - cy1) < min_visible * full_area:
+            continue
+        bx, by = (cx1 + cx2) / 2 / width, (cy1 + cy2) / 2 / height
+        if flip:
+            bx = 1 - bx
+        out.append(f"{cls} {bx:.6f} {by:.6f} {(cx2 - cx1) / width:.6f} {(cy2 - cy1) / height:.6f}\n")
+    return out
+
+
+def transform_polygons(polygons, matrix, width, height, flip, min_size=2):
+    """Affine + flip for (class, Nx2 normalized) polygons, clipped to the image"""
+    out = []
+    for cls, points in polygons:
+        pixels = np.column_stack([points * [width, height], np.ones(len(points))]) @ matrix.T
+        pixels = np.clip(pixels, 0, [width, height])
+        if np.ptp(pixels[:, 0]) < min_size or np.ptp(pixels[:, 1]) < min_size:
+            continue
+        normalized = pixels / [width, height]
+        if flip:
+            normalized[:, 0] = 1 - normalized[:, 0]
+        out.append(f"{cls} " + " ".join(f"{v:.6f}" for v in normalized.reshape(-1)) + "\n")
+    return out
+
+
+def augment_sample(image, label_text, rng, params):
+    """One augmented (image, label text) variant"""
+    height, width = image.shape[:2]
+    matrix = random_affine_matrix(width, height, rng, params['degrees'], params['translate'], params['scale'])
+    flip = rng.random() < params['fliplr']
+    out = cv2.warpAffine(image, matrix, (width, height), borderValue=BORDER_VALUE)
+    if flip:
+        out = cv2.flip(out, 1)
+    out = augment_hsv(out, rng, params['hsv_h'], params['hsv_s'], params['hsv_v'])
+    boxes, polygons = parse_labels(label_text)
+    lines = transform_boxes(boxes, matrix, width, height, flip)
+    lines += transform_polygons(polygons, matrix, width, height, flip)
+    return out, ''.join(lines)
+
+
+# ---------------------------------------------------------------------------
+# Sharded store
+# ---------------------------------------------------------------------------
+
+def build_shard(shard_dir, items, k, params, seed=0, jpeg_quality=95):
+    """
+    Write k variants of every (image, label) pair into one shard (process pool worker)
+
+    Returns:
+        (index rows, worker metrics)
+    """
+    metrics = PipelineMetrics('augment_cache.worker')
+    images_dir = os.path.join(shard_dir, 'images')
+    labels_dir = os.path.join(shard_dir, 'labels')
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(labels_dir, exist_ok=True)
+    encode = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+
+    rows = []
+    for image_path, label_path in items:
+        with metrics.stage('image_decode'):
+            image = cv2.imread(image_path)
+        if image is None:
+            metrics.count('unreadable_images')
+            continue
+        label_text = ''
+        if os.path.exists(label_path):
+            with open(label_path) as f:
+                label_text = f.read()
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        name_seed = zlib.crc32(stem.encode())
+        for variant in range(k):
+            rng = np.random.default_rng([seed, name_seed, variant])
+            with metrics.stage('augment'):
+                out, text = augment_sample(image, label_text, rng, params)
+            name = f"{stem}_aug{variant}"
+            with metrics.stage('image_write'):
+                ok, encoded = cv2.imencode('.jpg', out, encode)
+                atomic_write_bytes(os.path.join(images_dir, f"{name}.jpg"), encoded.tobytes())
+            metrics.count('image_write_bytes', len(encoded))
+            metrics.write_text(os.path.join(labels_dir, f"{name}.txt"), text)
+            rows.append(f"{name}.jpg\t{os.path.basename(shard_dir)}\t{image_path}\t{variant}\n")
+    return rows, metrics.as_dict()
+
+
+def _shard_task(args):
+    return args[0], build_shard(*args)
+
+
+def augmentation_params(data_yaml, overrides=None):
+    """Augmentation settings from a data.yaml (missing keys use YOLOv8 defaults)"""
+    import yaml
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f) or {}
+    params = {key: float(data.get(key, DEFAULT_AUGMENT[key])) for key in AUGMENT_KEYS}
+    params.update({k: float(v) for k, v in (overrides or {}).items() if k in AUGMENT_KEYS})
+    return params
+
+
+def build_augment_cache(dataset_root, output_dir, k=4, split='train', shard_size=1000, workers=None,
+                        seed=0, jpeg_quality=95, overrides=None):
+    """
+    Precompute k augmented variants per image of a split into a sharded store
+
+    Args:
+        dataset_root: YOLO dataset with <split>/images + labels and a data.yaml
+        output_dir: Store folder (shards, index.tsv, train list, data.yaml)
+        k: Variants per image
+        shard_size: Source images per shard (a shard holds k x shard_size variants)
+        workers: Process pool size (default: CPU count)
+        seed: Changes every variant while keeping re-runs identical
+        overrides: Dict overriding augmentation parameters from data.yaml
+
+    Returns:
+        Path to the generated data.yaml
+    """
+    import yaml
+
+    dataset_root = Path(dataset_root).resolve()
+    output_dir = Path(output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    params = augmentation_params(dataset_root / 'data.yaml', overrides)
+    metrics = get_metrics('augment_cache').start(
+        dataset=str(dataset_root), k=k, shard_size=shard_size, seed=seed, **params)
+
+    images_dir = dataset_root / split / 'images'
+    labels_dir = dataset_root / split / 'labels'
+    with metrics.stage('file_discovery'):
+        images = sorted(e.path for e in os.scandir(images_dir)
+                        if os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS)
+    items = [(path, str(labels_dir / f"{Path(path).stem}.txt")) for path in images]
+    shards = [(str(output_dir / f"shard_{i // shard_size:05d}"), items[i:i + shard_size])
+              for i in range(0, len(items), shard_size)]
+
+    print("="*60)
+    print("OFFLINE AUGMENTATION CACHE")
+    print("="*60)
+    print(f"Source: {images_dir} ({len(images)} images)")
+    print(f"Variants: {k} per image -> {len(images) * k} samples in {len(shards)} shards")
+    print("Params: " + ', '.join(f"{key}={value:g}" for key, value in params.items()))
+
+    # One entry per shard, each worth minutes of work: commit every one
+    with ProgressJournal(output_dir, 'augment_cache', flush_every=1) as journal:
+        index_rows = {}
+        for shard_dir, _ in shards:
+            done = journal.get(os.path.basename(shard_dir))
+            if done is not None:
+                index_rows[shard_dir] = [row + '\n' for row in done.split('\x1f') if row]
+        if index_rows:
+            print(f"↻ Resuming: {len(index_rows)} shards already written "
+                  f"({journal.stale_temp_files} partial files cleaned up)")
+
+        t0 = time.perf_counter()
+        todo = [(shard_dir, chunk, k, params, seed, jpeg_quality) for shard_dir, chunk in shards
+                if shard_dir not in index_rows]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_shard_task, task) for task in todo]
+            for future in as_completed(futures):
+                shard_dir, (rows, worker_metrics) = future.result()
+                metrics.merge(worker_metrics)
+                index_rows[shard_dir] = rows
+                journal.mark(os.path.basename(shard_dir), '\x1f'.join(row.rstrip('\n') for row in rows))
+                done = sum(len(r) for r in index_rows.values())
+                print(f"  {len(index_rows)}/{len(shards)} shards, {done} variants "
+                      f"({done / max(time.perf_counter() - t0, 1e-9):.0f}/s)", end='\r')
+        print()
+
+        rows = ["variant\tshard\tsource\tindex\n"]
+        variant_paths = []
+        for shard_dir, _ in shards:
+            for row in index_rows[shard_dir]:
+                rows.append(row)
+                variant_paths.append(os.path.join(shard_dir, 'images', row.split('\t', 1)[0]))
+        atomic_write_text(output_dir / 'index.tsv', ''.join(rows))
+        list_path = output_dir / f"{split}_augmented.txt"
+        atomic_write_text(list_path, ''.join(f"{list_entry(p, output_dir)}\n" for p in images + variant_paths))
+
+        with open(dataset_root / 'data.yaml') as f:
+            data = yaml.safe_load(f)
+        for key in ('train', 'val', 'test'):
+            if key in data:
+                data[key] = relative_path(dataset_root / data[key], output_dir)
+        for key in AUGMENT_KEYS:
+            data.pop(key, None)
+        # Paths relative to this folder: relocatable when moved together with dataset_root
+        data.pop('path', None)
+        data[split] = list_path.name
+        data['precomputed_augmentation'] = params
+        yaml_path = output_dir / 'data.yaml'
+        with open(yaml_path, 'w') as f:
+            f.write(f"# {split} images + {k} precomputed augmented variants each (see index.tsv)\n")
+            yaml.safe_dump(data, f, sort_keys=False)
+
+    seconds = time.perf_counter() - t0
+    metrics.count('variants', len(variant_paths))
+    metrics.finish()
+    print(f"\n✓ {len(variant_paths)} variants in {seconds:.1f}s -> {output_dir}")
+    print(f"  Train list: {list_path} ({len(images) + len(variant_paths)} samples per epoch)")
+    print(f"  Data:       {yaml_path}")
+    print(f"  An epoch now covers {k + 1}x the images; divide epochs by {k + 1} for the same step count")
+    return yaml_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute augmented training variants into a sharded store")
+    parser.add_argument('dataset', help="YOLO dataset root with <split>/images+labels and data.yaml")
+    parser.add_argument('output', help="store folder")
+    parser.add_argument('-k', type=int, default=4, help="variants per image")
+    parser.add_argument('--split', default='train')
+    parser.add_argument('--shard-size', type=int, default=1000, help="source images per shard")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jpeg-quality', type=int, default=95)
+    for key in AUGMENT_KEYS:
+        parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=float, default=None,
+                            help="override the data.yaml value")
+    args = parser.parse_args()
+
+    overrides = {key: getattr(args, key) for key in AUGMENT_KEYS if getattr(args, key) is not None}
+    build_augment_cache(args.dataset, args.output, args.k, args.split, args.shard_size, args.workers,
+                        args.seed, args.jpeg_quality, overrides)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+Generates synthetic ZeroWaste (COCO) and WaRP (YOLO) datasets offline and runs
+convert -> copy-paste -> remap -> merge -> merge+transform -> split -> stats
+end to end.
+
+Each stage runs in a fresh process so peak memory is per stage. Results
+(throughput, peak RSS, I/O bytes, per-step timers from pipeline_metrics) are
+appended to a JSON-lines file keyed by commit and config, so runs can be
+compared across commits.
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import math
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from pipeline_metrics import git_commit
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CONVERT_SCRIPT = REPO_ROOT / 'original_datasets' / 'zerowaste-f-final' / 'convert_to_yolo.py'
+REMAP_SCRIPT = REPO_ROOT / 'original_datasets' / 'warp' / 'remap.py'
+
+ZW_CATEGORIES = ['rigid_plastic', 'cardboard', 'metal', 'soft_plastic']
+WARP_NUM_CLASSES = 28
+
+STAGES = ['convert', 'copy_paste', 'remap', 'merge', 'merge_transform', 'split', 'stats']
+
+
+def _load_script(path):
+    """
+    Import a pipeline script that lives outside codes/ by file path
+
+    It is imported under its own module name so process pool workers can
+    unpickle its functions.
+    """
+    sys.path.insert(0, str(path.parent))
+    return importlib.import_module(path.stem)
+
+
+def _encoded_image(width, height, ext, seed):
+    """Encode one noise image; its bytes are reused for every synthetic file"""
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode(ext, img)
+    if not ok:
+        raise RuntimeError(f"Could not encode synthetic {ext} image")
+    return buf.tobytes()
+
+
+def _random_polygon(rng, width, height, vertices):
+    """Star-shaped polygon with the given vertex count, in pixel coordinates"""
+    cx, cy = rng.uniform(0.1, 0.9) * width, rng.uniform(0.1, 0.9) * height
+    radius = rng.uniform(0.02, 0.15) * min(width, height)
+    angles = np.sort(rng.uniform(0, 2 * math.pi, vertices))
+    radii = radius * rng.uniform(0.6, 1.0, vertices)
+    xs = np.clip(cx + radii * np.cos(angles), 0, width - 1)
+    ys = np.clip(cy + radii * np.sin(angles), 0, height - 1)
+    return np.stack([xs, ys], axis=1)
+
+
+def generate_zerowaste(root, images, objects, vertices, width, height, seed=0):
+    """
+    Write a synthetic ZeroWaste-style COCO dataset: <split>/labels.json + <split>/data/
+
+    About one annotation in ten is split into two parts to exercise the
+    multi-polygon path of convert_to_yolo.
+    """
+    rng = np.random.default_rng(seed)
+    image_bytes = _encoded_image(width, height, '.png', seed)
+    split_sizes = {'train': int(images * 0.7), 'val': int(images * 0.15)}
+    split_sizes['test'] = images - sum(split_sizes.values())
+
+    ann_id = 0
+    for split, count in split_sizes.items():
+        data_dir = root / split / 'data'
+        data_dir.mkdir(parents=True, exist_ok=True)
+        coco = {
+            'categories': [{'id': i + 1, 'name': n, 'supercategory': ''} for i, n in enumerate(ZW_CATEGORIES)],
+            'images': [],
+            'annotations': [],
+        }
+        for img_id in range(count):
+            file_name = f"{split}_frame_{img_id:06d}.PNG"
+            (data_dir / file_name).write_bytes(image_bytes)
+            coco['images'].append({'id': img_id, 'file_name': file_name, 'width': width, 'height': height})
+            for _ in range(objects):
+                poly = _random_polygon(rng, width, height, vertices)
+                if rng.random() < 0.1 and vertices >= 6:
+                    half = vertices // 2
+                    segmentation = [poly[:half].reshape(-1).tolist(), poly[half:].reshape(-1).tolist()]
+                else:
+                    segmentation = [poly.reshape(-1).tolist()]
+                x0, y0 = poly.min(0)
+                x1, y1 = poly.max(0)
+                coco['annotations'].append({
+                    'id': ann_id, 'image_id': img_id,
+                    'category_id': int(rng.integers(1, len(ZW_CATEGORIES) + 1)),
+                    'bbox': [float(x0), float(y0), float(x1 - x0), float(y1 - y0)],
+                    'segmentation': segmentation, 'area': float((x1 - x0) * (y1 - y0)), 'iscrowd': 0,
+                })
+                ann_id += 1
+        with open(root / split / 'labels.json', 'w') as f:
+            json.dump(coco, f)
+
+
+def generate_warp(root, images, objects, width, height, seed=0):
+    """Write a synthetic WaRP-style YOLO bbox dataset with train/ and test/ splits"""
+    rng = np.random.default_rng(seed + 1)
+    image_bytes = _encoded_image(width, height, '.jpg', seed)
+    split_sizes = {'train': int(images * 0.8)}
+    split_sizes['test'] = images - split_sizes['train']
+
+    for split, count in split_sizes.items():
+        images_dir = root / split / 'images'
+        labels_dir = root / split / 'labels'
+        images_dir.mkdir(parents=True, exist_ok=True)
+        labels_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(count):
+            (images_dir / f"warp_{i:06d}.jpg").write_bytes(image_bytes)
+            boxes = rng.uniform(0.05, 0.3, (objects, 2))
+            centers = rng.uniform(0.2, 0.8, (objects, 2))
+            classes = rng.integers(0, WARP_NUM_CLASSES, objects)
+            lines = [f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n"
+                     for c, (x, y), (w, h) in zip(classes, centers, boxes)]
+            (labels_dir / f"warp_{i:06d}.txt").write_text(''.join(lines))
+
+
+def dataset_stats(root):
+    """Single pass over a split YOLO dataset: images, boxes and per-class counts"""
+    stats = {'images': 0, 'boxes': 0, 'negatives': 0, 'classes': {}}
+    for labels_dir in sorted(Path(root).glob('*/labels')):
+        for label_file in labels_dir.iterdir():
+            if label_file.suffix != '.txt':
+                continue
+            stats['images'] += 1
+            boxes = 0
+            with open(label_file) as f:
+                for line in f:
+                    parts = line.split()
+                    if not parts:
+                        continue
+                    stats['classes'][parts[0]] = stats['classes'].get(parts[0], 0) + 1
+                    boxes += 1
+            stats['boxes'] += boxes
+            if boxes == 0:
+                stats['negatives'] += 1
+    return stats
+
+
+def _dir_size(path):
+    total = files = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+            files += 1
+    return files, total
+
+
+def _proc_io():
+    """Syscall-level read/write byte counters (Linux only)"""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _run_stage(stage, workdir, metrics_path, result_path, workers, seed=0):
+    """Run one pipeline stage inside a fresh process and record its resource usage"""
+    import contextlib
+    import io
+    import resource
+
+    os.chdir(workdir)
+    os.environ['SWM_METRICS'] = metrics_path
+    read0, write0 = _proc_io()
+    t0 = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        if stage == 'convert':
+            _load_script(CONVERT_SCRIPT).create_yolo_dataset('zerowaste-f-final', 'zerowaste_yolo', workers=workers)
+            items = 'zerowaste_yolo'
+        elif stage == 'copy_paste':
+            from copy_paste import copy_paste_dataset
+            copy_paste_dataset('zerowaste_yolo', 'copy_paste_yolo',
+                               count=len(os.listdir('zerowaste_yolo/train/images')), workers=workers, seed=seed)
+            items = 'copy_paste_yolo/train'
+        elif stage == 'remap':
+            _load_script(REMAP_SCRIPT).remap_warp_to_4_classes('warp', 'warp_remapped')
+            items = 'warp_remapped'
+        elif stage == 'merge':
+            from merge_yolo_datasets import merge_yolo_datasets
+            merge_yolo_datasets(['zerowaste_yolo', 'warp_remapped'], 'merged_dataset', ['zerowaste', 'warp'])
+            items = 'merged_dataset'
+        elif stage == 'merge_transform':
+            import merge_datasets
+            merge_datasets.merge_and_transform()
+            items = 'swm_final'
+        elif stage == 'split':
+            import split_dataset
+            # Seeded here: each stage runs in its own spawned process
+            split_dataset.split_dataset(seed=seed)
+            items = 'swm_final_split'
+        elif stage == 'stats':
+            dataset_stats('swm_final_split')
+            items = 'swm_final_split'
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+
+    seconds = time.perf_counter() - t0
+    read1, write1 = _proc_io()
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    images = sum(1 for p in Path(items).rglob('*') if p.suffix.lower() in ('.jpg', '.png'))
+
+    result = {
+        'stage': stage,
+        'seconds': round(seconds, 4),
+        'images': images,
+        'images_per_sec': round(images / seconds, 2) if seconds > 0 else None,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': round(max(self_usage.ru_maxrss, child_usage.ru_maxrss) / 1024, 1),
+        'read_bytes': None if read0 is None else read1 - read0,
+        'write_bytes': None if write0 is None else write1 - write0,
+    }
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+def run_benchmark(images=200, objects=6, vertices=24, width=1920, height=1080,
+                  workers=None, stages=None, workdir=None, output='benchmark_results.jsonl',
+                  keep=False, seed=0):
+    """
+    Generate synthetic data and benchmark every pipeline stage
+
+    Args:
+        images: Images per source dataset (ZeroWaste and WaRP each)
+        objects: Objects per image
+        vertices: Polygon vertices per ZeroWaste object
+        width, height: Synthetic image resolution
+        workers: Process pool size for conversion (default: CPU count)
+        stages: Subset of STAGES to run (default: all)
+        workdir: Scratch directory (default: a temp dir)
+        output: JSON-lines file the results are appended to
+        keep: Keep the scratch directory afterwards
+    """
+    stages = stages or STAGES
+    config = {'images': images, 'objects': objects, 'vertices': vertices,
+              'width': width, 'height': height, 'workers': workers or os.cpu_count(), 'seed': seed}
+    config_id = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+
+    scratch = Path(workdir) if workdir else Path(tempfile.mkdtemp(prefix='swm_bench_'))
+    scratch.mkdir(parents=True, exist_ok=True)
+    metrics_path = str(scratch / 'stage_metrics.jsonl')
+
+    print("="*70)
+    print("SWM Pipeline Benchmark")
+    print("="*70)
+    print(f"Config {config_id}: {config}")
+    print(f"Scratch: {scratch}\n")
+
+    t0 = time.perf_counter()
+    generate_zerowaste(scratch / 'zerowaste-f-final', images, objects, vertices, width, height, seed)
+    generate_warp(scratch / 'warp', images, objects, width, height, seed)
+    print(f"Generated synthetic data in {time.perf_counter() - t0:.2f}s")
+
+    ctx = mp.get_context('spawn')
+    results = []
+    failed = None
+    for stage in stages:
+        result_path = str(scratch / f'{stage}.result.json')
+        proc = ctx.Process(target=_run_stage, args=(stage, str(scratch), metrics_path, result_path, workers, seed))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print(f"  ❌ {stage} failed (exit code {proc.exitcode})")
+            failed = stage
+            break
+        with open(result_path) as f:
+            result = json.load(f)
+        results.append(result)
+        print(f"  ✓ {stage:<16} {result['seconds']:8.3f}s  {result['images_per_sec'] or 0:9.1f} img/s  "
+              f"peak {result['peak_rss_mb']:7.1f} MB")
+
+    output_files, output_bytes = _dir_size(scratch)
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'config_id': config_id,
+        'config': config,
+        'stages': results,
+        'failed': failed,
+        'scratch_files': output_files,
+        'scratch_bytes': output_bytes,
+    }
+    # Fold the per-step timers each script recorded into the benchmark record
+    if os.path.exists(metrics_path):
+        steps = {}
+        with open(metrics_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['type'] == 'stage':
+                    steps.setdefault(entry['script'], {})[entry['stage']] = entry['seconds']
+        record['steps'] = steps
+
+    previous = _previous_result(output, config_id)
+    with open(output, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+    if previous:
+        print(f"\nCompared with {previous['commit']} ({previous['timestamp']}):")
+        prev_stages = {r['stage']: r for r in previous['stages']}
+        for result in results:
+            prev = prev_stages.get(result['stage'])
+            if prev and prev['seconds']:
+                delta = (result['seconds'] - prev['seconds']) / prev['seconds'] * 100
+                print(f"  {result['stage']:<16} {delta:+7.1f}%")
+
+    print(f"\nResults appended to {os.path.abspath(output)}")
+    if not keep and not workdir:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return record
+
+
+def _previous_result(output, config_id):
+    """Most recent benchmark record with the same config, if any"""
+    if not os.path.exists(output):
+        return None
+    previous = None
+    with open(output) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get('config_id') == config_id:
+                    previous = record
+    return previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SWM data pipeline on synthetic data")
+    parser.add_argument('--images', type=int, default=200, help="images per source dataset")
+    parser.add_argument('--objects', type=int, default=6, help="objects per image")
+    parser.add_argument('--vertices', type=int, default=24, help="polygon vertices per object")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=None)
+    parser.add_argument('--workdir', default=None, help="scratch directory (kept afterwards)")
+    parser.add_argument('--output', default='benchmark_results.jsonl')
+    parser.add_argument('--keep', action='store_true', help="keep the temporary scratch directory")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    run_benchmark(args.images, args.objects, args.vertices, args.width, args.height,
+                  args.workers, args.stages, args.workdir, args.output, args.keep, args.seed)
@@ -133,6 +133,8 @@ def check_trashnet():
 
 
 
-check_warp()
-check_trashnet()
-check_zerowaste()
+# (guarded so the mappings can be imported, e.g. by convert_trashnet.py)
+if __name__ == "__main__":
+    check_warp()
+    check_trashnet()
+    check_zerowaste()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Checkpointing Helpers
+Atomic file writes and a progress journal so convert_to_yolo, remap and
+merge_yolo_datasets can resume after a crash (Kaggle timeout, full disk)
+instead of starting over.
+
+- Every output file is written to a temp file in the same folder and then
+  os.replace()d into place, so a label/image is either complete or absent.
+- Finished items are appended to <output>/.journal_<name>.log and fsync'd
+  periodically. A re-run skips journaled items; the journal is removed once
+  the run completes, so the next clean run starts fresh.
+"""
+
+import os
+import shutil
+import time
+
+TEMP_SUFFIX = '.swmtmp'
+
+
+def _temp_path(path):
+    return f"{path}.{os.getpid()}{TEMP_SUFFIX}"
+
+
+def atomic_write_text(path, text):
+    """Write text to path via temp file + rename"""
+    tmp = _temp_path(path)
+    try:
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_write_bytes(path, data):
+    """Write bytes (e.g. an encoded JPEG) to path via temp file + rename"""
+    tmp = _temp_path(path)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_copy(src, dst):
+    """shutil.copy2 via temp file + rename"""
+    tmp = _temp_path(dst)
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def remove_stale_temp_files(root):
+    """Delete temp files left behind by a killed run; returns how many were removed"""
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith(TEMP_SUFFIX):
+                os.remove(os.path.join(dirpath, name))
+                removed += 1
+    return removed
+
+
+class ProgressJournal:
+    """
+    Append-only record of finished work items for one output directory
+
+    Use as a context manager: on normal exit the journal is deleted, on an
+    exception it is flushed and kept so the next run resumes.
+
+    Args:
+        output_dir: Folder the journal lives in (the script's output root)
+        name: Script name, used in the journal file name
+        flush_every: Flush + fsync after this many new items
+        flush_seconds: ... or after this many seconds since the last flush
+    """
+
+    def __init__(self, output_dir, name, flush_every=200, flush_seconds=5.0):
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = os.path.join(output_dir, f'.journal_{name}.log')
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.completed = {}
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    # A line without its newline was cut off mid-write: not committed
+                    if line.endswith('\n'):
+                        key, _, info = line[:-1].partition('\t')
+                        self.completed[key] = info
+        self.resumed = bool(self.completed)
+        self.stale_temp_files = remove_stale_temp_files(output_dir) if self.resumed else 0
+
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._fh = open(self.path, 'a')
+
+    def __contains__(self, key):
+        return key in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def get(self, key, default=None):
+        """Info string recorded with a finished key (e.g. its annotation count)"""
+        return self.completed.get(key, default)
+
+    def mark(self, key, info=''):
+        """Record key as finished (call only after its outputs are in place)"""
+        self.completed[key] = str(info)
+        self._pending.append(f"{key}\t{info}")
+        if (len(self._pending) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._fh.write(''.join(f"{entry}\n" for entry in self._pending))
+            self._pending = []
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Flush and close, keeping the journal for a later resume"""
+        if not self._fh.closed:
+            self.flush()
+            self._fh.close()
+
+    def finish(self):
+        """Close and delete the journal: the run completed"""
+        if not self._fh.closed:
+            self._fh.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.close()
+        return False
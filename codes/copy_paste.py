@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Copy-Paste Augmentation
+Pastes polygon-masked objects of rare classes (metal, cardboard by default)
+from donor images into other training images of the same YOLO dataset and
+writes the results as a new YOLO source with a train split only, so
+merge_yolo_datasets.py picks it up like any other dataset without leaking
+into val/test.
+
+Per output image:
+  - a background image and `objects` donor polygons are drawn by the parent
+    (rare classes drawn uniformly per class, not per instance)
+  - each object is scaled and optionally flipped; all polygons of the image
+    are transformed and clipped in one NumPy pass over the concatenated points
+  - placements are retried until the object's box covers less than
+    max_overlap of every existing (or already pasted) box, so the original
+    labels stay valid
+  - pixels are copied with np.copyto through the rasterized polygon mask
+
+Only polygon labels can be donors; box-only datasets (WaRP) can still be
+backgrounds. Output layout:
+
+    <output>/train/images + labels, data.yaml, classes.txt, provenance.db
+
+Run with --benchmark N to time decode / paste / encode on one core.
+"""
+
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from checkpoint import ProgressJournal, atomic_write_bytes
+from pipeline_metrics import PipelineMetrics, get_metrics
+from provenance import ProvenanceTable
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_CLASSES = ('cardboard', 'metal')
+DONOR_CACHE_SIZE = 32
+
+
+def read_labels(label_path):
+    """
+    Parse a YOLO label file into flat arrays
+
+    Returns:
+        (box_classes, boxes xywhn (n, 4), polygon classes, polygon points
+        (p, 2) normalized, polygon offsets (m + 1,) into the points)
+    """
+    box_classes, boxes, poly_classes, points, offsets = [], [], [], [], [0]
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 5:
+                    box_classes.append(int(parts[0]))
+                    boxes.append([float(v) for v in parts[1:]])
+                elif len(parts) > 5 and len(parts) % 2 == 1:
+                    poly_classes.append(int(parts[0]))
+                    points.extend(zip(map(float, parts[1::2]), map(float, parts[2::2])))
+                    offsets.append(len(points))
+    return (np.array(box_classes, np.int64), np.array(boxes, np.float64).reshape(-1, 4),
+            np.array(poly_classes, np.int64), np.array(points, np.float64).reshape(-1, 2),
+            np.array(offsets, np.int64))
+
+
+def label_boxes(label_path, width, height):
+    """Pixel xyxy boxes of every label (polygons by their extent)"""
+    _, boxes, _, points, offsets = read_labels(label_path)
+    xyxy = np.column_stack([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2])
+    if len(offsets) > 1:
+        starts = offsets[:-1]
+        xyxy = np.vstack([xyxy, np.column_stack([np.minimum.reduceat(points, starts),
+                                                 np.maximum.reduceat(points, starts)])])
+    return xyxy * [width, height, width, height]
+
+
+def transform_polygons(points, owner, origin, scale, flip, extent, offset, width, height):
+    """
+    Move every pasted polygon into the target image in one vectorized pass
+
+    Args:
+        points: (p, 2) donor pixel coordinates of all polygons, concatenated
+        owner: (p,) index of the object each point belongs to
+        origin: (k, 2) donor top-left corner of each object's box
+        scale, flip: (k,) per-object scale factor and horizontal flip flag
+        extent: (k, 2) donor box size of each object
+        offset: (k, 2) target top-left corner of each object
+    Returns:
+        (p, 2) points in the target image, clipped to it
+    """
+    local = points - origin[owner]
+    local[:, 0] = np.where(flip[owner], extent[owner, 0] - local[:, 0], local[:, 0])
+    moved = local * scale[owner, None] + offset[owner]
+    return np.clip(moved, 0, [width - 1, height - 1])
+
+
+def _ioa(candidates, boxes):
+    """Intersection over each existing box's area, (candidates, boxes)"""
+    if not len(boxes):
+        return np.zeros((len(candidates), 0))
+    x1 = np.maximum(candidates[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(candidates[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(candidates[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(candidates[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area, 1e-9)
+
+
+def paste_objects(image, existing_boxes, donors, rng, scale_range=(0.5, 1.5), flip_prob=0.5,
+                  max_overlap=0.3, tries=20):
+    """
+    Paste polygon-masked donor objects into image (modified in place)
+
+    Args:
+        image: Target BGR image
+        existing_boxes: (n, 4) pixel xyxy boxes already labelled in image
+        donors: List of (donor BGR image, class id, (q, 2) normalized polygon)
+        rng: numpy Generator
+    Returns:
+        List of (class id, (q, 2) normalized polygon) for the pasted objects
+    """
+    height, width = image.shape[:2]
+    if not donors:
+        return []
+
+    # Per-object parameters, vectorized over objects
+    sizes = np.array([d[0].shape[1::-1] for d in donors], np.float64)
+    points = np.concatenate([d[2] for d in donors]) * np.repeat(sizes, [len(d[2]) for d in donors], axis=0)
+    counts = np.array([len(d[2]) for d in donors])
+    owner = np.repeat(np.arange(len(donors)), counts)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    origin = np.floor(np.minimum.reduceat(points, starts))
+    extent = np.ceil(np.maximum.reduceat(points, starts)) - origin
+    scale = rng.uniform(*scale_range, len(donors))
+    # Never larger than half the target image
+    scale = np.minimum(scale, 0.5 * np.min([width, height] / np.maximum(extent, 1), axis=1))
+    flip = rng.random(len(donors)) < flip_prob
+    pasted_size = np.maximum(np.round(extent * scale[:, None]), 1)
+
+    # Placement: sample `tries` positions per object at once, keep the first
+    # whose box stays off the existing ones
+    occupied = np.asarray(existing_boxes, np.float64).reshape(-1, 4)
+    offset = np.full((len(donors), 2), np.nan)
+    for k in range(len(donors)):
+        room = np.maximum([width, height] - pasted_size[k], 1)
+        corners = rng.uniform(0, 1, (tries, 2)) * room
+        candidates = np.column_stack([corners, corners + pasted_size[k]])
+        free = (_ioa(candidates, occupied) < max_overlap).all(axis=1)
+        if free.any():
+            offset[k] = np.floor(corners[free.argmax()])
+            occupied = np.vstack([occupied, candidates[free.argmax()]])
+    placed = ~np.isnan(offset[:, 0])
+    if not placed.any():
+        return []
+    offset = np.nan_to_num(offset)
+
+    moved = transform_polygons(points, owner, origin, scale, flip, extent, offset, width, height)
+
+    pasted = []
+    for k in np.flatnonzero(placed):
+        donor = donors[k][0]
+        x0, y0 = origin[k].astype(int)
+        ex, ey = extent[k].astype(int)
+        pw, ph = pasted_size[k].astype(int)
+        patch = donor[max(y0, 0):y0 + ey, max(x0, 0):x0 + ex]
+        if flip[k]:
+            patch = patch[:, ::-1]
+        patch = cv2.resize(patch, (pw, ph), interpolation=cv2.INTER_LINEAR)
+        # Polygon relative to the pasted patch, rasterized at patch resolution
+        local = moved[owner == k] - offset[k]
+        mask = np.zeros((ph, pw), np.uint8)
+        cv2.fillPoly(mask, [np.round(local).astype(np.int32)], 1)
+        tx, ty = offset[k].astype(int)
+        # Clip the patch to the image
+        w = min(pw, width - tx)
+        h = min(ph, height - ty)
+        np.copyto(image[ty:ty + h, tx:tx + w], patch[:h, :w], where=mask[:h, :w, None].astype(bool))
+        polygon = moved[owner == k] / [width, height]
+        if np.ptp(polygon[:, 0]) > 0 and np.ptp(polygon[:, 1]) > 0:
+            pasted.append((donors[k][1], polygon))
+    return pasted
+
+
+def format_polygons(pasted):
+    return ''.join(f"{cls} " + " ".join(f"{v:.6f}" for v in polygon.reshape(-1)) + "\n"
+                   for cls, polygon in pasted)
+
+
+def _label_path(image_path):
+    images_dir, name = os.path.split(image_path)
+    return os.path.join(os.path.dirname(images_dir), 'labels', os.path.splitext(name)[0] + '.txt')
+
+
+def render_batch(tasks, output_dir, params, jpeg_quality=95):
+    """
+    Render a chunk of planned images (process pool worker)
+
+    Args:
+        tasks: List of (output name, background path, [(donor path, class, polygon)], seed)
+    Returns:
+        ([(output name, background path, background classes, pasted classes)], worker metrics);
+        background + pasted classes follow the output label line order
+    """
+    metrics = PipelineMetrics('copy_paste.worker')
+    images_dir = os.path.join(output_dir, 'train', 'images')
+    labels_dir = os.path.join(output_dir, 'train', 'labels')
+    encode = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    donor_cache = {}
+
+    def donor_image(path):
+        if path not in donor_cache:
+            if len(donor_cache) >= DONOR_CACHE_SIZE:
+                donor_cache.pop(next(iter(donor_cache)))
+            donor_cache[path] = cv2.imread(path)
+        return donor_cache[path]
+
+    results = []
+    for name, background, objects, seed in tasks:
+        with metrics.stage('image_decode'):
+            image = cv2.imread(background)
+            donors = [(donor_image(path), cls, polygon) for path, cls, polygon in objects]
+        if image is None:
+            metrics.count('unreadable_images')
+            continue
+        donors = [d for d in donors if d[0] is not None]
+        height, width = image.shape[:2]
+        label_path = _label_path(background)
+        with metrics.stage('paste'):
+            pasted = paste_objects(image, label_boxes(label_path, width, height), donors,
+                                   np.random.default_rng(seed), **params)
+        with metrics.stage('image_write'):
+            ok, encoded = cv2.imencode('.jpg', image, encode)
+            atomic_write_bytes(os.path.join(images_dir, f"{name}.jpg"), encoded.tobytes())
+        metrics.count('image_write_bytes', len(encoded))
+        original = ''
+        if os.path.exists(label_path):
+            with open(label_path) as f:
+                original = f.read()
+            if original and not original.endswith('\n'):
+                original += '\n'
+        metrics.write_text(os.path.join(labels_dir, f"{name}.txt"), original + format_polygons(pasted))
+        metrics.count('pasted_objects', len(pasted))
+        kept = [int(line.split()[0]) for line in original.splitlines() if line.strip()]
+        results.append((name, background, kept, [cls for cls, _ in pasted]))
+    return results, metrics.as_dict()
+
+
+def _render_task(args):
+    return render_batch(*args)
+
+
+def _class_ids(dataset_root, classes):
+    """Resolve class names (via classes.txt) or ids to ids"""
+    names = []
+    classes_txt = os.path.join(dataset_root, 'classes.txt')
+    if os.path.exists(classes_txt):
+        with open(classes_txt) as f:
+            names = [line.strip() for line in f if line.strip()]
+    ids = []
+    for cls in classes:
+        if str(cls).isdigit():
+            ids.append(int(cls))
+        elif cls in names:
+            ids.append(names.index(cls))
+        else:
+            raise ValueError(f"Unknown class {cls!r} (classes.txt: {names})")
+    return ids, names
+
+
+def object_bank(dataset_root, split, class_ids):
+    """
+    Every polygon of the wanted classes, per class
+
+    Returns:
+        (background image paths, {class id: [(image path, (q, 2) normalized polygon)]})
+    """
+    images_dir = os.path.join(dataset_root, split, 'images')
+    images = sorted(e.path for e in os.scandir(images_dir)
+                    if os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS)
+    bank = {cls: [] for cls in class_ids}
+    for image in images:
+        _, _, poly_classes, points, offsets = read_labels(_label_path(image))
+        for i, cls in enumerate(poly_classes):
+            if cls in bank:
+                bank[cls].append((image, points[offsets[i]:offsets[i + 1]]))
+    return images, bank
+
+
+def plan_images(backgrounds, bank, count, objects, seed=0):
+    """Draw background + donor objects for each output image (classes uniformly)"""
+    rng = np.random.default_rng(seed)
+    classes = [cls for cls, entries in bank.items() if entries]
+    plans = []
+    for i in range(count):
+        picked = []
+        for cls in rng.choice(classes, rng.integers(1, objects + 1)):
+            path, polygon = bank[cls][rng.integers(len(bank[cls]))]
+            picked.append((path, int(cls), polygon))
+        plans.append((f"cp_{i:06d}", backgrounds[rng.integers(len(backgrounds))], picked,
+                      [seed, i]))
+    return plans
+
+
+def copy_paste_dataset(dataset_root, output_dir, classes=DEFAULT_CLASSES, count=None, objects=3,
+                       split='train', scale_range=(0.5, 1.5), max_overlap=0.3, workers=None,
+                       seed=0, jpeg_quality=95):
+    """
+    Write a copy-paste augmented YOLO source from a polygon-labelled dataset
+
+    Args:
+        dataset_root: YOLO dataset with <split>/images + labels and classes.txt
+        output_dir: New source folder (train split only)
+        classes: Donor class names or ids
+        count: Images to generate (default: one per donor object)
+        objects: Up to this many pasted objects per image
+        scale_range: Random scale applied to each pasted object
+        max_overlap: Largest share of an existing box a pasted box may cover
+        workers: Process pool size (default: CPU count)
+    """
+    workers = workers or os.cpu_count() or 1
+    class_ids, names = _class_ids(dataset_root, classes)
+    metrics = get_metrics('copy_paste').start(dataset=str(dataset_root), classes=class_ids, objects=objects,
+                                              seed=seed, workers=workers)
+
+    print("="*60)
+    print("COPY-PASTE AUGMENTATION")
+    print("="*60)
+    with metrics.stage('object_bank'):
+        backgrounds, bank = object_bank(dataset_root, split, class_ids)
+    for cls in class_ids:
+        label = names[cls] if cls < len(names) else cls
+        print(f"  Donors {label}: {len(bank[cls])} polygons")
+    if not any(bank.values()):
+        print("❌ No polygon labels of the requested classes (box-only dataset?)")
+        return None
+    count = count or sum(len(v) for v in bank.values())
+    plans = plan_images(backgrounds, bank, count, objects, seed)
+
+    for sub in ('images', 'labels'):
+        os.makedirs(os.path.join(output_dir, 'train', sub), exist_ok=True)
+    with ProgressJournal(output_dir, 'copy_paste') as journal:
+        if journal.resumed:
+            print(f"↻ Resuming: {len(journal)} images already written "
+                  f"({journal.stale_temp_files} partial files cleaned up)")
+        todo = [plan for plan in plans if plan[0] not in journal]
+        params = {'scale_range': tuple(scale_range), 'max_overlap': max_overlap}
+
+        print(f"Generating {len(todo)} images ({count - len(todo)} already done) with {workers} workers...")
+        provenance = ProvenanceTable(output_dir)
+        pasted_counts = {}
+        t0 = time.perf_counter()
+        chunk = max(1, min(64, len(todo) // (workers * 4) or 1))
+        chunks = [(todo[i:i + chunk], output_dir, params, jpeg_quality) for i in range(0, len(todo), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for results, worker_metrics in pool.map(_render_task, chunks):
+                metrics.merge(worker_metrics)
+                for name, background, kept, pasted in results:
+                    journal.mark(name, ','.join(map(str, pasted)))
+                    provenance.add(f"{name}.jpg", 'copy_paste', split, os.path.relpath(background, dataset_root),
+                                   kept + pasted)
+                    for cls in pasted:
+                        pasted_counts[cls] = pasted_counts.get(cls, 0) + 1
+        seconds = time.perf_counter() - t0
+        provenance.close()
+
+        shutil.copy(os.path.join(dataset_root, 'classes.txt'), os.path.join(output_dir, 'classes.txt'))
+        with open(os.path.join(output_dir, 'data.yaml'), 'w') as f:
+            f.write("# Copy-paste augmented source (train only)\n")
+            f.write(f"# From: {os.path.abspath(dataset_root)}, donors: {', '.join(map(str, classes))}\n\n")
+            f.write("train: train/images\n\n")
+            f.write(f"nc: {len(names)}\n")
+            f.write("names:\n")
+            for idx, class_name in enumerate(names):
+                f.write(f"  {idx}: {class_name}\n")
+
+    metrics.count('images', len(todo))
+    metrics.finish()
+    rate = len(todo) / seconds if seconds > 0 else 0
+    print(f"\n✓ {len(todo)} images in {seconds:.1f}s: {rate:.1f} img/s, {rate / workers:.1f} img/s per core")
+    for cls, n in sorted(pasted_counts.items()):
+        print(f"  Pasted {names[cls] if cls < len(names) else cls}: {n}")
+    print(f"Output: {os.path.abspath(output_dir)}")
+    return output_dir
+
+
+def benchmark(dataset_root, images=200, classes=DEFAULT_CLASSES, objects=3, split='train', seed=0):
+    """Time decode / paste / encode per image on one core (nothing is written)"""
+    class_ids, _ = _class_ids(dataset_root, classes)
+    backgrounds, bank = object_bank(dataset_root, split, class_ids)
+    plans = plan_images(backgrounds, bank, images, objects, seed)
+    timers = {'decode': 0.0, 'paste': 0.0, 'encode': 0.0}
+    pasted = 0
+    for _, background, objects_, task_seed in plans:
+        t0 = time.perf_counter()
+        image = cv2.imread(background)
+        donors = [(cv2.imread(path), cls, polygon) for path, cls, polygon in objects_]
+        t1 = time.perf_counter()
+        height, width = image.shape[:2]
+        result = paste_objects(image, label_boxes(_label_path(background), width, height), donors,
+                               np.random.default_rng(task_seed))
+        format_polygons(result)
+        t2 = time.perf_counter()
+        cv2.imencode('.jpg', image)
+        t3 = time.perf_counter()
+        timers['decode'] += t1 - t0
+        timers['paste'] += t2 - t1
+        timers['encode'] += t3 - t2
+        pasted += len(result)
+
+    total = sum(timers.values())
+    print(f"Copy-paste benchmark: {images} images, {pasted} objects pasted, one core")
+    for name, seconds in timers.items():
+        print(f"  {name:<7} {seconds / images * 1000:8.2f} ms/img  {images / seconds:8.1f} img/s")
+    print(f"  {'total':<7} {total / images * 1000:8.2f} ms/img  {images / total:8.1f} img/s per core")
+    return {name: images / seconds for name, seconds in timers.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Copy-paste polygon objects of rare classes into a new YOLO source")
+    parser.add_argument('dataset', help="YOLO dataset with polygon labels and classes.txt (e.g. zerowaste_yolo)")
+    parser.add_argument('output', nargs='?', help="output source folder")
+    parser.add_argument('--classes', nargs='+', default=list(DEFAULT_CLASSES), help="donor class names or ids")
+    parser.add_argument('--count', type=int, default=None, help="images to generate (default: one per donor)")
+    parser.add_argument('--objects', type=int, default=3, help="max pasted objects per image")
+    parser.add_argument('--scale', type=float, nargs=2, default=(0.5, 1.5), metavar=('MIN', 'MAX'))
+    parser.add_argument('--max-overlap', type=float, default=0.3)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--benchmark', type=int, default=None, metavar='N',
+                        help="time N images on one core instead of writing a dataset")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.dataset, args.benchmark, args.classes, args.objects, seed=args.seed)
+    elif args.output:
+        copy_paste_dataset(args.dataset, args.output, args.classes, args.count, args.objects,
+                           scale_range=args.scale, max_overlap=args.max_overlap, workers=args.workers,
+                           seed=args.seed)
+    else:
+        parser.error("output is required unless --benchmark is given")
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Dataset Diff
+Compares two versions of a YOLO dataset (e.g. before / after a change to
+remap.py or convert_to_yolo.py) and reports what changed:
+
+  - images added, removed, moved to another split, or with changed content
+  - per-class annotation counts in both versions and their delta
+  - box-level changes in every changed label file: boxes are matched by IoU
+    (greedy, highest first) and counted as unchanged, moved (same class,
+    different geometry), reclassified (class A -> class B), added or removed
+
+Both versions are indexed by split and file stem (flat or <split>/images +
+labels layouts); a stem that changed split is paired across splits. Label files are small, so they are
+compared byte for byte and identical ones are never parsed for boxes;
+images are compared by size, or by content hash (SHA-1, thread pool) with
+--hash-images, hashing only pairs whose sizes match. Polygons are compared
+by their extent.
+
+    python dataset_diff.py build/swm_4_classes_old build/swm_4_classes --report diff.tsv
+"""
+
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from checkpoint import atomic_write_text
+from manifest_merge import file_hash
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+IMAGE_DIRS = ('images', 'data')  # zerowaste keeps its images in data/
+SPLITS = ('train', 'val', 'test')
+SAME_BOX_IOU = 0.99
+
+
+def class_names(root):
+    """Class names from classes.txt (or data.yaml), empty if neither exists"""
+    classes_txt = os.path.join(root, 'classes.txt')
+    if os.path.exists(classes_txt):
+        with open(classes_txt) as f:
+            return [line.strip() for line in f if line.strip()]
+    data_yaml = os.path.join(root, 'data.yaml')
+    if os.path.exists(data_yaml):
+        import yaml
+
+        with open(data_yaml) as f:
+            names = (yaml.safe_load(f) or {}).get('names') or []
+        return [names[k] for k in sorted(names)] if isinstance(names, dict) else list(names)
+    return []
+
+
+def index_dataset(root):
+    """
+    (split, stem) index of a YOLO dataset
+
+    Returns:
+        {(split, stem): [image path, image size, label path]}; split is ''
+        for a flat layout, paths are None when missing
+    """
+    index = {}
+    layouts = [('', root)] + [(split, os.path.join(root, split)) for split in SPLITS]
+    for split, base in layouts:
+        for sub in IMAGE_DIRS:
+            folder = os.path.join(base, sub)
+            if os.path.isdir(folder):
+                for entry in os.scandir(folder):
+                    stem, ext = os.path.splitext(entry.name)
+                    if ext.lower() in IMAGE_EXTENSIONS:
+                        index[split, stem] = [entry.path, entry.stat().st_size, None]
+        labels_dir = os.path.join(base, 'labels')
+        if os.path.isdir(labels_dir):
+            for entry in os.scandir(labels_dir):
+                stem, ext = os.path.splitext(entry.name)
+                if ext == '.txt':
+                    index.setdefault((split, stem), [None, None, None])[2] = entry.path
+    return index
+
+
+def pair_entries(old_index, new_index):
+    """
+    Pair images of two versions: same split and stem first, then a stem left
+    over exactly once on each side counts as moved to another split
+
+    Returns:
+        List of (old key or None, new key or None), sorted by stem
+    """
+    pairs = [(key, key) for key in old_index.keys() & new_index.keys()]
+    left_old, left_new = {}, {}
+    for key in old_index.keys() - new_index.keys():
+        left_old.setdefault(key[1], []).append(key)
+    for key in new_index.keys() - old_index.keys():
+        left_new.setdefault(key[1], []).append(key)
+    for stem in left_old.keys() | left_new.keys():
+        old_keys, new_keys = left_old.get(stem, []), left_new.get(stem, [])
+        if len(old_keys) == 1 and len(new_keys) == 1:
+            pairs.append((old_keys[0], new_keys[0]))
+        else:
+            pairs.extend((key, None) for key in old_keys)
+            pairs.extend((None, key) for key in new_keys)
+    return sorted(pairs, key=lambda p: ((p[0] or p[1])[1], (p[0] or p[1])[0]))
+
+
+def read_label(path):
+    """Raw bytes of a label file (b'' when missing)"""
+    if path is None:
+        return b''
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def class_counts(data):
+    """Annotations per class id in label bytes"""
+    return Counter(int(line.split(maxsplit=1)[0]) for line in data.splitlines() if line.strip())
+
+
+def parse_boxes(data):
+    """(class ids (n,), normalized xyxy (n, 4)); polygons become their extent"""
+    classes, boxes = [], []
+    for line in data.split(b'\n'):
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        values = np.array(parts[1:], np.float64)
+        if len(values) == 4:
+            x, y, w, h = values
+            boxes.append((x - w / 2, y - h / 2, x + w / 2, y + h / 2))
+        else:
+            xs, ys = values[0::2], values[1::2]
+            boxes.append((xs.min(), ys.min(), xs.max(), ys.max()))
+        classes.append(int(parts[0]))
+    return np.array(classes, np.int64), np.array(boxes, np.float64).reshape(-1, 4)
+
+
+def iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-12)
+
+
+def match_boxes(classes_a, boxes_a, classes_b, boxes_b, iou_threshold=0.5):
+    """
+    Greedy IoU matching of the boxes of one image in two versions
+
+    Returns:
+        Counter with unchanged / moved / added / removed and
+        (class_a, class_b) keys for reclassified boxes
+    """
+    changes = Counter()
+    matched_a = np.zeros(len(boxes_a), bool)
+    matched_b = np.zeros(len(boxes_b), bool)
+    if len(boxes_a) and len(boxes_b):
+        iou = iou_matrix(boxes_a, boxes_b)
+        rows, cols = np.nonzero(iou >= iou_threshold)
+        order = np.argsort(-iou[rows, cols], kind='stable')
+        for i, j in zip(rows[order], cols[order]):
+            if matched_a[i] or matched_b[j]:
+                continue
+            matched_a[i] = matched_b[j] = True
+            if classes_a[i] != classes_b[j]:
+                changes[(int(classes_a[i]), int(classes_b[j]))] += 1
+            elif iou[i, j] >= SAME_BOX_IOU:
+                changes['unchanged'] += 1
+            else:
+                changes['moved'] += 1
+    changes['removed'] += int((~matched_a).sum())
+    changes['added'] += int((~matched_b).sum())
+    return changes
+
+
+def _image_hashes(paths, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(file_hash, paths)))
+
+
+def diff_datasets(old_root, new_root, iou_threshold=0.5, hash_images=False, report=None, top=10,
+                  workers=None):
+    """
+    Compare two YOLO dataset versions and print a summary
+
+    Args:
+        old_root, new_root: Dataset roots (flat or split layout)
+        iou_threshold: Minimum IoU for two boxes to be the same object
+        hash_images: Compare image content instead of file size
+        report: Optional TSV path with one row per added/removed/changed image
+        top: Changed images listed in the summary
+        workers: Threads for image hashing
+
+    Returns:
+        Dict with image, class and box level statistics
+    """
+    t0 = time.perf_counter()
+    old_index = index_dataset(old_root)
+    new_index = index_dataset(new_root)
+    old_names, new_names = class_names(old_root), class_names(new_root)
+    pairs = pair_entries(old_index, new_index)
+
+    image_hash = {}
+    if hash_images:
+        same_size = [(old_index[a][0], new_index[b][0]) for a, b in pairs
+                     if a and b and old_index[a][0] and new_index[b][0] and old_index[a][1] == new_index[b][1]]
+        image_hash = _image_hashes([p for pair in same_size for p in pair],
+                                   workers or min(32, (os.cpu_count() or 1) * 4))
+
+    status = Counter()
+    counts_old, counts_new = Counter(), Counter()
+    boxes = Counter()
+    rows = []
+    for old_key, new_key in pairs:
+        stem = (old_key or new_key)[1]
+        old_split, new_split = old_key[0] if old_key else '', new_key[0] if new_key else ''
+        old, new = old_index.get(old_key), new_index.get(new_key)
+        # A label file left behind without its image does not keep the image alive
+        if old and new and (old[0] is None) != (new[0] is None):
+            old, new = (None, new) if old[0] is None else (old, None)
+        old_data = read_label(old[2]) if old else b''
+        new_data = read_label(new[2]) if new else b''
+        if old is None or new is None:
+            kind = 'added' if old is None else 'removed'
+            status[kind] += 1
+            counts = class_counts(new_data if old is None else old_data)
+            (counts_new if old is None else counts_old).update(counts)
+            rows.append((stem, kind, old_split, new_split, sum(counts.values())))
+            continue
+
+        if old_split != new_split:
+            status['resplit'] += 1
+            rows.append((stem, 'resplit', old_split, new_split, ''))
+        if old[1] != new[1] or (hash_images and image_hash.get(old[0]) != image_hash.get(new[0])):
+            status['image_changed'] += 1
+            rows.append((stem, 'image_changed', old_split, new_split, ''))
+
+        if old_data == new_data:
+            counts = class_counts(old_data)
+            counts_old.update(counts)
+            counts_new.update(counts)
+            status['labels_same'] += 1
+            continue
+
+        status['labels_changed'] += 1
+        counts_old.update(class_counts(old_data))
+        counts_new.update(class_counts(new_data))
+        classes_a, boxes_a = parse_boxes(old_data)
+        classes_b, boxes_b = parse_boxes(new_data)
+        changes = match_boxes(classes_a, boxes_a, classes_b, boxes_b, iou_threshold)
+        boxes.update(changes)
+        reclassified = sum(n for key, n in changes.items() if isinstance(key, tuple))
+        rows.append((stem, 'labels_changed', old_split, new_split,
+                     f"{changes['unchanged']}/{changes['moved']}/{reclassified}/"
+                     f"{changes['added']}/{changes['removed']}"))
+    seconds = time.perf_counter() - t0
+
+    def name(cls):
+        names = new_names or old_names
+        return names[cls] if cls < len(names) else str(cls)
+
+    print("="*70)
+    print("DATASET DIFF")
+    print("="*70)
+    print(f"Old: {os.path.abspath(old_root)} ({len(old_index)} images)")
+    print(f"New: {os.path.abspath(new_root)} ({len(new_index)} images)")
+    if old_names and new_names and old_names != new_names:
+        print(f"⚠ Class names differ: {old_names} -> {new_names} (compared by id)")
+
+    print("\nImages:")
+    for kind in ('added', 'removed', 'resplit', 'image_changed', 'labels_changed', 'labels_same'):
+        print(f"  {kind:<16} {status[kind]:>8}")
+
+    print("\nAnnotations per class:")
+    print(f"  {'class':<20} {'old':>8} {'new':>8} {'delta':>8}")
+    for cls in sorted(counts_old.keys() | counts_new.keys()):
+        delta = counts_new[cls] - counts_old[cls]
+        print(f"  {name(cls):<20} {counts_old[cls]:>8} {counts_new[cls]:>8} {delta:>+8}")
+    print(f"  {'total':<20} {sum(counts_old.values()):>8} {sum(counts_new.values()):>8} "
+          f"{sum(counts_new.values()) - sum(counts_old.values()):>+8}")
+
+    print(f"\nBoxes in changed label files (IoU >= {iou_threshold}):")
+    for kind in ('unchanged', 'moved', 'added', 'removed'):
+        print(f"  {kind:<16} {boxes[kind]:>8}")
+    transitions = sorted(((key, n) for key, n in boxes.items() if isinstance(key, tuple)), key=lambda x: -x[1])
+    print(f"  {'reclassified':<16} {sum(n for _, n in transitions):>8}")
+    for (a, b), n in transitions:
+        print(f"    {name(a)} -> {name(b)}: {n}")
+
+    changed = [row for row in rows if row[1] == 'labels_changed']
+    if changed and top:
+        print(f"\nChanged label files (first {min(top, len(changed))} of {len(changed)}; "
+              "unchanged/moved/reclassified/added/removed boxes):")
+        for stem, _, split_a, split_b, detail in changed[:top]:
+            print(f"  {stem:<40} {split_b or split_a:<6} {detail}")
+
+    if report:
+        lines = ["stem\tstatus\told_split\tnew_split\tdetail\n"]
+        lines += [f"{stem}\t{kind}\t{a}\t{b}\t{detail}\n" for stem, kind, a, b, detail in rows]
+        atomic_write_text(report, ''.join(lines))
+        print(f"\nReport: {report} ({len(rows)} rows)")
+    print(f"\n✓ Compared {len(pairs)} images in {seconds:.2f}s")
+
+    return {
+        'images': dict(status),
+        'classes': {cls: (counts_old[cls], counts_new[cls]) for cls in counts_old.keys() | counts_new.keys()},
+        'boxes': {key if isinstance(key, str) else f"{key[0]}->{key[1]}": n for key, n in boxes.items()},
+        'seconds': seconds,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two versions of a YOLO dataset")
+    parser.add_argument('old', help="old dataset root")
+    parser.add_argument('new', help="new dataset root")
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU for two boxes to be the same object")
+    parser.add_argument('--hash-images', action='store_true', help="compare image content, not just size")
+    parser.add_argument('--report', default=None, help="TSV with one row per changed image")
+    parser.add_argument('--top', type=int, default=10, help="changed images to list")
+    parser.add_argument('--workers', type=int, default=None, help="threads for --hash-images")
+    args = parser.parse_args()
+
+    diff_datasets(args.old, args.new, args.iou, args.hash_images, args.report, args.top, args.workers)
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Lazy YOLO Dataset Views
+Composable, lazily evaluated dataset operations so intermediate datasets
+(swm_final, swm_final_split) don't have to be materialized as full copies.
+
+    warp = DatasetView.from_yolo('warp', splits=['train', 'test'], source='warp')
+    zw = DatasetView.from_yolo('zerowaste_yolo', source='zw')
+    plastic = (warp.map_classes(WARP_TO_PLASTIC).rename('warp_{split}_')
+               .concat(zw.map_classes(ZEROWASTE_TO_PLASTIC).rename('zw_{split}_')))
+    export_file_lists(plastic.split({'train': 0.7, 'val': 0.15, 'test': 0.15}), 'swm_view', ['plastic'])
+
+Nothing is read until a view is iterated, and nothing is written until
+materialize() or export_file_lists() is called. Exports write only label
+overlays plus image links; untouched images/labels are referenced in place.
+
+Label views switch the training target of one dataset without copies:
+
+    export_label_views('build/swm_4_classes', 'build/swm_label_views')   # 4class/ and 1class/
+
+Overlays are indexed by source label stat + transform, so re-exporting an
+unchanged view only stats the labels, and an image folder is linked once
+instead of once per image.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from checkpoint import atomic_write_text
+from relocate import list_entry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+OVERLAY_INDEX = '.overlay_index.json'
+
+# Training targets over the 4-class merge: target -> (class mapping or None to keep, class names)
+LABEL_TARGETS = {
+    '4class': (None, ['rigid_plastic', 'soft_plastic', 'cardboard', 'metal']),
+    '1class': ({0: 0, 1: 0}, ['plastic']),
+}
+
+
+class Sample:
+    """One image/label pair plus the label transforms queued on it"""
+
+    __slots__ = ('image', 'label', 'name', 'split', 'source', 'transforms')
+
+    def __init__(self, image, label, name, split, source, transforms=()):
+        self.image = image
+        self.label = label
+        self.name = name
+        self.split = split
+        self.source = source
+        self.transforms = tuple(transforms)
+
+    def replace(self, **changes):
+        fields = {k: getattr(self, k) for k in self.__slots__}
+        fields.update(changes)
+        return Sample(**fields)
+
+    @property
+    def stem(self):
+        return os.path.splitext(self.name)[0]
+
+    def read_labels(self):
+        """Return label rows as [(class_id, 'coords...')] with all transforms applied"""
+        rows = []
+        if self.label is not None and os.path.exists(self.label):
+            with open(self.label) as f:
+                for line in f:
+                    parts = line.split(maxsplit=1)
+                    if len(parts) == 2:
+                        rows.append((int(parts[0]), parts[1].strip()))
+        for transform in self.transforms:
+            rows = transform(rows)
+        return rows
+
+    def label_text(self):
+        return ''.join(f"{cls} {coords}\n" for cls, coords in self.read_labels())
+
+    def fingerprint(self):
+        """Hash of image path, source label stat and transform keys; None when a transform has no key"""
+        keys = [getattr(t, 'key', None) for t in self.transforms]
+        if None in keys:
+            return None
+        try:
+            st = os.stat(self.label)
+            stat = f"{st.st_mtime_ns}:{st.st_size}"
+        except (OSError, TypeError):
+            stat = 'missing'
+        return hashlib.md5(f"{os.path.abspath(self.image)}|{stat}|{'|'.join(keys)}".encode()).hexdigest()[:16]
+
+    def in_place(self):
+        """True when the source files can be referenced directly by an exported file list"""
+        if self.transforms or self.label is None:
+            return False
+        image = Path(self.image)
+        return (Path(self.name) == Path(image.name)
+                and image.parent.name == 'images'
+                and Path(self.label) == image.parent.parent / 'labels' / f"{image.stem}.txt")
+
+
+class DatasetView:
+    """
+    A lazily evaluated sequence of Samples
+
+    Args:
+        producer: Zero-argument callable returning an iterator of Samples
+        description: Human readable description of how the view is built
+    """
+
+    def __init__(self, producer, description='view'):
+        self._producer = producer
+        self.description = description
+
+    def __iter__(self):
+        return iter(self._producer())
+
+    def __repr__(self):
+        return f"DatasetView({self.description})"
+
+    # ----- sources -----
+
+    @classmethod
+    def from_yolo(cls, root, splits=('train', 'val', 'test'), source=None):
+        """View over a YOLO dataset laid out as <root>/<split>/images + labels"""
+        root = Path(root)
+        source = source or root.name
+
+        def produce():
+            for split in splits:
+                images_dir = root / split / 'images'
+                labels_dir = root / split / 'labels'
+                if not images_dir.is_dir():
+                    continue
+                for entry in sorted(os.scandir(images_dir), key=lambda e: e.name):
+                    if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                        continue
+                    label = labels_dir / f"{os.path.splitext(entry.name)[0]}.txt"
+                    yield Sample(entry.path, str(label), entry.name, split, source)
+
+        return cls(produce, f"yolo:{root}")
+
+    @classmethod
+    def from_flat(cls, root, source=None, split='all'):
+        """View over a flat dataset with <root>/images + <root>/labels (e.g. swm_final)"""
+        root = Path(root)
+        source = source or root.name
+
+        def produce():
+            for entry in sorted(os.scandir(root / 'images'), key=lambda e: e.name):
+                if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    label = root / 'labels' / f"{os.path.splitext(entry.name)[0]}.txt"
+                    yield Sample(entry.path, str(label), entry.name, split, source)
+
+        return cls(produce, f"flat:{root}")
+
+    # ----- operators -----
+
+    def map_classes(self, mapping, drop_unmapped=True):
+        """
+        Remap class ids; boxes whose class is not in mapping are dropped
+        (or kept unchanged with drop_unmapped=False). Images are always kept.
+        """
+        mapping = dict(mapping)
+
+        def transform(rows):
+            out = []
+            for cls_id, coords in rows:
+                if cls_id in mapping:
+                    out.append((mapping[cls_id], coords))
+                elif not drop_unmapped:
+                    out.append((cls_id, coords))
+            return out
+
+        transform.key = f"map_classes:{sorted(mapping.items())}:{drop_unmapped}"
+        return DatasetView(lambda: (s.replace(transforms=s.transforms + (transform,)) for s in self),
+                           f"{self.description} | map_classes")
+
+    def filter(self, predicate):
+        """Keep samples for which predicate(sample) is true"""
+        return DatasetView(lambda: (s for s in self if predicate(s)), f"{self.description} | filter")
+
+    def rename(self, prefix):
+        """Prefix output names; '{split}' and '{source}' are substituted per sample"""
+        return DatasetView(
+            lambda: (s.replace(name=prefix.format(split=s.split, source=s.source) + s.name) for s in self),
+            f"{self.description} | rename({prefix})")
+
+    def concat(self, *others):
+        views = (self,) + others
+
+        def produce():
+            for view in views:
+                yield from view
+
+        return DatasetView(produce, ' + '.join(v.description for v in views))
+
+    def split(self, ratios, seed=0):
+        """
+        Split into named views by a stable hash of each sample's output name
+
+        Assignment needs no listing or shuffle buffer and an image keeps its
+        split when others are added or removed.
+
+        Args:
+            ratios: Dict of split name -> fraction (normalized to sum to 1)
+            seed: Changes the assignment while keeping it deterministic
+        """
+        total = float(sum(ratios.values()))
+        bounds = []
+        acc = 0.0
+        for name, ratio in ratios.items():
+            acc += ratio / total
+            bounds.append((acc, name))
+
+        def assign(sample):
+            digest = hashlib.md5(f"{seed}:{sample.name}".encode()).digest()
+            u = int.from_bytes(digest[:8], 'big') / 2**64
+            for bound, name in bounds:
+                if u < bound:
+                    return name
+            return bounds[-1][1]
+
+        return {
+            name: DatasetView(lambda name=name: (s.replace(split=name) for s in self if assign(s) == name),
+                              f"{self.description} | split[{name}]")
+            for name in ratios
+        }
+
+    # ----- terminal operations -----
+
+    def count(self):
+        return sum(1 for _ in self)
+
+    def class_counts(self):
+        counts = {}
+        for sample in self:
+            for cls_id, _ in sample.read_labels():
+                counts[cls_id] = counts.get(cls_id, 0) + 1
+        return counts
+
+    def materialize(self, output_dir, link=False):
+        """
+        Write the view as a real YOLO dataset (<output_dir>/images + labels)
+
+        Args:
+            output_dir: Destination folder
+            link: Hard/sym-link images instead of copying them
+        """
+        images_dir = Path(output_dir) / 'images'
+        labels_dir = Path(output_dir) / 'labels'
+        images_dir.mkdir(parents=True, exist_ok=True)
+        labels_dir.mkdir(parents=True, exist_ok=True)
+
+        written = 0
+        for sample in self:
+            dst = images_dir / sample.name
+            if link:
+                _link_file(sample.image, dst)
+            else:
+                shutil.copy2(sample.image, dst)
+            with open(labels_dir / f"{sample.stem}.txt", 'w') as f:
+                f.write(sample.label_text())
+            written += 1
+        return written
+
+
+def _link_target(src, dst):
+    """Symlink target for dst -> src, relative so the link survives moving both folders together"""
+    try:
+        return os.path.relpath(os.path.abspath(src), os.path.dirname(os.path.abspath(dst)))
+    except ValueError:
+        # Different drive (Windows)
+        return os.path.abspath(src)
+
+
+def _link_file(src, dst):
+    """Link dst to src: symlink, then hardlink, then copy as a last resort (Windows)"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.symlink(_link_target(src, dst), dst)
+    except OSError:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+
+def _overlay_image_dir(sample, overlay_root, dir_links):
+    """
+    Linked images/ folder for a sample whose file name is unchanged, else None
+
+    One directory symlink per source folder replaces a link per image; the
+    trainer still finds the overlay labels next to it by its images->labels
+    path substitution.
+    """
+    if sample.name != os.path.basename(sample.image):
+        return None
+    source_dir = os.path.dirname(os.path.abspath(sample.image))
+    if source_dir not in dir_links:
+        digest = hashlib.md5(source_dir.encode()).hexdigest()[:8]
+        link = overlay_root / f"{sample.source}_{digest}" / 'images'
+        link.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            target = _link_target(source_dir, link)
+            if os.path.islink(link) and os.readlink(link) != target:
+                os.remove(link)
+            if not os.path.lexists(link):
+                os.symlink(target, link, target_is_directory=True)
+            (link.parent / 'labels').mkdir(exist_ok=True)
+        except OSError:
+            # No symlink privilege (Windows): fall back to per-image links
+            link = None
+        dir_links[source_dir] = link
+    return dir_links[source_dir]
+
+
+def export_file_lists(views, output_dir, class_names):
+    """
+    Export views as YOLO file lists plus a data.yaml, without copying images
+
+    Samples that need no label changes are listed at their original path.
+    Others get a label overlay under <output_dir>/overlay/.../labels next to
+    an images link (one per source folder, or per image for renamed
+    samples), so the trainer's images->labels path substitution finds the
+    transformed labels. Overlays whose source label and transforms are
+    unchanged since the last export are not rewritten.
+
+    Args:
+        views: Dict of split name -> DatasetView (e.g. from DatasetView.split())
+        output_dir: Folder for <split>.txt lists, overlays and data.yaml
+        class_names: List of class names for data.yaml
+
+    Returns:
+        Path to the generated data.yaml
+    """
+    output_dir = Path(output_dir).resolve()
+    overlay_root = output_dir / 'overlay'
+    overlay_images = overlay_root / 'images'
+    overlay_labels = overlay_root / 'labels'
+    overlay_images.mkdir(parents=True, exist_ok=True)
+    overlay_labels.mkdir(parents=True, exist_ok=True)
+
+    index_path = output_dir / OVERLAY_INDEX
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+    new_index = {}
+    dir_links = {}
+
+    stats = {}
+    for split, view in views.items():
+        in_place = overlaid = cached = 0
+        with open(output_dir / f"{split}.txt", 'w') as lst:
+            for sample in view:
+                if sample.in_place():
+                    lst.write(list_entry(sample.image, output_dir) + '\n')
+                    in_place += 1
+                    continue
+                images_dir = _overlay_image_dir(sample, overlay_root, dir_links)
+                path = (images_dir or overlay_images) / sample.name
+                label = path.parent.parent / 'labels' / f"{sample.stem}.txt"
+                rel = str(label.relative_to(output_dir))
+                key = sample.fingerprint()
+                if key is not None and index.get(rel) == key and label.exists() and os.path.lexists(path):
+                    cached += 1
+                else:
+                    if images_dir is None:
+                        _link_file(sample.image, path)
+                    atomic_write_text(label, sample.label_text())
+                    overlaid += 1
+                if key is not None:
+                    new_index[rel] = key
+                lst.write(list_entry(path, output_dir) + '\n')
+        stats[split] = (in_place, overlaid, cached)
+    atomic_write_text(index_path, json.dumps(new_index))
+
+    yaml_path = output_dir / 'data.yaml'
+    with open(yaml_path, 'w') as f:
+        f.write("# Lazy dataset view (file lists, no image copies)\n")
+        for split in views:
+            f.write(f"{split}: {split}.txt\n")
+        f.write("\n# Classes\n")
+        f.write(f"nc: {len(class_names)}\n")
+        f.write("names:\n")
+        for idx, name in enumerate(class_names):
+            f.write(f"  {idx}: {name}\n")
+
+    for split, (in_place, overlaid, cached) in stats.items():
+        print(f"  {split}: {in_place + overlaid + cached} images ({in_place} in place, "
+              f"{overlaid} overlaid, {cached} overlays reused)")
+    return yaml_path
+
+
+def export_label_views(dataset_root, output_dir, targets=tuple(LABEL_TARGETS), splits=('train', 'val', 'test')):
+    """
+    Export class-collapsed views of a 4-class dataset, one folder per target
+
+    Each <output_dir>/<target>/data.yaml trains on the same images with that
+    target's classes and keeps the dataset's own splits, so switching between
+    4-class and 1-class training is a matter of picking a data.yaml.
+
+    Returns:
+        Dict of target -> data.yaml path
+    """
+    root = Path(dataset_root)
+    yamls = {}
+    for target in targets:
+        mapping, names = LABEL_TARGETS[target]
+        t0 = time.perf_counter()
+        print(f"{target} ({', '.join(names)}):")
+        views = {}
+        for split in splits:
+            if (root / split / 'images').is_dir():
+                view = DatasetView.from_yolo(root, splits=[split], source=root.name)
+                views[split] = view.map_classes(mapping) if mapping is not None else view
+        if not views:
+            raise FileNotFoundError(f"No {'/'.join(splits)}/images folders under {root}")
+        yamls[target] = export_file_lists(views, Path(output_dir) / target, names)
+        print(f"  -> {yamls[target]} ({time.perf_counter() - t0:.1f}s)")
+    return yamls
+
+
+def plastic_view(warp_root, zerowaste_root):
+    """Lazy equivalent of merge_datasets.merge_and_transform()"""
+    from merge_datasets import WARP_TO_PLASTIC, ZEROWASTE_TO_PLASTIC
+
+    warp = DatasetView.from_yolo(warp_root, splits=['train', 'test'], source='warp')
+    zw = DatasetView.from_yolo(zerowaste_root, splits=['train', 'test', 'val'], source='zw')
+    return (warp.map_classes(WARP_TO_PLASTIC).rename('warp_{split}_')
+            .concat(zw.map_classes(ZEROWASTE_TO_PLASTIC).rename('zw_{split}_')))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 4 and sys.argv[1] == 'labels':
+        # Class-collapsed views of the 4-class merge
+        print("="*60)
+        print("EXPORTING LABEL VIEWS")
+        print("="*60)
+        export_label_views(sys.argv[2], sys.argv[3], sys.argv[4:] or tuple(LABEL_TARGETS))
+        sys.exit(0)
+
+    # Lazy replacement for merge_datasets.py + split_dataset.py
+    if len(sys.argv) < 4:
+        print("Usage: python dataset_view.py <warp_root> <zerowaste_yolo_root> <output_dir> [seed]")
+        print(f"       python dataset_view.py labels <swm_4_classes_root> <output_dir> "
+              f"[{' '.join(LABEL_TARGETS)}]")
+        sys.exit(1)
+
+    from split_dataset import TRAIN_RATIO, VAL_RATIO, TEST_RATIO
+
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    view = plastic_view(sys.argv[1], sys.argv[2])
+    splits = view.split({'train': TRAIN_RATIO, 'val': VAL_RATIO, 'test': TEST_RATIO}, seed=seed)
+
+    print("="*60)
+    print("EXPORTING LAZY PLASTIC DATASET VIEW")
+    print("="*60)
+    yaml_path = export_file_lists(splits, sys.argv[3], ['plastic'])
+    print(f"\nData config: {yaml_path}")
+    print(f"Train with: yolo detect train data={yaml_path} model=yolov8n.pt epochs=100")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Hard-Negative Mining
+Runs a trained detector over the negative images of a dataset (no plastic
+labels) and over optional background folders, in batches, and keeps the
+images with the most confident false positives.
+
+The result is a compact, bounded list (hard_negatives.tsv):
+
+    image  score  false_positives  dhash  iterations
+
+- score is the highest false-positive confidence in the image
+- near-duplicate frames (video sequences) are collapsed by a 64-bit
+  difference hash, keeping the hardest one
+- iterations counts how many consecutive mining rounds an image stayed hard
+
+sampling_weights.py reads the list and boosts these images inside the
+negative share, so the next training round spends its negatives on the
+hard ones instead of easy background.
+"""
+
+import heapq
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from checkpoint import atomic_write_text
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+HEADER = "image\tscore\tfalse_positives\tdhash\titerations\n"
+
+
+def negative_images(dataset_root, splits=('train',)):
+    """
+    Images without labels in a YOLO dataset
+
+    Handles <root>/<split>/images + labels, a flat <root>/images + labels
+    (e.g. swm_final), and plain folders of background images without labels.
+    """
+    root = Path(dataset_root)
+    layouts = [(root / s / 'images', root / s / 'labels') for s in splits]
+    layouts.append((root / 'images', root / 'labels'))
+    layouts = [(images_dir, labels_dir) for images_dir, labels_dir in layouts if images_dir.is_dir()]
+    if not layouts:
+        # Plain folder of background images: every image is a negative
+        layouts = [(root, None)]
+
+    for images_dir, labels_dir in layouts:
+        for entry in sorted(os.scandir(images_dir), key=lambda e: e.name):
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            label = labels_dir / f"{stem}.txt" if labels_dir is not None else None
+            if label is None or not label.exists() or label.stat().st_size == 0:
+                yield os.path.abspath(entry.path)
+
+
+def dhash(image, size=8):
+    """64-bit difference hash of a BGR/gray image (robust to small shifts and noise)"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    """Bit distance between one hash and an array of hashes"""
+    x = np.bitwise_xor(np.asarray(b, np.uint64), np.uint64(a))
+    return np.unpackbits(x.view(np.uint8)).reshape(-1, 64).sum(1)
+
+
+def load_hard_negatives(path):
+    """Read a hard_negatives.tsv into {image: row dict}; missing file -> {}"""
+    rows = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            next(f, None)
+            for line in f:
+                image, score, fps, h, iterations = line.rstrip('\n').split('\t')
+                rows[image] = {'score': float(score), 'false_positives': int(fps),
+                               'dhash': int(h, 16), 'iterations': int(iterations)}
+    return rows
+
+
+def deduplicate(candidates, max_images, max_distance=4):
+    """
+    Hardest-first greedy selection skipping near-duplicates
+
+    Args:
+        candidates: List of (score, image, false_positives, dhash)
+        max_images: Size bound of the result
+        max_distance: dHash bit distance at or below which two images are duplicates
+
+    Returns:
+        (selected list, number of duplicates dropped)
+    """
+    selected, hashes = [], []
+    dropped = 0
+    for cand in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        if hashes and hamming(cand[3], hashes).min() <= max_distance:
+            dropped += 1
+            continue
+        selected.append(cand)
+        hashes.append(cand[3])
+        if len(selected) >= max_images:
+            break
+    return selected, dropped
+
+
+def mine_hard_negatives(weights, dataset_root, output='hard_negatives.tsv', splits=('train',),
+                        background_dirs=(), conf=0.25, batch=32, imgsz=640, max_images=500,
+                        max_distance=4, device=None):
+    """
+    Score negative images with the detector and write the bounded hard-negative list
+
+    Only the running top candidates are hashed and kept (a min-heap of
+    3 x max_images, leaving room for near-duplicates), so memory stays
+    bounded however many negatives there are.
+
+    Args:
+        weights: Trained detector (best.pt)
+        dataset_root: Dataset whose unlabeled images are mined
+        output: hard_negatives.tsv to write; an existing list supplies the
+            iteration counts
+        splits: Splits of dataset_root to mine
+        background_dirs: Extra folders of images known to contain no plastic
+        conf: Minimum confidence for a detection to count as a false positive
+        max_images: Size bound of the list
+        max_distance: dHash distance treated as a duplicate frame
+
+    Returns:
+        List of selected rows
+    """
+    from ultralytics import YOLO
+
+    images = list(negative_images(dataset_root, splits))
+    for folder in background_dirs:
+        images.extend(negative_images(folder, ()))
+    images = list(dict.fromkeys(images))
+    previous = load_hard_negatives(output)
+
+    print("="*70)
+    print("Hard-Negative Mining")
+    print("="*70)
+    print(f"Model: {weights}")
+    print(f"Negatives: {len(images)} images  conf>={conf}  keep<={max_images}\n")
+
+    model = YOLO(weights)
+    heap = []
+    heap_size = max_images * 3
+    with_fp = 0
+    t0 = time.perf_counter()
+    for start in range(0, len(images), batch):
+        chunk = images[start:start + batch]
+        results = model.predict(chunk, conf=conf, imgsz=imgsz, device=device, verbose=False)
+        for path, result in zip(chunk, results):
+            scores = result.boxes.conf.cpu().numpy()
+            if not len(scores):
+                continue
+            with_fp += 1
+            score = float(scores.max())
+            if len(heap) < heap_size or score > heap[0][0]:
+                item = (score, path, int(len(scores)), dhash(result.orig_img))
+                if len(heap) < heap_size:
+                    heapq.heappush(heap, item)
+                else:
+                    heapq.heapreplace(heap, item)
+        print(f"  {min(start + batch, len(images))}/{len(images)} images, {with_fp} with false positives",
+              end='\r')
+    seconds = time.perf_counter() - t0
+
+    selected, dropped = deduplicate(heap, max_images, max_distance)
+    rows = [HEADER]
+    for score, path, fps, h in selected:
+        iterations = previous[path]['iterations'] + 1 if path in previous else 1
+        rows.append(f"{path}\t{score:.4f}\t{fps}\t{h:016x}\t{iterations}\n")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    atomic_write_text(output, ''.join(rows))
+
+    still_hard = sum(1 for _, path, _, _ in selected if path in previous)
+    print(f"\n\n✓ {len(selected)} hard negatives -> {output} ({seconds:.1f}s, "
+          f"{len(images) / max(seconds, 1e-9):.1f} img/s)")
+    print(f"  Images with false positives: {with_fp}/{len(images)}")
+    print(f"  Near-duplicates dropped:     {dropped}")
+    if previous:
+        print(f"  Still hard from last round:  {still_hard}/{len(previous)}")
+    return selected
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mine high-confidence false positives on negative images")
+    parser.add_argument('weights', help="trained detector, e.g. best.pt")
+    parser.add_argument('dataset', help="dataset root (split, flat or plain image folder)")
+    parser.add_argument('--output', default='hard_negatives.tsv')
+    parser.add_argument('--splits', nargs='+', default=['train'])
+    parser.add_argument('--background', nargs='*', default=[], help="extra folders with no plastic")
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--max-images', type=int, default=500)
+    parser.add_argument('--max-distance', type=int, default=4)
+    parser.add_argument('--device', default=None)
+    args = parser.parse_args()
+
+    mine_hard_negatives(args.weights, args.dataset, args.output, args.splits, args.background,
+                        args.conf, args.batch, args.imgsz, args.max_images, args.max_distance, args.device)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Manifest-Driven N-Way Dataset Merge
+Generic replacement for merge_datasets.py (WaRP + ZeroWaste only) and
+merge_yolo_datasets.py (name prefixes): any number of YOLO sources, each
+with its own class map, described in a YAML manifest (see merge_manifest.yaml).
+
+    layout: flat | split      # flat: images/ + labels/ (split later); split: keep source splits
+    classes: [plastic]
+    sources:
+      - name: warp
+        path: warp            # pipeline path key, or folder relative to the manifest
+        splits: [train, test] # optional, default train/val/test (flat sources: ignored)
+        class_map: {0: 0, 3: 0}   # optional, default identity; unmapped boxes are dropped
+
+Output files are named by the SHA-1 of the image content, so names never
+collide and the same image arriving from two sources is detected with one
+dict lookup per image (O(n) overall). The first source in manifest order
+keeps a duplicate; the others are listed in duplicates.tsv.
+
+Runs in three passes:
+  1. hash images + map labels    (process pool, all sources interleaved)
+  2. resolve duplicates          (single pass over the hashes)
+  3. copy images + write labels  (process pool, atomic + journaled)
+and records every output image in provenance.db.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import yaml
+
+from checkpoint import ProgressJournal, atomic_write_text
+from pipeline_metrics import PipelineMetrics, get_metrics
+from provenance import ProvenanceTable
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+SPLITS = ('train', 'val', 'test')
+HASH_LENGTH = 16
+
+
+def load_manifest(manifest, path_keys=None):
+    """
+    Read a merge manifest and resolve its source paths
+
+    Args:
+        manifest: YAML file path or an already-loaded dict
+        path_keys: Optional pipeline paths dict; a source path naming one of
+            its keys resolves to that path
+
+    Returns:
+        Manifest dict with absolute source paths and int class maps
+    """
+    base = Path('.')
+    if not isinstance(manifest, dict):
+        base = Path(manifest).parent
+        with open(manifest) as f:
+            manifest = yaml.safe_load(f)
+    path_keys = path_keys or {}
+
+    names = [s['name'] for s in manifest['sources']]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Source names must be unique, repeated: {', '.join(duplicates)}")
+    layout = manifest.get('layout', 'split')
+    if layout not in ('flat', 'split'):
+        raise ValueError(f"Unknown layout {layout!r}, expected 'flat' or 'split'")
+
+    sources = []
+    for source in manifest['sources']:
+        path = path_keys.get(source['path']) or (base / source['path'])
+        class_map = source.get('class_map')
+        sources.append({
+            'name': source['name'],
+            'path': os.path.abspath(path),
+            'splits': list(source.get('splits', SPLITS)),
+            'class_map': {int(k): int(v) for k, v in class_map.items()} if class_map is not None else None,
+        })
+    return {'layout': layout, 'classes': list(manifest['classes']), 'sources': sources}
+
+
+def source_images(source):
+    """
+    (split, image path, label path) for every labeled image of a source
+
+    Handles <path>/<split>/images|data + labels and flat <path>/images +
+    labels; a label next to the image is used as a fallback.
+    """
+    root = Path(source['path'])
+    layouts = []
+    for split in source['splits']:
+        for images_name in ('images', 'data'):
+            if (root / split / images_name).is_dir():
+                layouts.append((split, root / split / images_name, root / split / 'labels'))
+                break
+    if not layouts and (root / 'images').is_dir():
+        layouts.append(('train', root / 'images', root / 'labels'))
+
+    for split, images_dir, labels_dir in layouts:
+        for entry in sorted(os.scandir(images_dir), key=lambda e: e.name):
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            label = labels_dir / f"{stem}.txt"
+            if not label.exists():
+                label = Path(entry.path).with_suffix('.txt')
+                if not label.exists():
+                    continue
+            yield split, entry.path, str(label)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def map_label(label_path, class_map):
+    """(label text, original class per kept line, dropped box count)"""
+    lines, original, dropped = [], [], 0
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            class_id = int(parts[0])
+            target = class_id if class_map is None else class_map.get(class_id)
+            if target is None:
+                dropped += 1
+                continue
+            lines.append(f"{target} {' '.join(parts[1:])}\n")
+            original.append(class_id)
+    return ''.join(lines), original, dropped
+
+
+def scan_image(source_index, split, image, label, class_map):
+    """Pass 1 worker: content hash + mapped label of one image"""
+    metrics = PipelineMetrics('manifest_merge.worker')
+    with metrics.stage('image_hash'):
+        digest = file_hash(image)
+    metrics.count('image_hash_bytes', os.path.getsize(image))
+    with metrics.stage('label_transform'):
+        text, original, dropped = map_label(label, class_map)
+    return (source_index, split, image, digest, text, original, dropped), metrics.as_dict()
+
+
+def _scan_task(args):
+    return scan_image(*args)
+
+
+def write_item(image, image_dst, label_text, label_dst):
+    """Pass 3 worker: copy one image and write its label"""
+    metrics = PipelineMetrics('manifest_merge.worker')
+    metrics.copy_file(image, image_dst)
+    metrics.write_text(label_dst, label_text)
+    return metrics.as_dict()
+
+
+def _write_task(args):
+    return write_item(*args)
+
+
+def _interleave(lists):
+    """Round-robin over several lists so every source is worked on at once"""
+    iters = [iter(items) for items in lists]
+    while iters:
+        for it in list(iters):
+            try:
+                yield next(it)
+            except StopIteration:
+                iters.remove(it)
+
+
+def merge_manifest(manifest, output_dir, path_keys=None, workers=None):
+    """
+    Merge every source of a manifest into output_dir with content-hash names
+
+    Args:
+        manifest: Manifest YAML path or dict (see module docstring)
+        output_dir: Output dataset (flat images/ + labels/ or <split>/images + labels)
+        path_keys: Optional pipeline paths dict for resolving source paths
+        workers: Process pool size (default: CPU count)
+
+    Returns:
+        Dict of per-source statistics
+    """
+    manifest = load_manifest(manifest, path_keys)
+    sources = manifest['sources']
+    flat = manifest['layout'] == 'flat'
+    workers = workers or os.cpu_count()
+    metrics = get_metrics('manifest_merge').start(
+        sources=[s['path'] for s in sources], layout=manifest['layout'], workers=workers)
+
+    print("="*70)
+    print("Manifest Merge")
+    print("="*70)
+    for i, s in enumerate(sources, 1):
+        mapping = 'identity' if s['class_map'] is None else f"{len(s['class_map'])} classes mapped"
+        print(f"  {i}. {s['name']}: {s['path']} ({mapping})")
+    print(f"Classes: {', '.join(manifest['classes'])}")
+    print(f"Output:  {output_dir} ({manifest['layout']})\n")
+
+    with metrics.stage('file_discovery'):
+        per_source = [[(i, split, image, label, s['class_map']) for split, image, label in source_images(s)]
+                      for i, s in enumerate(sources)]
+    tasks = list(_interleave(per_source))
+    chunksize = max(1, len(tasks) // (workers * 8))
+
+    # Pass 1: hash + map labels, concurrently across all sources
+    t0 = time.perf_counter()
+    scanned = [[] for _ in sources]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, (item, worker_metrics) in enumerate(pool.map(_scan_task, tasks, chunksize=chunksize), 1):
+            scanned[item[0]].append(item)
+            metrics.merge(worker_metrics)
+            if done % 1000 == 0:
+                print(f"  Hashed {done}/{len(tasks)} images...", end='\r')
+    print(f"  Hashed {len(tasks)} images in {time.perf_counter() - t0:.1f}s")
+
+    # Pass 2: first occurrence in manifest order wins (pool completion order doesn't matter)
+    with metrics.stage('deduplicate'):
+        kept = {}
+        duplicates = []
+        for items in scanned:
+            for item in sorted(items, key=lambda it: (it[1], it[2])):
+                first = kept.get(item[3])
+                if first is None:
+                    kept[item[3]] = item
+                else:
+                    duplicates.append((first, item))
+
+    os.makedirs(output_dir, exist_ok=True)
+    with ProgressJournal(output_dir, 'manifest_merge') as journal:
+        if journal.resumed:
+            print(f"↻ Resuming: {len(journal)} images already written "
+                  f"({journal.stale_temp_files} partial files cleaned up)")
+        provenance = ProvenanceTable(output_dir)
+        stats = {s['name']: {'images': 0, 'annotations': 0, 'dropped': 0, 'negatives': 0, 'duplicates': 0}
+                 for s in sources}
+
+        # Pass 3: write the winners
+        writes = []
+        for digest, (source_index, split, image, _, text, original, dropped) in kept.items():
+            out_split = '' if flat else split
+            images_dir = os.path.join(output_dir, out_split, 'images')
+            labels_dir = os.path.join(output_dir, out_split, 'labels')
+            os.makedirs(images_dir, exist_ok=True)
+            os.makedirs(labels_dir, exist_ok=True)
+            name = digest + os.path.splitext(image)[1].lower()
+            if name not in journal:
+                writes.append((image, os.path.join(images_dir, name), text, os.path.join(labels_dir, f"{digest}.txt")))
+
+            source = sources[source_index]
+            provenance.add(name, source['name'], split, os.path.relpath(image, source['path']), original)
+            s = stats[source['name']]
+            s['images'] += 1
+            s['annotations'] += len(original)
+            s['dropped'] += dropped
+            s['negatives'] += not original
+
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(writes) // (workers * 8))
+            for (image, image_dst, _, _), worker_metrics in zip(
+                    writes, pool.map(_write_task, writes, chunksize=chunksize)):
+                journal.mark(os.path.basename(image_dst))
+                metrics.merge(worker_metrics)
+        print(f"  Wrote {len(writes)} images in {time.perf_counter() - t0:.1f}s "
+              f"({len(kept) - len(writes)} already written)")
+
+        rows = ["hash\tkept_source\tkept_image\tduplicate_source\tduplicate_image\tsame_labels\n"]
+        for first, dup in duplicates:
+            stats[sources[dup[0]]['name']]['duplicates'] += 1
+            rows.append(f"{first[3]}\t{sources[first[0]]['name']}\t{first[2]}\t"
+                        f"{sources[dup[0]]['name']}\t{dup[2]}\t{int(first[4] == dup[4])}\n")
+        atomic_write_text(os.path.join(output_dir, 'duplicates.tsv'), ''.join(rows))
+
+        with open(os.path.join(output_dir, 'classes.txt'), 'w') as f:
+            for class_name in manifest['classes']:
+                f.write(f"{class_name}\n")
+        # A flat merge gets its data.yaml from split_dataset.py
+        if not flat:
+            with open(os.path.join(output_dir, 'data.yaml'), 'w') as f:
+                f.write("# Manifest merge\n")
+                f.write(f"# Combined from: {', '.join(s['name'] for s in sources)}\n\n")
+                f.write("train: train/images\nval: val/images\ntest: test/images\n\n")
+                f.write("# Classes\n")
+                f.write(f"nc: {len(manifest['classes'])}\n")
+                f.write("names:\n")
+                for idx, class_name in enumerate(manifest['classes']):
+                    f.write(f"  {idx}: {class_name}\n")
+
+        print(f"\n{'Source':<14} {'images':>8} {'boxes':>8} {'dropped':>8} {'negatives':>10} {'duplicates':>11}")
+        for name, s in stats.items():
+            print(f"{name:<14} {s['images']:>8} {s['annotations']:>8} {s['dropped']:>8} "
+                  f"{s['negatives']:>10} {s['duplicates']:>11}")
+        print(f"\n✓ {len(kept)} unique images -> {os.path.abspath(output_dir)}")
+        if duplicates:
+            print(f"  {len(duplicates)} duplicates skipped (see duplicates.tsv)")
+
+        provenance.close()
+    metrics.count('images', len(kept))
+    metrics.count('duplicates', len(duplicates))
+    metrics.finish()
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge N YOLO datasets described by a manifest")
+    parser.add_argument('manifest', help="merge manifest YAML (e.g. merge_manifest.yaml)")
+    parser.add_argument('output', help="output dataset folder")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    merge_manifest(args.manifest, args.output, workers=args.workers)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Memory Budget
+Helpers for processing very large images and dense masks in bounded memory:
+
+  MemoryBudget     byte budget shared by all worker processes of a pool;
+                   a worker reserves the estimated size of a large buffer
+                   (decoded mask, image) before allocating it and waits while
+                   the other workers hold the rest of the budget
+  ReusableBuffer   grow-only scratch array reused across images instead of
+                   allocating a fresh full-frame array per image/polygon
+  image_shape      (height, width) from the file header without decoding
+
+    budget = MemoryBudget(2048 * 1024**2)
+    with ProcessPoolExecutor(workers, initializer=install_budget, initargs=(budget,)) as pool: ...
+
+    # in the worker
+    with worker_budget().reserve(height * width):
+        mask = ...
+"""
+
+import contextlib
+import multiprocessing as mp
+import warnings
+
+import numpy as np
+
+MB = 1024**2
+
+
+class MemoryBudget:
+    """
+    Byte budget enforced across processes
+
+    Pass it to pool workers through the pool initializer (install_budget);
+    synchronization primitives cannot travel with individual tasks.
+
+    Args:
+        limit: Budget in bytes
+        ctx: multiprocessing context the pool uses (default: the default context)
+    """
+
+    def __init__(self, limit, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.limit = int(limit)
+        self._used = ctx.Value('q', 0, lock=False)
+        self._cond = ctx.Condition()
+
+    @property
+    def used(self):
+        return self._used.value
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes):
+        """Hold nbytes of the budget for the duration of the block (capped at the whole budget)"""
+        nbytes = max(0, min(int(nbytes), self.limit))
+        with self._cond:
+            self._cond.wait_for(lambda: self._used.value + nbytes <= self.limit)
+            self._used.value += nbytes
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._used.value -= nbytes
+                self._cond.notify_all()
+
+
+class _Unlimited:
+    limit = None
+    used = 0
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes):
+        yield
+
+
+_budget = _Unlimited()
+
+
+def install_budget(budget):
+    """Pool initializer: make budget the worker_budget() of this process"""
+    global _budget
+    _budget = budget if budget is not None else _Unlimited()
+
+
+def worker_budget():
+    """Budget installed in this process (no-op when none was configured)"""
+    return _budget
+
+
+def make_budget(memory_mb, ctx=None):
+    """MemoryBudget for a size in MB, or None for unlimited"""
+    return MemoryBudget(memory_mb * MB, ctx) if memory_mb else None
+
+
+class ReusableBuffer:
+    """
+    Grow-only scratch array
+
+    get() returns a view of the requested shape over one underlying
+    allocation, which only grows when a larger shape is requested.
+    """
+
+    def __init__(self, dtype=np.uint8):
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty(0, self.dtype)
+
+    def get(self, shape, zero=True):
+        size = int(np.prod(shape))
+        if size > self._data.size:
+            self._data = np.empty(size, self.dtype)
+        view = self._data[:size].reshape(shape)
+        if zero:
+            view.fill(0)
+        return view
+
+    def trim(self, max_bytes):
+        """Drop the allocation if it grew beyond max_bytes (e.g. after one huge mask)"""
+        if self._data.nbytes > max_bytes:
+            self._data = np.empty(0, self.dtype)
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+
+def image_shape(path):
+    """(height, width) read from the image header, or None when Pillow is unavailable or fails"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        # Only the header is read, so Pillow's decompression-bomb guard does not apply
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(path) as img:
+                width, height = img.size
+    except (OSError, Image.DecompressionBombError):
+        return None
+    return height, width
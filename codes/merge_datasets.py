@@ -1,8 +1,10 @@
-import shutil
 from pathlib import Path
 from tqdm import tqdm
 import random
 
+from pipeline_metrics import get_metrics
+from provenance import ProvenanceTable
+
 WARP_ROOT = Path("./warp")
 ZEROWASTE_ROOT = Path("./zerowaste_yolo")
 OUTPUT_ROOT = Path("./swm_final")
@@ -29,12 +31,26 @@ ZEROWASTE_TO_PLASTIC = {
 
 
 
-def merge_and_transform():
-    """Merge WaRP + ZeroWaste and transform to single-class plastic detection"""
+def merge_and_transform(warp_root=WARP_ROOT, zerowaste_root=ZEROWASTE_ROOT, output_root=OUTPUT_ROOT):
+    """
+    Merge WaRP + ZeroWaste and transform to single-class plastic detection
+
+    Args:
+        warp_root: Raw WaRP dataset (28 classes)
+        zerowaste_root: ZeroWaste converted to YOLO (convert_to_yolo.py output)
+        output_root: Output folder with flat images/ and labels/
+    """
+    warp_root = Path(warp_root)
+    zerowaste_root = Path(zerowaste_root)
+    output_root = Path(output_root)
+    
+    metrics = get_metrics('merge_datasets').start(
+        warp=str(warp_root.absolute()), zerowaste=str(zerowaste_root.absolute()))
     
     
-    (OUTPUT_ROOT / "images").mkdir(parents=True, exist_ok=True)
-    (OUTPUT_ROOT / "labels").mkdir(parents=True, exist_ok=True)
+    (output_root / "images").mkdir(parents=True, exist_ok=True)
+    (output_root / "labels").mkdir(parents=True, exist_ok=True)
+    provenance = ProvenanceTable(output_root)
     
     stats = {
         'total_images': 0,
@@ -53,18 +69,19 @@ def merge_and_transform():
     
     warp_splits = ['train', 'test']
     for split in warp_splits:
-        images_dir = WARP_ROOT / split / "images"
-        labels_dir = WARP_ROOT / split / "labels"
+        images_dir = warp_root / split / "images"
+        labels_dir = warp_root / split / "labels"
         
         if not images_dir.exists():
-            images_dir = WARP_ROOT / "images"
-            labels_dir = WARP_ROOT / "labels"
+            images_dir = warp_root / "images"
+            labels_dir = warp_root / "labels"
         
         if not images_dir.exists():
             print(f"WaRP {split} images not found at {images_dir}")
             continue
         
-        image_files = list(images_dir.glob("*.jpg")) + list(images_dir.glob("*.png"))
+        with metrics.stage('file_discovery'):
+            image_files = sorted(p for p in images_dir.iterdir() if p.suffix.lower() in (".jpg", ".png"))
         
         for img_path in tqdm(image_files, desc=f"WaRP {split}"):
             
@@ -79,10 +96,11 @@ def merge_and_transform():
             
             
             plastic_lines = []
+            original_classes = []
             deleted_count = 0
             
             if label_path.exists():
-                with open(label_path, 'r') as f:
+                with metrics.stage('label_transform'), open(label_path, 'r') as f:
                     for line in f:
                         parts = line.strip().split()
                         if len(parts) < 5:
@@ -94,17 +112,18 @@ def merge_and_transform():
                         if class_id in WARP_TO_PLASTIC:
                             
                             plastic_lines.append(f"0 {' '.join(parts[1:])}\n")
+                            original_classes.append(class_id)
                         else:
                             deleted_count += 1
             
             
             new_img_name = f"warp_{split}_{img_path.name}"
-            shutil.copy(img_path, OUTPUT_ROOT / "images" / new_img_name)
+            metrics.copy_file(img_path, output_root / "images" / new_img_name)
             
             
             new_label_name = f"warp_{split}_{img_path.stem}.txt"
-            with open(OUTPUT_ROOT / "labels" / new_label_name, 'w') as f:
-                f.writelines(plastic_lines)
+            metrics.write_text(output_root / "labels" / new_label_name, ''.join(plastic_lines))
+            provenance.add(new_img_name, 'warp', split, img_path.name, original_classes)
             
             
             stats['total_images'] += 1
@@ -121,14 +140,15 @@ def merge_and_transform():
     
     zw_splits = ['train', 'test', 'val']
     for split in zw_splits:
-        images_dir = ZEROWASTE_ROOT / split / "images"
-        labels_dir = ZEROWASTE_ROOT / split / "labels"
+        images_dir = zerowaste_root / split / "images"
+        labels_dir = zerowaste_root / split / "labels"
         
         if not images_dir.exists():
             print(f"ZeroWaste {split} not found at {images_dir}")
             continue
         
-        image_files = list(images_dir.glob("*.jpg")) + list(images_dir.glob("*.png"))
+        with metrics.stage('file_discovery'):
+            image_files = sorted(p for p in images_dir.iterdir() if p.suffix.lower() in (".jpg", ".png"))
         
         for img_path in tqdm(image_files, desc=f"ZeroWaste {split}"):
             label_path = labels_dir / f"{img_path.stem}.txt"
@@ -139,9 +159,10 @@ def merge_and_transform():
             
             
             plastic_lines = []
+            original_classes = []
             deleted_count = 0
             
-            with open(label_path, 'r') as f:
+            with metrics.stage('label_transform'), open(label_path, 'r') as f:
                 for line in f:
                     parts = line.strip().split()
                     if len(parts) < 5:
@@ -153,17 +174,18 @@ def merge_and_transform():
                     if class_id in ZEROWASTE_TO_PLASTIC:
                         
                         plastic_lines.append(f"0 {' '.join(parts[1:])}\n")
+                        original_classes.append(class_id)
                     else:
                         deleted_count += 1
             
             
             new_img_name = f"zw_{split}_{img_path.name}"
-            shutil.copy(img_path, OUTPUT_ROOT / "images" / new_img_name)
+            metrics.copy_file(img_path, output_root / "images" / new_img_name)
             
             
             new_label_name = f"zw_{split}_{img_path.stem}.txt"
-            with open(OUTPUT_ROOT / "labels" / new_label_name, 'w') as f:
-                f.writelines(plastic_lines)
+            metrics.write_text(output_root / "labels" / new_label_name, ''.join(plastic_lines))
+            provenance.add(new_img_name, 'zw', split, img_path.name, original_classes)
             
             
             stats['total_images'] += 1
@@ -184,11 +206,18 @@ def merge_and_transform():
     print(f"Images WITHOUT plastic:     {stats['images_without_plastic']} ({stats['images_without_plastic']/stats['total_images']*100:.1f}%)")
     print(f"Total plastic boxes kept:   {stats['total_plastic_boxes']}")
     print(f"Non-plastic boxes deleted:  {stats['deleted_boxes']}")
-    print(f"\nOutput location: {OUTPUT_ROOT.absolute()}")
+    print(f"\nOutput location: {output_root.absolute()}")
     print("\nClass distribution:")
     print(f"  Class 0 (plastic): {stats['total_plastic_boxes']} instances")
     print(f"  Negative samples:  {stats['images_without_plastic']} images")
     
+    provenance.close()
+    print(f"Provenance table: {(output_root / 'provenance.db').absolute()}")
+    
+    for key, value in stats.items():
+        metrics.count(key, value)
+    metrics.finish()
+    
     return stats
 
 if __name__ == "__main__":
@@ -7,9 +7,19 @@ Target classes: rigid_plastic, soft_plastic, cardboard, metal
 """
 
 import os
-import shutil
 from collections import defaultdict
 
+from checkpoint import ProgressJournal
+from pipeline_metrics import get_metrics
+from provenance import ProvenanceTable
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
+
+
+def _label_classes(label_lines):
+    return [int(line.split()[0]) for line in label_lines]
+
+
 def merge_yolo_datasets(dataset_paths, output_dir='merged_dataset', dataset_names=None):
     """
     Merge multiple YOLO datasets with the same class structure
@@ -22,8 +32,15 @@ def merge_yolo_datasets(dataset_paths, output_dir='merged_dataset', dataset_name
 
     target_classes = ['rigid_plastic', 'soft_plastic', 'cardboard', 'metal']
 
+    metrics = get_metrics('merge_yolo_datasets').start(
+        datasets=[os.path.abspath(p) for p in dataset_paths])
+
     if dataset_names is None:
         dataset_names = [f"dataset{i+1}" for i in range(len(dataset_paths))]
+    if len(set(dataset_names)) != len(dataset_names):
+        # Names are the file prefixes; a repeated one would silently overwrite files
+        raise ValueError(f"Dataset names must be unique: {dataset_names} (see manifest_merge.py "
+                         f"for content-hash names)")
 
     print("="*70)
     print("YOLO Dataset Merger")
@@ -40,167 +57,203 @@ def merge_yolo_datasets(dataset_paths, output_dir='merged_dataset', dataset_name
     stats = defaultdict(lambda: {'images': 0, 'annotations': 0})
     total_stats = {'images': 0, 'annotations': 0}
 
-    for split in splits:
-        print(f"{'='*70}")
-        print(f"Processing {split.upper()} split...")
-        print('='*70)
-
-        # Create output directories
-        output_images_dir = os.path.join(output_dir, split, 'images')
-        output_labels_dir = os.path.join(output_dir, split, 'labels')
-        os.makedirs(output_images_dir, exist_ok=True)
-        os.makedirs(output_labels_dir, exist_ok=True)
-
-        split_images = 0
-        split_annotations = 0
-
-        # Process each dataset
-        for dataset_path, dataset_name in zip(dataset_paths, dataset_names):
-            print(f"\n  Processing {dataset_name}...")
-
-            # Check for both possible directory structures
-            images_src_dirs = [
-                os.path.join(dataset_path, split, 'images'),
-                os.path.join(dataset_path, split, 'data')  # For zerowaste structure
-            ]
-            labels_src_dirs = [
-                os.path.join(dataset_path, split, 'labels'),
-                os.path.join(dataset_path, split, 'labels')
-            ]
-
-            images_src_dir = None
-            labels_src_dir = None
-
-            for img_dir, lbl_dir in zip(images_src_dirs, labels_src_dirs):
-                if os.path.exists(img_dir) and os.path.exists(lbl_dir):
-                    images_src_dir = img_dir
-                    labels_src_dir = lbl_dir
-                    break
-
-            if images_src_dir is None or labels_src_dir is None:
-                print(f"    ⚠ {split} split not found in {dataset_name}, skipping")
-                continue
-
-            # Get all label files
-            if not os.path.exists(labels_src_dir):
-                print(f"    ⚠ Labels directory not found, skipping")
-                continue
-
-            label_files = [f for f in os.listdir(labels_src_dir) if f.endswith('.txt')]
-
-            if len(label_files) == 0:
-                print(f"    ⚠ No label files found, skipping")
-                continue
-
-            dataset_images = 0
-            dataset_annotations = 0
-
-            for label_file in label_files:
-                # Create unique filename by prefixing with dataset name
-                base_name = os.path.splitext(label_file)[0]
-                new_label_file = f"{dataset_name}_{label_file}"
-
-                # Copy label file
-                src_label = os.path.join(labels_src_dir, label_file)
-                dst_label = os.path.join(output_labels_dir, new_label_file)
-
-                # Count annotations while copying
-                with open(src_label, 'r') as f:
-                    label_lines = [line for line in f if line.strip()]
-                    dataset_annotations += len(label_lines)
-
-                shutil.copy2(src_label, dst_label)
-
-                # Find and copy corresponding image
-                image_extensions = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
-                image_copied = False
-
-                for ext in image_extensions:
-                    image_file = base_name + ext
-                    src_image = os.path.join(images_src_dir, image_file)
-
-                    if os.path.exists(src_image):
-                        new_image_file = f"{dataset_name}_{image_file}"
-                        dst_image = os.path.join(output_images_dir, new_image_file)
-                        shutil.copy2(src_image, dst_image)
-                        dataset_images += 1
-                        image_copied = True
+    # Finished files are journaled so a re-run after a crash only does the rest
+    with ProgressJournal(output_dir, 'merge_yolo_datasets') as journal:
+        if journal.resumed:
+            print(f"↻ Resuming: {len(journal)} files already merged "
+                  f"({journal.stale_temp_files} partial files cleaned up)\n")
+        provenance = ProvenanceTable(output_dir)
+
+        for split in splits:
+            print(f"{'='*70}")
+            print(f"Processing {split.upper()} split...")
+            print('='*70)
+
+            # Create output directories
+            output_images_dir = os.path.join(output_dir, split, 'images')
+            output_labels_dir = os.path.join(output_dir, split, 'labels')
+            os.makedirs(output_images_dir, exist_ok=True)
+            os.makedirs(output_labels_dir, exist_ok=True)
+
+            split_images = 0
+            split_annotations = 0
+
+            # Process each dataset
+            for dataset_path, dataset_name in zip(dataset_paths, dataset_names):
+                print(f"\n  Processing {dataset_name}...")
+
+                # Check for both possible directory structures
+                images_src_dirs = [
+                    os.path.join(dataset_path, split, 'images'),
+                    os.path.join(dataset_path, split, 'data')  # For zerowaste structure
+                ]
+                labels_src_dirs = [
+                    os.path.join(dataset_path, split, 'labels'),
+                    os.path.join(dataset_path, split, 'labels')
+                ]
+
+                images_src_dir = None
+                labels_src_dir = None
+
+                for img_dir, lbl_dir in zip(images_src_dirs, labels_src_dirs):
+                    if os.path.exists(img_dir) and os.path.exists(lbl_dir):
+                        images_src_dir = img_dir
+                        labels_src_dir = lbl_dir
                         break
 
-                if not image_copied:
-                    print(f"    ⚠ Image not found for {label_file}")
-
-            print(f"    ✓ Added {dataset_images} images, {dataset_annotations} annotations")
-
-            split_images += dataset_images
-            split_annotations += dataset_annotations
-            stats[dataset_name]['images'] += dataset_images
-            stats[dataset_name]['annotations'] += dataset_annotations
-
-        total_stats['images'] += split_images
-        total_stats['annotations'] += split_annotations
-
-        print(f"\n  {split.upper()} totals: {split_images} images, {split_annotations} annotations")
-
-    # Create data.yaml
-    yaml_path = os.path.join(output_dir, 'data.yaml')
-    with open(yaml_path, 'w') as f:
-        f.write("# Merged YOLO Dataset\n")
-        f.write(f"# Combined from: {', '.join(dataset_names)}\n")
-        f.write(f"# Total images: {total_stats['images']}\n")
-        f.write(f"# Total annotations: {total_stats['annotations']}\n\n")
-        f.write(f"path: {os.path.abspath(output_dir)}\n")
-        f.write("train: train/images\n")
-        f.write("val: val/images\n")
-        f.write("test: test/images\n\n")
-        f.write("# Classes\n")
-        f.write(f"nc: {len(target_classes)}\n")
-        f.write("names:\n")
-        for idx, class_name in enumerate(target_classes):
-            f.write(f"  {idx}: {class_name}\n")
-
-    # Create classes.txt
-    classes_path = os.path.join(output_dir, 'classes.txt')
-    with open(classes_path, 'w') as f:
-        for class_name in target_classes:
-            f.write(f"{class_name}\n")
-
-    # Create merge statistics file
-    stats_path = os.path.join(output_dir, 'merge_statistics.txt')
-    with open(stats_path, 'w') as f:
-        f.write("Merged Dataset Statistics\n")
-        f.write("="*70 + "\n\n")
-        f.write(f"Total Images: {total_stats['images']}\n")
-        f.write(f"Total Annotations: {total_stats['annotations']}\n\n")
-        f.write("Breakdown by source dataset:\n")
-        f.write("-"*70 + "\n")
+                if images_src_dir is None or labels_src_dir is None:
+                    print(f"    ⚠ {split} split not found in {dataset_name}, skipping")
+                    continue
+
+                # Get all label files
+                if not os.path.exists(labels_src_dir):
+                    print(f"    ⚠ Labels directory not found, skipping")
+                    continue
+
+                with metrics.stage('file_discovery'):
+                    label_files = [f for f in os.listdir(labels_src_dir) if f.endswith('.txt')]
+
+                if len(label_files) == 0:
+                    print(f"    ⚠ No label files found, skipping")
+                    continue
+
+                dataset_images = 0
+                dataset_annotations = 0
+
+                for label_file in label_files:
+                    journal_key = f"{split}/{dataset_name}/{label_file}"
+                    # Create unique filename by prefixing with dataset name
+                    base_name = os.path.splitext(label_file)[0]
+
+                    if journal_key in journal:
+                        annotations, _, copied = journal.get(journal_key).partition(',')
+                        dataset_annotations += int(annotations)
+                        dataset_images += int(copied)
+                        # Provenance rows are batched, so the last batch before a crash may be missing
+                        for ext in IMAGE_EXTENSIONS:
+                            image_file = base_name + ext
+                            if (os.path.exists(os.path.join(images_src_dir, image_file))
+                                    and f"{dataset_name}_{image_file}" not in provenance):
+                                with open(os.path.join(labels_src_dir, label_file)) as f:
+                                    label_lines = [line for line in f if line.strip()]
+                                provenance.add(f"{dataset_name}_{image_file}", dataset_name, split,
+                                               image_file, _label_classes(label_lines))
+                                break
+                        continue
+
+                    new_label_file = f"{dataset_name}_{label_file}"
+
+                    # Copy label file
+                    src_label = os.path.join(labels_src_dir, label_file)
+                    dst_label = os.path.join(output_labels_dir, new_label_file)
+
+                    # Count annotations while copying
+                    with metrics.stage('label_transform'):
+                        with open(src_label, 'r') as f:
+                            label_lines = [line for line in f if line.strip()]
+                            dataset_annotations += len(label_lines)
+
+                    metrics.copy_file(src_label, dst_label, stage='label_write')
+
+                    # Find and copy corresponding image
+                    image_copied = False
+
+                    for ext in IMAGE_EXTENSIONS:
+                        image_file = base_name + ext
+                        src_image = os.path.join(images_src_dir, image_file)
+
+                        if os.path.exists(src_image):
+                            new_image_file = f"{dataset_name}_{image_file}"
+                            dst_image = os.path.join(output_images_dir, new_image_file)
+                            metrics.copy_file(src_image, dst_image)
+                            provenance.add(new_image_file, dataset_name, split, image_file,
+                                           _label_classes(label_lines))
+                            dataset_images += 1
+                            image_copied = True
+                            break
+
+                    if not image_copied:
+                        print(f"    ⚠ Image not found for {label_file}")
+                        metrics.count('missing_images')
+
+                    journal.mark(journal_key, f"{len(label_lines)},{int(image_copied)}")
+
+                print(f"    ✓ Added {dataset_images} images, {dataset_annotations} annotations")
+
+                split_images += dataset_images
+                split_annotations += dataset_annotations
+                stats[dataset_name]['images'] += dataset_images
+                stats[dataset_name]['annotations'] += dataset_annotations
+
+            total_stats['images'] += split_images
+            total_stats['annotations'] += split_annotations
+
+            print(f"\n  {split.upper()} totals: {split_images} images, {split_annotations} annotations")
+
+        # Create data.yaml
+        yaml_path = os.path.join(output_dir, 'data.yaml')
+        with open(yaml_path, 'w') as f:
+            f.write("# Merged YOLO Dataset\n")
+            f.write(f"# Combined from: {', '.join(dataset_names)}\n")
+            f.write(f"# Total images: {total_stats['images']}\n")
+            f.write(f"# Total annotations: {total_stats['annotations']}\n\n")
+            f.write("train: train/images\n")
+            f.write("val: val/images\n")
+            f.write("test: test/images\n\n")
+            f.write("# Classes\n")
+            f.write(f"nc: {len(target_classes)}\n")
+            f.write("names:\n")
+            for idx, class_name in enumerate(target_classes):
+                f.write(f"  {idx}: {class_name}\n")
+
+        # Create classes.txt
+        classes_path = os.path.join(output_dir, 'classes.txt')
+        with open(classes_path, 'w') as f:
+            for class_name in target_classes:
+                f.write(f"{class_name}\n")
+
+        # Create merge statistics file
+        stats_path = os.path.join(output_dir, 'merge_statistics.txt')
+        with open(stats_path, 'w') as f:
+            f.write("Merged Dataset Statistics\n")
+            f.write("="*70 + "\n\n")
+            f.write(f"Total Images: {total_stats['images']}\n")
+            f.write(f"Total Annotations: {total_stats['annotations']}\n\n")
+            f.write("Breakdown by source dataset:\n")
+            f.write("-"*70 + "\n")
+            for dataset_name in dataset_names:
+                f.write(f"\n{dataset_name}:\n")
+                f.write(f"  Images: {stats[dataset_name]['images']}\n")
+                f.write(f"  Annotations: {stats[dataset_name]['annotations']}\n")
+
+        print(f"\n{'='*70}")
+        print("✓ MERGE COMPLETE!")
+        print('='*70)
+        print(f"\nOutput directory: {os.path.abspath(output_dir)}")
+        print(f"\nTotal statistics:")
+        print(f"  Images: {total_stats['images']}")
+        print(f"  Annotations: {total_stats['annotations']}")
+        print(f"\nBreakdown by dataset:")
         for dataset_name in dataset_names:
-            f.write(f"\n{dataset_name}:\n")
-            f.write(f"  Images: {stats[dataset_name]['images']}\n")
-            f.write(f"  Annotations: {stats[dataset_name]['annotations']}\n")
-
-    print(f"\n{'='*70}")
-    print("✓ MERGE COMPLETE!")
-    print('='*70)
-    print(f"\nOutput directory: {os.path.abspath(output_dir)}")
-    print(f"\nTotal statistics:")
-    print(f"  Images: {total_stats['images']}")
-    print(f"  Annotations: {total_stats['annotations']}")
-    print(f"\nBreakdown by dataset:")
-    for dataset_name in dataset_names:
-        print(f"  {dataset_name}:")
-        print(f"    - Images: {stats[dataset_name]['images']}")
-        print(f"    - Annotations: {stats[dataset_name]['annotations']}")
-    print(f"\nGenerated files:")
-    print("  ✓ data.yaml")
-    print("  ✓ classes.txt")
-    print("  ✓ merge_statistics.txt")
-    print("  ✓ train/images/ and train/labels/")
-    print("  ✓ val/images/ and val/labels/")
-    print("  ✓ test/images/ and test/labels/")
-    print('='*70)
-    print("\nNote: Image files are prefixed with dataset name to avoid conflicts")
-    print()
+            print(f"  {dataset_name}:")
+            print(f"    - Images: {stats[dataset_name]['images']}")
+            print(f"    - Annotations: {stats[dataset_name]['annotations']}")
+        print(f"\nGenerated files:")
+        print("  ✓ data.yaml")
+        print("  ✓ classes.txt")
+        print("  ✓ merge_statistics.txt")
+        print("  ✓ provenance.db (image -> source, original split, original classes)")
+        print("  ✓ train/images/ and train/labels/")
+        print("  ✓ val/images/ and val/labels/")
+        print("  ✓ test/images/ and test/labels/")
+        print('='*70)
+        print("\nNote: Image files are prefixed with dataset name to avoid conflicts")
+        print()
+
+        provenance.close()
+    metrics.count('images', total_stats['images'])
+    metrics.count('annotations', total_stats['annotations'])
+    metrics.finish()
 
     return output_dir
 
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Pipeline Instrumentation
+Shared timing/counter layer for the dataset pipeline scripts
+(convert_to_yolo, remap, merge_yolo_datasets, merge_datasets, split_dataset)
+
+Every script records per-stage timers (json_parse, file_discovery,
+label_transform, image_copy, label_write) plus byte/file counters and, when
+enabled, appends them as JSON lines so runs can be compared across commits.
+
+Environment variables:
+    SWM_METRICS=path.jsonl   Append structured metrics to this file
+    SWM_PROFILE=1            Capture a cProfile dump next to the metrics file
+    SWM_TRACEMALLOC=1        Track peak Python memory with tracemalloc
+"""
+
+import cProfile
+import json
+import os
+import platform
+import pstats
+import subprocess
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from checkpoint import atomic_copy, atomic_write_text
+
+
+def git_commit():
+    """Return the current git commit hash, or None outside a checkout"""
+    try:
+        out = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+class PipelineMetrics:
+    """
+    Collects stage timers and counters for one pipeline script run
+
+    Args:
+        script: Name of the script being instrumented
+        output: JSON-lines file to append metrics to (None = collect only)
+        profile: Capture a cProfile dump for the whole run
+        trace_memory: Record peak Python allocations via tracemalloc
+    """
+
+    def __init__(self, script, output=None, profile=False, trace_memory=False):
+        self.script = script
+        self.output = output
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.run_id = uuid.uuid4().hex[:12]
+
+        self.timers = defaultdict(lambda: {'seconds': 0.0, 'calls': 0})
+        self.counters = defaultdict(int)
+        self.params = {}
+
+        self._profiler = None
+        self._started = None
+
+    @property
+    def enabled(self):
+        return self.output is not None
+
+    def start(self, **params):
+        """Begin the run; keyword arguments are recorded as run parameters"""
+        self.params.update(params)
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of work under the given stage name"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name, seconds, calls=1):
+        """Add externally measured time (e.g. reported back by a worker process)"""
+        timer = self.timers[name]
+        timer['seconds'] += seconds
+        timer['calls'] += calls
+
+    def count(self, name, value=1):
+        """Increment a counter"""
+        self.counters[name] += value
+
+    def copy_file(self, src, dst, stage='image_copy'):
+        """Atomic shutil.copy2 wrapper that records time, file count and bytes"""
+        with self.stage(stage):
+            atomic_copy(src, dst)
+        self.count(f'{stage}_files')
+        self.count(f'{stage}_bytes', os.path.getsize(dst))
+
+    def write_text(self, path, text, stage='label_write'):
+        """Atomically write a text file, recording time, file count and bytes"""
+        with self.stage(stage):
+            atomic_write_text(path, text)
+        self.count(f'{stage}_files')
+        self.count(f'{stage}_bytes', len(text))
+
+    def merge(self, other):
+        """Fold timers/counters from a dict produced by as_dict() into this run"""
+        for name, timer in other.get('timers', {}).items():
+            self.add_time(name, timer['seconds'], timer['calls'])
+        for name, value in other.get('counters', {}).items():
+            self.count(name, value)
+
+    def as_dict(self):
+        return {
+            'timers': {k: dict(v) for k, v in self.timers.items()},
+            'counters': dict(self.counters),
+        }
+
+    def finish(self):
+        """Stop profiling, then emit metrics if an output file was configured"""
+        wall = time.perf_counter() - self._started if self._started else 0.0
+
+        peak_bytes = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        profile_path = None
+        if self._profiler is not None:
+            self._profiler.disable()
+            base = self.output or f'{self.script}.metrics.jsonl'
+            profile_path = f"{os.path.splitext(base)[0]}.{self.script}.{self.run_id}.prof"
+            self._profiler.dump_stats(profile_path)
+
+        if not self.enabled:
+            return
+
+        common = {
+            'run_id': self.run_id,
+            'script': self.script,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+        }
+        records = []
+        for name, timer in sorted(self.timers.items()):
+            records.append({**common, 'type': 'stage', 'stage': name,
+                            'seconds': round(timer['seconds'], 6), 'calls': timer['calls']})
+        for name, value in sorted(self.counters.items()):
+            records.append({**common, 'type': 'counter', 'name': name, 'value': value})
+        summary = {**common, 'type': 'summary', 'wall_seconds': round(wall, 6),
+                   'params': self.params, 'python': platform.python_version(),
+                   'cpu_count': os.cpu_count()}
+        if peak_bytes is not None:
+            summary['tracemalloc_peak_bytes'] = peak_bytes
+        if profile_path is not None:
+            summary['profile'] = profile_path
+        records.append(summary)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.output)), exist_ok=True)
+        with open(self.output, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+        print(f"\nMetrics ({self.script}, run {self.run_id}) -> {self.output}")
+        for name, timer in sorted(self.timers.items(), key=lambda kv: -kv[1]['seconds']):
+            print(f"  {name:<20} {timer['seconds']:9.3f}s  ({timer['calls']} calls)")
+        print(f"  {'wall':<20} {wall:9.3f}s")
+        if profile_path is not None:
+            print(f"  cProfile dump: {profile_path}")
+            pstats.Stats(profile_path).sort_stats('cumulative').print_stats(10)
+
+
+def get_metrics(script):
+    """Build a PipelineMetrics configured from the SWM_* environment variables"""
+    return PipelineMetrics(
+        script,
+        output=os.environ.get('SWM_METRICS') or None,
+        profile=os.environ.get('SWM_PROFILE', '') not in ('', '0'),
+        trace_memory=os.environ.get('SWM_TRACEMALLOC', '') not in ('', '0'),
+    )
+
+
+def load_metrics(path):
+    """Read a metrics JSON-lines file into {run_id: {'summary':..., 'stages':..., 'counters':...}}"""
+    runs = defaultdict(lambda: {'summary': None, 'stages': {}, 'counters': {}})
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run = runs[record['run_id']]
+            if record['type'] == 'stage':
+                run['stages'][record['stage']] = record['seconds']
+            elif record['type'] == 'counter':
+                run['counters'][record['name']] = record['value']
+            else:
+                run['summary'] = record
+    return dict(runs)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Compare the last two runs of each script in a metrics file
+    if len(sys.argv) < 2:
+        print("Usage: python pipeline_metrics.py metrics.jsonl")
+        sys.exit(1)
+
+    by_script = defaultdict(list)
+    for run_id, run in load_metrics(sys.argv[1]).items():
+        if run['summary'] is not None:
+            by_script[run['summary']['script']].append(run)
+
+    for script, runs in by_script.items():
+        runs.sort(key=lambda r: r['summary']['timestamp'])
+        latest = runs[-1]
+        previous = runs[-2] if len(runs) > 1 else None
+        print("="*70)
+        print(f"{script}: {len(runs)} run(s), latest {latest['summary']['run_id']} "
+              f"@ {latest['summary']['commit']}")
+        print("="*70)
+        for stage, seconds in sorted(latest['stages'].items()):
+            line = f"  {stage:<20} {seconds:9.3f}s"
+            if previous and previous['stages'].get(stage):
+                delta = (seconds - previous['stages'][stage]) / previous['stages'][stage] * 100
+                line += f"  ({delta:+.1f}% vs {previous['summary']['run_id']})"
+            print(line)
+        print(f"  {'wall':<20} {latest['summary']['wall_seconds']:9.3f}s")
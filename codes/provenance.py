@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Merge Provenance Table
+Indexed sidecar (SQLite, <dataset>/provenance.db) recording where every
+merged image came from, written by merge_datasets and merge_yolo_datasets
+and carried along by split_dataset:
+
+    image             output file name (primary key), e.g. zw_train_01_frame_000123.PNG
+    source            source dataset (warp, zw, zerowaste, ...)
+    original_split    split the image had in its source dataset
+    original_name     file name in the source dataset
+    original_classes  source class id of every output label line, in line order
+
+Evaluation (model_training/evaluate.py) joins on it for per-source,
+per-original-class metrics without re-reading any label files.
+"""
+
+import os
+import sqlite3
+
+FILENAME = 'provenance.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    image TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    original_split TEXT,
+    original_name TEXT,
+    original_classes TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS images_source ON images (source);
+"""
+
+
+def provenance_path(dataset_root):
+    return os.path.join(dataset_root, FILENAME)
+
+
+class ProvenanceTable:
+    """
+    Read/write access to a dataset's provenance.db
+
+    Rows are buffered and written in batches; use as a context manager (or
+    call close()) so the last batch is committed.
+
+    Args:
+        path: provenance.db file, or a dataset root containing one
+        batch_size: Rows per INSERT transaction
+    """
+
+    def __init__(self, path, batch_size=1000):
+        if os.path.isdir(path):
+            path = provenance_path(path)
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def add(self, image, source, original_split, original_name, original_classes=()):
+        """Record one output image; original_classes follows the output label line order"""
+        self._pending.append((image, source, original_split, original_name,
+                              ' '.join(str(c) for c in original_classes)))
+        if len(self._pending) >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        if self._pending:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+
+    def __contains__(self, image):
+        if any(row[0] == image for row in self._pending):
+            return True
+        return self._db.execute("SELECT 1 FROM images WHERE image = ?", (image,)).fetchone() is not None
+
+    def __len__(self):
+        self.commit()
+        return self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def lookup(self, images):
+        """
+        Provenance rows for a list of image names
+
+        Returns:
+            Dict of image -> {'source', 'original_split', 'original_name',
+            'original_classes' (list of int)}; unknown images are absent
+        """
+        self.commit()
+        rows = {}
+        images = list(images)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(images), 900):
+            chunk = images[start:start + 900]
+            query = f"SELECT * FROM images WHERE image IN ({','.join('?' * len(chunk))})"
+            for image, source, split, name, classes in self._db.execute(query, chunk):
+                rows[image] = {
+                    'source': source,
+                    'original_split': split,
+                    'original_name': name,
+                    'original_classes': [int(c) for c in classes.split()],
+                }
+        return rows
+
+    def sources(self):
+        """Image count per source"""
+        self.commit()
+        return dict(self._db.execute("SELECT source, COUNT(*) FROM images GROUP BY source"))
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def copy_provenance(src_root, dst_root):
+    """Carry a dataset's provenance.db over to a derived dataset (same image names)"""
+    from checkpoint import atomic_copy
+
+    src = provenance_path(src_root)
+    if not os.path.exists(src):
+        return False
+    os.makedirs(dst_root, exist_ok=True)
+    atomic_copy(src, provenance_path(dst_root))
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python provenance.py <dataset_root|provenance.db> [image ...]")
+        sys.exit(1)
+
+    with ProvenanceTable(sys.argv[1]) as table:
+        if len(sys.argv) > 2:
+            for image, row in table.lookup(sys.argv[2:]).items():
+                print(f"{image}: {row}")
+        else:
+            print(f"{len(table)} images")
+            for source, count in sorted(table.sources().items()):
+                print(f"  {source}: {count}")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Relocatable Datasets
+Makes a YOLO dataset folder independent of the machine it was built on, so
+it can be moved between disks, machines or storage tiers (local SSD, NAS,
+Kaggle input) without re-running the pipeline:
+
+  normalize   rewrite data.yaml and the file lists it references to paths
+              relative to the dataset folder: an absolute 'path:' such as
+              D:\\swm\\merged_datasets\\swm_4_classes is dropped (ultralytics
+              then uses the folder holding data.yaml), absolute entries under
+              the old or current root become relative, backslashes become '/'
+  manifest    write <dataset>/dataset_manifest.tsv: one line per file with
+              its root-relative POSIX path, size and SHA-1 (files the trainer
+              regenerates, such as labels.cache and cache='disk' .npy files,
+              are left out)
+  verify      check a copied/moved dataset against its manifest in parallel;
+              quick mode compares sizes only (stat calls), full mode also
+              re-hashes every file
+
+    python relocate.py manifest build/swm_final_split
+    rsync -a build/swm_final_split /mnt/nas/
+    python relocate.py verify /mnt/nas/swm_final_split --full
+
+Threads are used for hashing and stat calls: both wait on I/O and hashlib
+releases the GIL, so a thread pool keeps network storage busy without the
+cost of worker processes.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from checkpoint import TEMP_SUFFIX, atomic_write_text
+
+MANIFEST_NAME = 'dataset_manifest.tsv'
+HEADER = '# path\tsize\tsha1 (paths relative to this folder)\n'
+SKIP_DIRS = {'__pycache__', '.git'}
+# Files rewritten by the trainer on any machine (ultralytics' <split>/labels.cache,
+# the per-image .npy files of cache='disk'): not part of the dataset, never listed or checked
+DERIVED_SUFFIXES = ('.cache', '.npy')
+YAML_PATH_KEYS = ('path', 'train', 'val', 'test', 'minival')
+_WINDOWS_ABS = re.compile(r'^[A-Za-z]:[\\/]|^\\\\')
+
+
+def to_posix(path):
+    """Path string with '/' separators, whatever OS wrote it"""
+    return str(path).replace('\\', '/')
+
+
+def is_absolute(path):
+    """True for POSIX and Windows absolute paths (D:\\..., \\\\server\\...), on any OS"""
+    return bool(_WINDOWS_ABS.match(str(path))) or str(path).startswith('/')
+
+
+def relative_path(path, start):
+    """POSIX path of path relative to start, or the absolute path when there is none (other drive)"""
+    try:
+        return to_posix(os.path.relpath(os.path.abspath(path), os.path.abspath(start)))
+    except ValueError:
+        return to_posix(os.path.abspath(path))
+
+
+def list_entry(path, list_dir):
+    """
+    File list line for path, relative to the list's folder when possible
+
+    ultralytics (and train.py / evaluate.py) resolve './' entries against the
+    folder of the list file, so a list into a sibling dataset keeps working
+    as long as both folders are moved together.
+    """
+    rel = relative_path(path, list_dir)
+    return rel if is_absolute(rel) else f"./{rel}"
+
+
+def relative_to_roots(path, roots):
+    """POSIX path of path relative to the first root containing it, or None"""
+    posix = to_posix(path)
+    for root in roots:
+        root = to_posix(root).rstrip('/')
+        # Windows paths compare case-insensitively
+        windows = bool(_WINDOWS_ABS.match(root))
+        head = posix[:len(root)]
+        if (head.lower() == root.lower() if windows else head == root) and posix[len(root):][:1] in ('/', ''):
+            return posix[len(root):].lstrip('/') or '.'
+    return None
+
+
+# ---------------------------------------------------------------------------
+# data.yaml / file list normalization
+# ---------------------------------------------------------------------------
+
+def _yaml_value(value):
+    return value.split(' #')[0].strip().strip('"').strip("'")
+
+
+def normalize_dataset(dataset_root, old_roots=()):
+    """
+    Rewrite data.yaml and the list files it references to root-relative paths
+
+    Args:
+        dataset_root: Folder holding data.yaml
+        old_roots: Extra former locations of the dataset; the absolute
+            'path:' of data.yaml is always treated as one
+
+    Returns:
+        (rewritten files, absolute paths left pointing outside the dataset)
+    """
+    dataset_root = Path(dataset_root)
+    yaml_path = dataset_root / 'data.yaml'
+    if not yaml_path.exists():
+        return [], []
+    with open(yaml_path) as f:
+        lines = f.readlines()
+
+    roots = [str(dataset_root.resolve())] + list(old_roots)
+    for line in lines:
+        key, sep, value = line.partition(':')
+        if sep and key == 'path' and is_absolute(_yaml_value(value)):
+            roots.append(_yaml_value(value))
+
+    rewritten, external, list_files = [], [], []
+    out = []
+    for line in lines:
+        key, sep, value = line.partition(':')
+        if not sep or key not in YAML_PATH_KEYS or not _yaml_value(value) or _yaml_value(value).startswith('['):
+            out.append(line)
+            continue
+        value = _yaml_value(value)
+        if key == 'path':
+            # Without 'path' the dataset root is the folder holding data.yaml
+            if is_absolute(value) or to_posix(value) in ('.', './'):
+                continue
+            out.append(line)
+            continue
+        relative = relative_to_roots(value, roots) if is_absolute(value) else to_posix(value)
+        if relative is None:
+            external.append(value)
+            relative = value
+        out.append(f"{key}: {relative}\n")
+        target = dataset_root / relative
+        if target.is_file() and target.suffix == '.txt':
+            list_files.append(target)
+    if out != lines:
+        atomic_write_text(yaml_path, ''.join(out))
+        rewritten.append(yaml_path)
+
+    for list_file in list_files:
+        with open(list_file) as f:
+            entries = [line.strip() for line in f if line.strip()]
+        # ultralytics resolves './' entries against the list file's folder
+        base = to_posix(os.path.relpath(dataset_root, list_file.parent))
+        fixed = []
+        for entry in entries:
+            relative = relative_to_roots(entry, roots) if is_absolute(entry) else None
+            if relative is not None:
+                entry = f"./{relative}" if base == '.' else f"./{base}/{relative}"
+            elif is_absolute(entry):
+                external.append(entry)
+            fixed.append(to_posix(entry))
+        if fixed != entries:
+            atomic_write_text(list_file, ''.join(f"{entry}\n" for entry in fixed))
+            rewritten.append(list_file)
+    return rewritten, sorted(set(external))
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+def is_derived(name):
+    """True for trainer caches, temp files and progress journals: files that are not dataset content"""
+    return name.endswith((TEMP_SUFFIX, '.tmp') + DERIVED_SUFFIXES) or name.startswith('.journal_')
+
+
+def _ignored(name):
+    return name == MANIFEST_NAME or is_derived(name)
+
+
+def dataset_files(dataset_root):
+    """Sorted root-relative POSIX paths of every file in a dataset (manifest, temp and derived files excluded)"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(dataset_root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        rel_dir = os.path.relpath(dirpath, dataset_root)
+        for name in filenames:
+            if _ignored(name):
+                continue
+            files.append(to_posix(os.path.normpath(os.path.join(rel_dir, name))))
+    return sorted(files)
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _default_workers(workers):
+    return workers or min(32, (os.cpu_count() or 1) * 4)
+
+
+def write_manifest(dataset_root, workers=None, normalize=True):
+    """
+    Write <dataset_root>/dataset_manifest.tsv (path, size, SHA-1 per file)
+
+    data.yaml and its lists are normalized first (see normalize_dataset) so
+    the manifest describes the relocatable form of the dataset.
+
+    Returns:
+        Manifest path
+    """
+    dataset_root = Path(dataset_root)
+    t0 = time.perf_counter()
+    if normalize:
+        rewritten, external = normalize_dataset(dataset_root)
+        for path in rewritten:
+            print(f"  Normalized {os.path.relpath(path, dataset_root)}")
+        for path in external[:10]:
+            print(f"  ⚠ Points outside the dataset (not relocated): {path}")
+
+    files = dataset_files(dataset_root)
+
+    def describe(rel):
+        full = dataset_root / rel
+        return rel, full.stat().st_size, file_sha1(full)
+
+    with ThreadPoolExecutor(_default_workers(workers)) as pool:
+        rows = list(pool.map(describe, files, chunksize=64))
+    manifest = dataset_root / MANIFEST_NAME
+    atomic_write_text(manifest, HEADER + ''.join(f"{rel}\t{size}\t{digest}\n" for rel, size, digest in rows))
+
+    total = sum(size for _, size, _ in rows)
+    seconds = time.perf_counter() - t0
+    print(f"✓ {len(rows)} files, {total / 1024**2:.1f} MB hashed in {seconds:.1f}s -> {manifest}")
+    return manifest
+
+
+def read_manifest(manifest):
+    """{relative path: (size, sha1)}"""
+    entries = {}
+    with open(manifest) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            rel, size, digest = line.rstrip('\n').split('\t')
+            entries[rel] = (int(size), digest)
+    return entries
+
+
+def verify_dataset(dataset_root, full=False, workers=None, extra=True):
+    """
+    Check a dataset against its manifest
+
+    Args:
+        dataset_root: Dataset folder holding dataset_manifest.tsv
+        full: Re-hash every file (default: compare sizes only)
+        workers: Thread count (default: 4 per core, at most 32)
+        extra: Also list files that are not in the manifest
+
+    Returns:
+        {'missing': [...], 'size': [...], 'hash': [...], 'extra': [...]}
+        (extra files are reported but do not make a dataset invalid)
+    """
+    dataset_root = Path(dataset_root)
+    manifest = dataset_root / MANIFEST_NAME
+    if not manifest.exists():
+        raise FileNotFoundError(f"No {MANIFEST_NAME} in {dataset_root} (run: relocate.py manifest)")
+    # Manifests written before derived files were excluded may still list them
+    entries = {rel: entry for rel, entry in read_manifest(manifest).items() if not _ignored(rel.rsplit('/', 1)[-1])}
+
+    def check(item):
+        rel, (size, digest) = item
+        try:
+            actual = os.stat(dataset_root / rel).st_size
+        except FileNotFoundError:
+            return 'missing', rel
+        if actual != size:
+            return 'size', rel
+        if full and file_sha1(dataset_root / rel) != digest:
+            return 'hash', rel
+        return None
+
+    t0 = time.perf_counter()
+    problems = {'missing': [], 'size': [], 'hash': [], 'extra': []}
+    with ThreadPoolExecutor(_default_workers(workers)) as pool:
+        for result in pool.map(check, entries.items(), chunksize=256):
+            if result is not None:
+                problems[result[0]].append(result[1])
+    if extra:
+        problems['extra'] = [rel for rel in dataset_files(dataset_root) if rel not in entries]
+    seconds = time.perf_counter() - t0
+
+    bad = sum(len(problems[k]) for k in ('missing', 'size', 'hash'))
+    mode = 'full' if full else 'quick'
+    status = '✓' if not bad else '❌'
+    print(f"{status} {dataset_root}: {len(entries) - bad}/{len(entries)} files match ({mode}, {seconds:.1f}s)")
+    for kind in ('missing', 'size', 'hash', 'extra'):
+        if problems[kind]:
+            shown = ', '.join(problems[kind][:5]) + (' ...' if len(problems[kind]) > 5 else '')
+            print(f"  {kind}: {len(problems[kind])} ({shown})")
+    return problems
+
+
+def is_valid(problems):
+    return not (problems['missing'] or problems['size'] or problems['hash'])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Relocatable YOLO datasets: relative paths + file manifest")
+    sub = parser.add_subparsers(dest='command', required=True)
+    normalize = sub.add_parser('normalize', help="make data.yaml and its file lists root-relative")
+    normalize.add_argument('dataset')
+    normalize.add_argument('--old-root', action='append', default=[],
+                           help="former absolute location of the dataset (repeatable)")
+    manifest = sub.add_parser('manifest', help=f"normalize, then write <dataset>/{MANIFEST_NAME}")
+    manifest.add_argument('dataset')
+    manifest.add_argument('--workers', type=int, default=None)
+    verify = sub.add_parser('verify', help="check a relocated dataset against its manifest")
+    verify.add_argument('dataset')
+    verify.add_argument('--full', action='store_true', help="re-hash files (default: sizes only)")
+    verify.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'normalize':
+        rewritten, external = normalize_dataset(args.dataset, args.old_root)
+        for path in rewritten:
+            print(f"✓ Rewrote {path}")
+        for path in external:
+            print(f"⚠ Points outside the dataset: {path}")
+        if not rewritten:
+            print("Nothing to rewrite")
+    elif args.command == 'manifest':
+        write_manifest(args.dataset, args.workers)
+    elif not is_valid(verify_dataset(args.dataset, args.full, args.workers)):
+        sys.exit(1)
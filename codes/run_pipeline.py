@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+SWM Pipeline Orchestrator
+Runs convert_to_yolo -> remap -> merge_yolo_datasets / merge_datasets ->
+split_dataset -> training as one DAG, without interactive prompts or
+hard-coded machine paths.
+
+Each stage declares the path keys it reads and writes. A stage is skipped
+when the fingerprint of its inputs (file sizes + mtimes), its parameters and
+its script source are unchanged since its last successful run. Stages whose
+dependencies are satisfied run concurrently (e.g. ZeroWaste conversion and
+WaRP remap), each in its own process with output captured to a log file.
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import yaml
+
+from relocate import is_derived
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CODES_DIR = REPO_ROOT / 'codes'
+CONVERT_SCRIPT = REPO_ROOT / 'original_datasets' / 'zerowaste-f-final' / 'convert_to_yolo.py'
+REMAP_SCRIPT = REPO_ROOT / 'original_datasets' / 'warp' / 'remap.py'
+TRASHNET_SCRIPT = REPO_ROOT / 'original_datasets' / 'trashnet' / 'convert_trashnet.py'
+
+DEFAULT_CONFIG = CODES_DIR / 'pipeline.yaml'
+STATE_FILE = '.pipeline_state.json'
+
+
+def _import_script(path):
+    """Import a pipeline script by file path under its own module name"""
+    sys.path.insert(0, str(path.parent))
+    return importlib.import_module(path.stem)
+
+
+# ---------------------------------------------------------------------------
+# Stage implementations (module level so spawned processes can import them)
+# ---------------------------------------------------------------------------
+
+def stage_convert_zerowaste(paths, params):
+    convert = _import_script(CONVERT_SCRIPT)
+    convert.create_yolo_dataset(paths['zerowaste_coco'], paths['zerowaste_yolo'],
+                                workers=params.get('workers'), memory_mb=params.get('memory_mb'))
+
+
+def stage_remap_warp(paths, params):
+    remap = _import_script(REMAP_SCRIPT)
+    remap.remap_warp_to_4_classes(paths['warp'], paths['warp_remapped'])
+
+
+def stage_convert_trashnet(paths, params):
+    convert = _import_script(TRASHNET_SCRIPT)
+    convert.convert_trashnet(paths['trashnet'], paths['trashnet_yolo'],
+                             box_mode=params.get('boxes', 'saliency'),
+                             unmapped=params.get('unmapped', 'skip'),
+                             workers=params.get('workers'), seed=params.get('seed', 0))
+
+
+def stage_copy_paste(paths, params):
+    from copy_paste import DEFAULT_CLASSES, copy_paste_dataset
+    copy_paste_dataset(paths['zerowaste_yolo'], paths['copy_paste_yolo'],
+                       classes=params.get('classes', list(DEFAULT_CLASSES)), count=params.get('count'),
+                       objects=params.get('objects', 3), workers=params.get('workers'),
+                       seed=params.get('seed', 0))
+
+
+def stage_merge_4_classes(paths, params):
+    from merge_yolo_datasets import merge_yolo_datasets
+    datasets, names = [paths['zerowaste_yolo'], paths['warp_remapped']], ['zerowaste', 'warp']
+    for key, name in (('trashnet_yolo', 'trashnet'), ('copy_paste_yolo', 'copy_paste')):
+        if os.path.exists(paths[key]):
+            datasets.append(paths[key])
+            names.append(name)
+    merge_yolo_datasets(datasets, paths['swm_4_classes'], names)
+
+
+def stage_merge_plastic(paths, params):
+    from merge_datasets import merge_and_transform
+    merge_and_transform(paths['warp'], paths['zerowaste_yolo'], paths['swm_final'])
+
+
+def _merge_manifest_path(params):
+    return params.get('manifest') or str(CODES_DIR / 'merge_manifest.yaml')
+
+
+def stage_manifest_merge(paths, params):
+    from manifest_merge import merge_manifest
+    merge_manifest(_merge_manifest_path(params), paths['swm_manifest'],
+                   path_keys=paths, workers=params.get('workers'))
+
+
+def stage_split(paths, params):
+    from split_dataset import split_dataset
+    split_dataset(paths['swm_final'], paths['swm_final_split'], seed=params.get('seed'))
+
+
+def stage_sampling_weights(paths, params):
+    from sampling_weights import build_sampling_weights
+    build_sampling_weights(paths['swm_final_split'], paths['swm_weighted'],
+                           class_power=params.get('class_power', 0.5),
+                           source_balance=params.get('source_balance', True),
+                           negative_fraction=params.get('negative_fraction', 0.1),
+                           epoch_size=params.get('epoch_size'), seed=params.get('seed', 0),
+                           hard_negatives=paths['hard_negatives'],
+                           hard_boost=params.get('hard_boost', 4.0))
+
+
+def stage_mine_negatives(paths, params):
+    from hard_negatives import mine_hard_negatives
+    mine_hard_negatives(os.path.join(paths['train_runs'], params.get('weights', 'train/weights/best.pt')),
+                        paths['swm_final_split'], paths['hard_negatives'],
+                        background_dirs=params.get('background', []),
+                        conf=params.get('conf', 0.25), batch=params.get('batch', 32),
+                        imgsz=params.get('imgsz', 640), max_images=params.get('max_images', 500),
+                        max_distance=params.get('max_distance', 4))
+
+
+def stage_plastic_view(paths, params):
+    from dataset_view import export_file_lists, plastic_view
+    from split_dataset import TRAIN_RATIO, VAL_RATIO, TEST_RATIO
+    view = plastic_view(paths['warp'], paths['zerowaste_yolo'])
+    splits = view.split({'train': TRAIN_RATIO, 'val': VAL_RATIO, 'test': TEST_RATIO},
+                        seed=params.get('seed', 0))
+    export_file_lists(splits, paths['swm_view'], ['plastic'])
+
+
+def stage_label_views(paths, params):
+    from dataset_view import LABEL_TARGETS, export_label_views
+    export_label_views(paths['swm_4_classes'], paths['swm_label_views'],
+                       params.get('targets', list(LABEL_TARGETS)))
+
+
+def stage_annotation_table(paths, params):
+    from annotation_table import export_annotations
+    export_annotations(paths['swm_final_split'], paths['swm_annotations'],
+                       compression=params.get('compression', 'zstd'))
+
+
+def stage_dataset_manifest(paths, params):
+    # Written as swm_final_split/dataset_manifest.tsv (swm_final_files), where relocate.py verify looks
+    from relocate import write_manifest
+    write_manifest(paths['swm_final_split'], workers=params.get('workers'))
+
+
+def stage_augment_cache(paths, params):
+    from augment_cache import build_augment_cache
+    build_augment_cache(paths['swm_final_split'], paths['swm_augmented'], k=params.get('k', 4),
+                        shard_size=params.get('shard_size', 1000), workers=params.get('workers'),
+                        seed=params.get('seed', 0))
+
+
+def stage_train(paths, params):
+    from ultralytics import YOLO
+    params = {k: v for k, v in params.items() if k != 'enabled'}
+    model = YOLO(params.pop('model', 'yolov8l.pt'))
+    # 'data' selects the dataset path key to train on (swm_final_split, swm_weighted, swm_view
+    # or a label view such as swm_label_views/1class)
+    key, _, subdir = params.pop('data', 'swm_final_split').partition('/')
+    data_yaml = os.path.join(paths[key], subdir, 'data.yaml')
+    with open(data_yaml) as f:
+        # Augmentations baked into the images (augment_cache) are not applied again
+        for aug in (yaml.safe_load(f) or {}).get('precomputed_augmentation') or {}:
+            params.setdefault(aug, 0.0)
+    # Re-trains overwrite one run folder instead of piling up train2, train3, ...,
+    # so mine_negatives' weights path always points at the latest model
+    params.setdefault('name', 'train')
+    params.setdefault('exist_ok', True)
+    model.train(data=data_yaml, project=paths['train_runs'], **params)
+
+
+# name -> (function, input path keys, output path keys, source files hashed into the fingerprint)
+STAGES = {
+    'convert_zerowaste': (stage_convert_zerowaste, ['zerowaste_coco'], ['zerowaste_yolo'], [CONVERT_SCRIPT]),
+    'remap_warp': (stage_remap_warp, ['warp'], ['warp_remapped'], [REMAP_SCRIPT]),
+    'convert_trashnet': (stage_convert_trashnet, ['trashnet'], ['trashnet_yolo'], [TRASHNET_SCRIPT]),
+    'copy_paste': (stage_copy_paste, ['zerowaste_yolo'], ['copy_paste_yolo'], [CODES_DIR / 'copy_paste.py']),
+    'merge_4_classes': (stage_merge_4_classes,
+                        ['zerowaste_yolo', 'warp_remapped', 'trashnet_yolo', 'copy_paste_yolo'],
+                        ['swm_4_classes'],
+                        [CODES_DIR / 'merge_yolo_datasets.py']),
+    'merge_plastic': (stage_merge_plastic, ['warp', 'zerowaste_yolo'], ['swm_final'],
+                      [CODES_DIR / 'merge_datasets.py']),
+    'manifest_merge': (stage_manifest_merge, ['warp', 'zerowaste_yolo'], ['swm_manifest'],
+                       [CODES_DIR / 'manifest_merge.py', CODES_DIR / 'merge_manifest.yaml']),
+    'split': (stage_split, ['swm_final'], ['swm_final_split'], [CODES_DIR / 'split_dataset.py']),
+    'sampling_weights': (stage_sampling_weights, ['swm_final_split', 'hard_negatives'], ['swm_weighted'],
+                         [CODES_DIR / 'sampling_weights.py']),
+    'plastic_view': (stage_plastic_view, ['warp', 'zerowaste_yolo'], ['swm_view'],
+                     [CODES_DIR / 'dataset_view.py']),
+    'label_views': (stage_label_views, ['swm_4_classes'], ['swm_label_views'],
+                    [CODES_DIR / 'dataset_view.py']),
+    'annotation_table': (stage_annotation_table, ['swm_final_split'], ['swm_annotations'],
+                         [CODES_DIR / 'annotation_table.py']),
+    'dataset_manifest': (stage_dataset_manifest, ['swm_final_split', 'swm_annotations'], ['swm_final_files'],
+                         [CODES_DIR / 'relocate.py']),
+    'augment_cache': (stage_augment_cache, ['swm_final_split'], ['swm_augmented'],
+                      [CODES_DIR / 'augment_cache.py']),
+    'train': (stage_train, ['swm_final_split'], ['train_runs'], []),
+    'mine_negatives': (stage_mine_negatives, ['swm_final_split', 'train_runs'], ['hard_negatives'],
+                       [CODES_DIR / 'hard_negatives.py']),
+}
+
+# Inputs fed back from a later stage of the previous iteration (e.g. hard
+# negatives mined with the last model): read when present, part of the
+# fingerprint, but never scheduled against their producer
+FEEDBACK_INPUTS = {'hard_negatives'}
+# Stages whose output folder is kept on re-run: training runs, and file-list
+# views whose overlay index lets a re-export rewrite only changed overlays
+# (the lists are rewritten, so stale overlays are never referenced)
+INCREMENTAL_STAGES = {'train', 'plastic_view', 'label_views'}
+# Inputs that are used when present (e.g. TrashNet, only if downloaded and converted)
+OPTIONAL_INPUTS = FEEDBACK_INPUTS | {'trashnet_yolo', 'copy_paste_yolo', 'swm_annotations'}
+
+
+def _merge_manifest_sources(manifest):
+    with open(manifest) as f:
+        return (yaml.safe_load(f) or {}).get('sources') or []
+
+
+def stage_inputs(name, params):
+    """
+    Input path keys of a stage, where they depend on its parameters
+
+    train reads the dataset its 'data' parameter names (e.g. swm_weighted or
+    swm_label_views/1class); manifest_merge reads the sources its manifest
+    lists by path key. Other stages use the keys declared in STAGES.
+    """
+    if name == 'train':
+        return [params.get('data', 'swm_final_split').partition('/')[0]]
+    if name == 'manifest_merge':
+        manifest = _merge_manifest_path(params)
+        if not os.path.exists(manifest):
+            return list(STAGES[name][1])
+        sources = _merge_manifest_sources(manifest)
+        producers = {out for _, _, outputs, _ in STAGES.values() for out in outputs}
+        declared = {key for _, inputs, _, _ in STAGES.values() for key in inputs}
+        return sorted({s['path'] for s in sources if s['path'] in producers | declared})
+    return list(STAGES[name][1])
+
+
+def stage_dependencies(stage_params=None):
+    """Derive DAG edges: a stage depends on whichever stage produces one of its inputs"""
+    stage_params = stage_params or {}
+    producers = {out: name for name, (_, _, outputs, _) in STAGES.items() for out in outputs}
+    return {
+        name: sorted({producers[key] for key in stage_inputs(name, dict(stage_params.get(name) or {}))
+                      if key in producers and key not in FEEDBACK_INPUTS})
+        for name in STAGES
+    }
+
+
+# ---------------------------------------------------------------------------
+# Fingerprinting
+# ---------------------------------------------------------------------------
+
+def path_fingerprint(path, exclude=()):
+    """
+    Hash a file or directory tree by relative path, size and mtime
+
+    Only stat() calls are made, so this stays cheap on large image folders.
+    Files that training or an interrupted stage leave behind (labels.cache,
+    cache='disk' .npy files, temp files, progress journals) are skipped, so
+    reading a dataset does not make its consumers stale.
+    """
+    h = hashlib.sha1()
+    path = Path(path)
+    if path.is_file():
+        st = path.stat()
+        h.update(f"{path.name}|{st.st_size}|{st.st_mtime_ns}".encode())
+        return h.hexdigest()
+    if not path.exists():
+        return None
+
+    exclude = {os.path.abspath(e) for e in exclude}
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames
+                       if os.path.abspath(os.path.join(dirpath, d)) not in exclude and d != '__pycache__']
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            if is_derived(name) or os.path.abspath(full) in exclude:
+                continue
+            st = os.stat(full)
+            entries.append(f"{os.path.relpath(full, path)}|{st.st_size}|{st.st_mtime_ns}")
+    for entry in sorted(entries):
+        h.update(entry.encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def stage_fingerprint(name, paths, params):
+    """Fingerprint of everything a stage reads: inputs, parameters and script source"""
+    sources = list(STAGES[name][3])
+    inputs = stage_inputs(name, params)
+    # Input name -> folder; other pipeline folders may be nested inside an input
+    # (e.g. yolo_dataset/ in zerowaste-f-final/) and are left out of its hash
+    folders = {key: paths[key] for key in inputs}
+    if name == 'manifest_merge':
+        manifest = _merge_manifest_path(params)
+        if not os.path.exists(manifest):
+            return None
+        # The manifest's contents, not just its path, decide what is merged
+        sources.append(manifest)
+        for source in _merge_manifest_sources(manifest):
+            if source['path'] not in folders:
+                # Path keys without a producer, or folders relative to the manifest
+                folders[source['path']] = (paths.get(source['path'])
+                                           or os.path.join(os.path.dirname(manifest), source['path']))
+    h = hashlib.sha1()
+    for key, folder in folders.items():
+        fp = path_fingerprint(folder, exclude=[p for p in paths.values() if p != folder])
+        if fp is None and key not in OPTIONAL_INPUTS:
+            return None
+        h.update(f"{key}={fp}\n".encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    for source in sources:
+        h.update(Path(source).read_bytes())
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+
+def _stage_process(name, paths, params, log_path):
+    """Entry point of the per-stage process: run the stage with output sent to its log"""
+    sys.path.insert(0, str(CODES_DIR))
+    with open(log_path, 'w', buffering=1) as log:
+        sys.stdout = sys.stderr = log
+        try:
+            STAGES[name][0](paths, params)
+        except BaseException:
+            traceback.print_exc()
+            sys.exit(1)
+
+
+def _run_in_process(name, paths, params, log_path):
+    ctx = mp.get_context('spawn')
+    proc = ctx.Process(target=_stage_process, args=(name, paths, params, log_path))
+    proc.start()
+    proc.join()
+    return proc.exitcode
+
+
+def load_config(config_path, root, overrides=()):
+    """
+    Load the pipeline YAML and resolve every path against root
+
+    Overrides are "dotted.key=value" strings parsed as YAML values,
+    e.g. "stages.split.seed=1" or "paths.warp=/data/warp".
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f) or {}
+
+    for override in overrides:
+        key, _, value = override.partition('=')
+        node = config
+        parts = key.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = yaml.safe_load(value)
+
+    root = Path(root)
+    config['paths'] = {k: str((root / Path(v)).resolve()) for k, v in config.get('paths', {}).items()}
+    config['state_dir'] = str((root / config.get('state_dir', 'build')).resolve())
+    config.setdefault('stages', {})
+    return config
+
+
+def run_pipeline(config, only=None, force=(), jobs=None, dry_run=False):
+    """
+    Execute the pipeline DAG
+
+    Args:
+        config: Dict from load_config()
+        only: Optional list of stages to run (their dependencies still gate them)
+        force: Stages to re-run even when their fingerprint is unchanged
+        jobs: Maximum stages running at once (default: config 'jobs' or 2)
+        dry_run: Only report what would run
+
+    Returns:
+        Dict of stage name -> status ('ran', 'skipped', 'failed', 'blocked', 'disabled')
+    """
+    paths = config['paths']
+    state_dir = Path(config['state_dir'])
+    log_dir = state_dir / 'logs'
+    log_dir.mkdir(parents=True, exist_ok=True)
+    state_path = state_dir / STATE_FILE
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+
+    deps = stage_dependencies(config['stages'])
+    jobs = jobs or config.get('jobs', 2)
+
+    selected = []
+    for name in STAGES:
+        params = dict(config['stages'].get(name) or {})
+        if only and name not in only:
+            continue
+        if params.get('enabled', True) is False:
+            continue
+        selected.append(name)
+
+    status = {name: 'disabled' for name in STAGES if name not in selected}
+    # Unselected upstream stages count as satisfied: their outputs are assumed present
+    done = {name for name in STAGES if name not in selected}
+    pending = list(selected)
+    running = {}
+
+    print("="*70)
+    print("SWM Pipeline")
+    print("="*70)
+    print(f"Stages: {' -> '.join(selected)}")
+    print(f"State:  {state_path}")
+    print(f"Jobs:   {jobs}\n")
+
+    def params_for(name):
+        return dict(config['stages'].get(name) or {})
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                if len(running) >= jobs:
+                    break
+                if any(status.get(d) in ('failed', 'blocked') for d in deps[name]):
+                    status[name] = 'blocked'
+                    pending.remove(name)
+                    print(f"  ⚠ {name}: blocked by failed dependency")
+                    continue
+                if not all(d in done for d in deps[name]):
+                    continue
+
+                pending.remove(name)
+                params = params_for(name)
+                fingerprint = stage_fingerprint(name, paths, params)
+                outputs_exist = all(os.path.exists(paths[o]) for o in STAGES[name][2])
+
+                if fingerprint is None:
+                    status[name] = 'failed'
+                    print(f"  ❌ {name}: missing input ({', '.join(stage_inputs(name, params))})")
+                    continue
+                if (name not in force and outputs_exist
+                        and state.get(name, {}).get('fingerprint') == fingerprint):
+                    status[name] = 'skipped'
+                    done.add(name)
+                    print(f"  ✓ {name}: up to date, skipped")
+                    continue
+                if dry_run:
+                    status[name] = 'would_run'
+                    done.add(name)
+                    print(f"  • {name}: would run")
+                    continue
+
+                # Clear stale outputs so removed inputs don't linger downstream,
+                # unless a progress journal shows an interrupted run to resume
+                for out in STAGES[name][2]:
+                    if (os.path.isdir(paths[out]) and name not in INCREMENTAL_STAGES
+                            and not any(Path(paths[out]).glob('.journal_*'))):
+                        shutil.rmtree(paths[out])
+
+                log_path = str(log_dir / f"{name}.log")
+                print(f"  ▶ {name}: running (log: {log_path})")
+                started = time.time()
+                future = pool.submit(_run_in_process, name, paths, params, log_path)
+                running[future] = (name, fingerprint, started)
+
+            if not running:
+                if pending and not any(all(d in done for d in deps[n]) for n in pending):
+                    # Nothing runnable and nothing in flight: remaining stages are blocked
+                    for name in pending:
+                        status[name] = 'blocked'
+                    pending.clear()
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, fingerprint, started = running.pop(future)
+                seconds = time.time() - started
+                if future.result() == 0:
+                    status[name] = 'ran'
+                    done.add(name)
+                    state[name] = {'fingerprint': fingerprint, 'seconds': round(seconds, 2),
+                                   'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                    state_path.write_text(json.dumps(state, indent=2))
+                    print(f"  ✓ {name}: done in {seconds:.1f}s")
+                else:
+                    status[name] = 'failed'
+                    print(f"  ❌ {name}: failed after {seconds:.1f}s (see {log_dir / (name + '.log')})")
+
+    print(f"\n{'='*70}")
+    for name in STAGES:
+        print(f"  {name:<20} {status.get(name, 'disabled')}")
+    print('='*70)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the SWM dataset pipeline as a cached DAG")
+    parser.add_argument('--config', default=str(DEFAULT_CONFIG))
+    parser.add_argument('--root', default=str(REPO_ROOT), help="base directory for relative paths")
+    parser.add_argument('--only', nargs='+', choices=list(STAGES), help="run only these stages")
+    parser.add_argument('--force', nargs='+', choices=list(STAGES), default=[], help="ignore cache for these stages")
+    parser.add_argument('--jobs', type=int, default=None, help="stages to run concurrently")
+    parser.add_argument('--set', dest='overrides', action='append', default=[],
+                        help="override a config value, e.g. --set stages.split.seed=1")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    config = load_config(args.config, args.root, args.overrides)
+    status = run_pipeline(config, args.only, args.force, args.jobs, args.dry_run)
+    sys.exit(1 if any(s in ('failed', 'blocked') for s in status.values()) else 0)
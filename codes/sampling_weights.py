@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Class-Balanced Sampling Weights
+Per-image sampling weights for a split of a YOLO dataset, computed in one
+pass over its label files, plus a weighted file list that training can use
+directly (data.yaml train: train_weighted.txt).
+
+An image's weight combines three terms:
+  - class:    rarest class in the image, (1 / images containing it) ** class_power
+  - source:   every source dataset (warp, zw, ...) gets the same total weight
+              when source_balance is on (source from provenance.db, else the
+              filename prefix)
+  - negative: images without labels are rescaled to negative_fraction of
+              the total weight; hard negatives (hard_negatives.py) get
+              hard_boost x the weight of easy ones inside that share
+
+Weights are normalized to mean 1. The weighted list repeats or drops images
+so each appears in proportion to its weight (deterministic for a given
+seed), keeping the epoch at epoch_size images.
+"""
+
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from checkpoint import atomic_write_text
+from provenance import ProvenanceTable, provenance_path
+from relocate import list_entry, relative_path
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def scan_labels(dataset_root, split='train'):
+    """
+    Single pass over <split>/images + <split>/labels
+
+    Reads annotations.parquet instead of the label files when it is up to
+    date (annotation_table.py).
+
+    Returns:
+        List of (image path, set of class ids) in file name order; images
+        without a label file are negatives
+    """
+    from annotation_table import image_classes, load_annotations
+
+    images_dir = Path(dataset_root) / split / 'images'
+    labels_dir = Path(dataset_root) / split / 'labels'
+    table = load_annotations(dataset_root, columns=['split', 'image', 'class_id'], filters=[('split', '==', split)])
+    if table is not None:
+        classes = image_classes(table)
+        return [(os.path.abspath(images_dir / image), found)
+                for (_, image), found in sorted(classes.items(), key=lambda item: item[0][1])
+                if os.path.splitext(image)[1].lower() in IMAGE_EXTENSIONS]
+    records = []
+    for entry in sorted(os.scandir(images_dir), key=lambda e: e.name):
+        stem, ext = os.path.splitext(entry.name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        classes = set()
+        label = labels_dir / f"{stem}.txt"
+        if label.exists():
+            with open(label) as f:
+                for line in f:
+                    parts = line.split(maxsplit=1)
+                    if len(parts) == 2:
+                        classes.add(int(parts[0]))
+        records.append((os.path.abspath(entry.path), classes))
+    return records
+
+
+def image_sources(dataset_root, names):
+    """Source dataset per image name: provenance table when present, else the filename prefix"""
+    rows = {}
+    if os.path.exists(provenance_path(dataset_root)):
+        with ProvenanceTable(dataset_root) as table:
+            rows = table.lookup(names)
+    return [rows[n]['source'] if n in rows else n.split('_', 1)[0] for n in names]
+
+
+def compute_weights(classes, sources, class_power=0.5, source_balance=True, negative_fraction=0.1,
+                    boost=None):
+    """
+    Combine class, source and negative terms into per-image weights (mean 1)
+
+    Args:
+        classes: Per-image set of class ids
+        sources: Per-image source name
+        class_power: 0 ignores class frequency, 1 is full inverse frequency
+        source_balance: Give every source the same total weight
+        negative_fraction: Share of total weight for images without labels
+            (None keeps their natural share)
+        boost: Optional per-image multiplier applied before balancing
+            (e.g. hard negatives)
+
+    Returns:
+        np.ndarray of weights
+    """
+    n = len(classes)
+    negative = np.array([not c for c in classes], bool)
+
+    images_with = Counter(c for image_classes in classes for c in image_classes)
+    weights = np.ones(n)
+    for i, image_classes in enumerate(classes):
+        if image_classes:
+            weights[i] = max((1.0 / images_with[c]) ** class_power for c in image_classes)
+    # Negatives start at the mean positive weight so the class term doesn't favour them
+    if (~negative).any():
+        weights[negative] = weights[~negative].mean()
+    if boost is not None:
+        weights *= boost
+
+    # Negatives are often concentrated in one source, so the two constraints
+    # are alternated until both hold (iterative proportional fitting)
+    for _ in range(20):
+        if source_balance:
+            per_source = defaultdict(float)
+            for w, source in zip(weights, sources):
+                per_source[source] += w
+            target = weights.sum() / len(per_source)
+            weights *= np.array([target / per_source[s] for s in sources])
+
+        if negative_fraction is not None and negative.any() and (~negative).any():
+            total = weights.sum()
+            weights[negative] *= negative_fraction * total / weights[negative].sum()
+            weights[~negative] *= (1 - negative_fraction) * total / weights[~negative].sum()
+
+    return weights * (n / weights.sum()) if n else weights
+
+
+def weighted_counts(weights, epoch_size, seed=0):
+    """
+    Integer repeats per image proportional to weights, summing to epoch_size
+
+    Systematic sampling over a seeded permutation: every image gets the floor
+    or ceil of its expected count, and group shares (sources, negatives) stay
+    close to their weight even when most expected counts are below 1.
+    """
+    expected = weights / weights.sum() * epoch_size
+    order = np.random.default_rng(seed).permutation(len(weights))
+    edges = np.floor(np.concatenate([[0.0], np.cumsum(expected[order])]) + 0.5)
+    counts = np.empty(len(weights), np.int64)
+    counts[order] = np.diff(edges).astype(np.int64)
+    return counts
+
+
+def build_sampling_weights(dataset_root, output_dir, split='train', class_power=0.5,
+                           source_balance=True, negative_fraction=0.1, epoch_size=None, seed=0,
+                           hard_negatives=None, hard_boost=4.0):
+    """
+    Write sampling_weights.tsv, <split>_weighted.txt and a data.yaml training on it
+
+    Args:
+        dataset_root: YOLO dataset with <split>/images + labels and a data.yaml
+        output_dir: Folder for the generated files
+        split: Split to weight (val/test stay unweighted)
+        epoch_size: Images per epoch in the weighted list (default: split size)
+        seed: Which images round up when expected counts are fractional
+        hard_negatives: Optional hard_negatives.tsv from a previous mining round
+        hard_boost: Weight multiplier for listed hard negatives
+
+    Returns:
+        Path to the generated data.yaml
+    """
+    import yaml
+
+    dataset_root = Path(dataset_root).resolve()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print("="*60)
+    print("CLASS-BALANCED SAMPLING WEIGHTS")
+    print("="*60)
+
+    records = scan_labels(dataset_root, split)
+    if not records:
+        raise ValueError(f"No images found in {dataset_root / split / 'images'}")
+    paths = [path for path, _ in records]
+    classes = [image_classes for _, image_classes in records]
+    sources = image_sources(dataset_root, [os.path.basename(p) for p in paths])
+
+    boost = None
+    hard = set()
+    if hard_negatives and os.path.exists(hard_negatives):
+        from hard_negatives import load_hard_negatives
+        hard = set(load_hard_negatives(hard_negatives))
+        boost = np.array([hard_boost if p in hard else 1.0 for p in paths])
+        print(f"Hard negatives: {int((boost > 1).sum())} of {len(hard)} listed are in this split "
+              f"(x{hard_boost})")
+
+    weights = compute_weights(classes, sources, class_power, source_balance, negative_fraction, boost)
+    counts = weighted_counts(weights, epoch_size or len(records), seed)
+
+    lines = ["image\tweight\tsource\tclasses\n"]
+    lines += [f"{path}\t{w:.6f}\t{source}\t{','.join(map(str, sorted(c)))}\n"
+              for path, w, source, c in zip(paths, weights, sources, classes)]
+    atomic_write_text(output_dir / 'sampling_weights.tsv', ''.join(lines))
+
+    list_path = output_dir / f"{split}_weighted.txt"
+    entries = [list_entry(path, output_dir) for path in paths]
+    atomic_write_text(list_path, ''.join(f"{entry}\n" * int(k) for entry, k in zip(entries, counts)))
+
+    with open(dataset_root / 'data.yaml') as f:
+        data = yaml.safe_load(f)
+    for key in ('train', 'val', 'test'):
+        if key in data:
+            data[key] = relative_path(dataset_root / data[key], output_dir)
+    # Paths relative to this folder: relocatable when moved together with dataset_root
+    data.pop('path', None)
+    data[split] = list_path.name
+    yaml_path = output_dir / 'data.yaml'
+    with open(yaml_path, 'w') as f:
+        f.write("# Class-balanced training list (see sampling_weights.tsv)\n")
+        yaml.safe_dump(data, f, sort_keys=False)
+
+    # Summary: share of the epoch before/after weighting
+    negative = np.array([not c for c in classes])
+    print(f"Images: {len(records)}  epoch size: {int(counts.sum())}  "
+          f"unique images used: {int((counts > 0).sum())}")
+    print(f"\n{'group':<20} {'images':>8} {'before':>8} {'after':>8}")
+    groups = [(f"source={s}", np.array([x == s for x in sources])) for s in sorted(set(sources))]
+    groups.append(('negatives', negative))
+    if hard:
+        groups.append(('hard negatives', np.array([p in hard for p in paths])))
+    for c in sorted({c for image_classes in classes for c in image_classes}):
+        groups.append((f"class {c}", np.array([c in image_classes for image_classes in classes])))
+    for label, mask in groups:
+        print(f"{label:<20} {int(mask.sum()):>8} {mask.mean() * 100:>7.1f}% "
+              f"{counts[mask].sum() / counts.sum() * 100:>7.1f}%")
+    print(f"\nWeights:  {output_dir / 'sampling_weights.tsv'}")
+    print(f"Data:     {yaml_path}")
+    return yaml_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Class/source/negative balanced sampling weights")
+    parser.add_argument('dataset', help="YOLO dataset root with <split>/images+labels and data.yaml")
+    parser.add_argument('output', help="output folder for weights, file list and data.yaml")
+    parser.add_argument('--split', default='train')
+    parser.add_argument('--class-power', type=float, default=0.5)
+    parser.add_argument('--no-source-balance', action='store_true')
+    parser.add_argument('--negative-fraction', type=float, default=0.1)
+    parser.add_argument('--epoch-size', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hard-negatives', default=None, help="hard_negatives.tsv from hard_negatives.py")
+    parser.add_argument('--hard-boost', type=float, default=4.0)
+    args = parser.parse_args()
+
+    build_sampling_weights(args.dataset, args.output, args.split, args.class_power,
+                           not args.no_source_balance, args.negative_fraction, args.epoch_size, args.seed,
+                           args.hard_negatives, args.hard_boost)
@@ -1,8 +1,10 @@
-import shutil
 import random
 from pathlib import Path
 from tqdm import tqdm
 
+from pipeline_metrics import get_metrics
+from provenance import copy_provenance
+
 # ===== CONFIGURATION =====
 SOURCE_ROOT = Path("./swm_final")
 OUTPUT_ROOT = Path("./swm_final_split")
@@ -12,8 +14,21 @@ VAL_RATIO = 0.15
 TEST_RATIO = 0.15
 # =========================
 
-def split_dataset():
-    """Split merged dataset into train/val/test"""
+def split_dataset(source_root=SOURCE_ROOT, output_root=OUTPUT_ROOT, seed=None):
+    """
+    Split merged dataset into train/val/test
+
+    Args:
+        source_root: Merged dataset with flat images/ and labels/
+        output_root: Output folder with train/val/test splits
+        seed: Optional random seed for a reproducible split
+    """
+    source_root = Path(source_root)
+    output_root = Path(output_root)
+    
+    metrics = get_metrics('split_dataset').start(
+        source=str(source_root.absolute()),
+        ratios=[TRAIN_RATIO, VAL_RATIO, TEST_RATIO])
     
     print("="*60)
     print("SPLITTING DATASET INTO TRAIN/VAL/TEST")
@@ -21,18 +36,21 @@ def split_dataset():
     
     # Create output structure
     for split in ['train', 'val', 'test']:
-        (OUTPUT_ROOT / split / "images").mkdir(parents=True, exist_ok=True)
-        (OUTPUT_ROOT / split / "labels").mkdir(parents=True, exist_ok=True)
+        (output_root / split / "images").mkdir(parents=True, exist_ok=True)
+        (output_root / split / "labels").mkdir(parents=True, exist_ok=True)
     
     # Get all images
-    images_dir = SOURCE_ROOT / "images"
-    labels_dir = SOURCE_ROOT / "labels"
+    images_dir = source_root / "images"
+    labels_dir = source_root / "labels"
     
-    all_images = list(images_dir.glob("*.jpg")) + list(images_dir.glob("*.png"))
+    with metrics.stage('file_discovery'):
+        all_images = sorted(p for p in images_dir.iterdir() if p.suffix.lower() in (".jpg", ".png"))
     
     print(f"\nTotal images: {len(all_images)}")
     
     # Shuffle
+    if seed is not None:
+        random.seed(seed)
     random.shuffle(all_images)
     
     # Calculate split points
@@ -56,22 +74,22 @@ def split_dataset():
         
         for img_path in tqdm(img_list):
             # Copy image
-            shutil.copy(
+            metrics.copy_file(
                 img_path,
-                OUTPUT_ROOT / split_name / "images" / img_path.name
+                output_root / split_name / "images" / img_path.name
             )
             
             # Copy label
             label_path = labels_dir / f"{img_path.stem}.txt"
             if label_path.exists():
-                shutil.copy(
+                metrics.copy_file(
                     label_path,
-                    OUTPUT_ROOT / split_name / "labels" / f"{img_path.stem}.txt"
+                    output_root / split_name / "labels" / f"{img_path.stem}.txt",
+                    stage='label_write'
                 )
     
     # Create data.yaml
     yaml_content = f"""# SWM Plastic Detection Dataset
-path: {OUTPUT_ROOT.absolute()}
 train: train/images
 val: val/images
 test: test/images
@@ -91,15 +109,23 @@ fliplr: 0.5
 mosaic: 1.0
 """
     
-    with open(OUTPUT_ROOT / "data.yaml", 'w') as f:
+    with open(output_root / "data.yaml", 'w') as f:
         f.write(yaml_content)
     
+    # Image names are unchanged, so the merge provenance table applies as-is
+    if copy_provenance(source_root, output_root):
+        print("\nProvenance table copied")
+    
     print("\n" + "="*60)
     print("✅ DATASET SPLIT COMPLETE!")
     print("="*60)
-    print(f"Output: {OUTPUT_ROOT.absolute()}")
+    print(f"Output: {output_root.absolute()}")
     print(f"\nNext: Train with:")
-    print(f"yolo detect train data={OUTPUT_ROOT.absolute()}/data.yaml model=yolov8n.pt epochs=100")
+    print(f"yolo detect train data={output_root.absolute()}/data.yaml model=yolov8n.pt epochs=100")
+    
+    for split_name, img_list in splits.items():
+        metrics.count(f'{split_name}_images', len(img_list))
+    metrics.finish()
 
 if __name__ == "__main__":
     split_dataset()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Video Ingestion
+Extracts frames from conveyor videos straight into the YOLO layout that
+convert_to_yolo / merge_yolo_datasets / active_learning read
+(<output>/<split>/images/<video>_frame_000123.jpg).
+
+Each video is decoded by a reader thread into a bounded queue, so decoding
+runs ahead of scoring/encoding without buffering the whole video. A frame is
+kept when, compared with the last kept frame:
+  - motion:       the fraction of small grayscale thumbnail pixels that
+                  changed by more than PIXEL_DELTA levels is at least
+                  min_motion (0-1), or
+  - scene change: the Bhattacharyya distance between grayscale histograms
+                  is at least scene_threshold (0-1), or
+  - max_gap frames have passed since the last kept one (0 = never force)
+so a belt standing still or moving the same items produces one frame, not
+hundreds. Several videos are decoded in parallel, one process each.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+
+from checkpoint import atomic_write_bytes
+from pipeline_metrics import PipelineMetrics, get_metrics
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.mpg', '.mpeg')
+THUMB_SIZE = (64, 36)
+# Gray-level change that counts a thumbnail pixel as moved (above sensor noise)
+PIXEL_DELTA = 12
+_END = object()
+
+
+def _reader(capture, frames, stride, stop):
+    """Decode frames into the bounded queue; grab() skips the stride frames without decoding them"""
+    index = 0
+    try:
+        while not stop.is_set():
+            if index % stride == 0:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                frames.put((index, frame))
+            elif not capture.grab():
+                break
+            index += 1
+    finally:
+        frames.put(_END)
+
+
+def frame_signature(frame):
+    """Small grayscale thumbnail + normalized 32-bin histogram used for change scores"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    hist = cv2.calcHist([thumb], [0], None, [32], [0, 256])
+    cv2.normalize(hist, hist)
+    return thumb, hist
+
+
+def change_scores(signature, reference):
+    """(motion, scene change) between two frame signatures, both in [0, 1]"""
+    motion = float((cv2.absdiff(signature[0], reference[0]) > PIXEL_DELTA).mean())
+    scene = float(cv2.compareHist(signature[1], reference[1], cv2.HISTCMP_BHATTACHARYYA))
+    return motion, scene
+
+
+def extract_frames(video_path, images_dir, min_motion=0.01, scene_threshold=0.3, max_gap=0,
+                   stride=1, queue_size=32, jpeg_quality=95):
+    """
+    Extract the changing frames of one video
+
+    Args:
+        video_path: Video file
+        images_dir: Destination images/ folder
+        min_motion: Keep a frame when its thumbnail differs this much (0-1) from the last kept one
+        scene_threshold: ... or its histogram distance is at least this (0-1)
+        max_gap: Force a frame after this many decoded frames without one (0 = off)
+        stride: Only decode every stride-th frame (others are grabbed and skipped)
+        queue_size: Decoded frames buffered ahead of scoring
+        jpeg_quality: JPEG quality of written frames
+
+    Returns:
+        Dict with decoded/kept counts, timing and worker metrics
+    """
+    metrics = PipelineMetrics('video_ingest.worker')
+    stem = Path(video_path).stem
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        return {'video': str(video_path), 'error': 'cannot open', 'decoded': 0, 'kept': 0, 'seconds': 0.0}
+
+    frames = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    reader = threading.Thread(target=_reader, args=(capture, frames, max(1, stride), stop), daemon=True)
+
+    decoded = kept = 0
+    reference = None
+    since_kept = 0
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    t0 = time.perf_counter()
+    reader.start()
+    try:
+        while True:
+            with metrics.stage('decode_wait'):
+                item = frames.get()
+            if item is _END:
+                break
+            index, frame = item
+            decoded += 1
+            since_kept += 1
+
+            with metrics.stage('frame_score'):
+                signature = frame_signature(frame)
+                if reference is None:
+                    keep = True
+                else:
+                    motion, scene = change_scores(signature, reference)
+                    keep = (motion >= min_motion or scene >= scene_threshold
+                            or (max_gap and since_kept >= max_gap))
+            if not keep:
+                continue
+
+            with metrics.stage('frame_write'):
+                ok, encoded = cv2.imencode('.jpg', frame, encode_params)
+                if not ok:
+                    continue
+                atomic_write_bytes(os.path.join(images_dir, f"{stem}_frame_{index:06d}.jpg"), encoded.tobytes())
+            metrics.count('frame_write_bytes', len(encoded))
+            reference = signature
+            since_kept = 0
+            kept += 1
+    finally:
+        stop.set()
+        # Unblock the reader if it is waiting on a full queue
+        while reader.is_alive():
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                reader.join(0.05)
+        capture.release()
+
+    metrics.count('frames_decoded', decoded)
+    metrics.count('frames_kept', kept)
+    return {'video': str(video_path), 'decoded': decoded, 'kept': kept,
+            'seconds': time.perf_counter() - t0, 'metrics': metrics.as_dict()}
+
+
+def _extract_task(args):
+    return extract_frames(*args)
+
+
+def find_videos(source):
+    """A single video file, or all videos under a folder (recursive, sorted)"""
+    source = Path(source)
+    if source.is_file():
+        return [source]
+    return sorted(p for p in source.rglob('*') if p.suffix.lower() in VIDEO_EXTENSIONS)
+
+
+def ingest_videos(source, output_dir, split='train', images_subdir='images', workers=None,
+                  min_motion=0.01, scene_threshold=0.3, max_gap=0, stride=1, queue_size=32,
+                  jpeg_quality=95):
+    """
+    Extract deduplicated frames from every video in source into <output_dir>/<split>/<images_subdir>
+
+    images_subdir='data' gives the ZeroWaste layout read by convert_to_yolo.
+    An empty <split>/labels folder is created next to it for the YOLO layout.
+
+    Returns:
+        List of per-video result dicts
+    """
+    videos = find_videos(source)
+    images_dir = Path(output_dir) / split / images_subdir
+    images_dir.mkdir(parents=True, exist_ok=True)
+    (Path(output_dir) / split / 'labels').mkdir(parents=True, exist_ok=True)
+    workers = workers or min(len(videos), os.cpu_count() or 1) or 1
+
+    metrics = get_metrics('video_ingest').start(
+        source=str(Path(source).absolute()), min_motion=min_motion, scene_threshold=scene_threshold,
+        max_gap=max_gap, stride=stride, workers=workers)
+
+    print("="*70)
+    print("Video Ingestion")
+    print("="*70)
+    print(f"Videos: {len(videos)} from {source}")
+    print(f"Output: {images_dir}")
+    print(f"Keep frames with motion >= {min_motion} or scene change >= {scene_threshold}"
+          f"{f' or every {max_gap} frames' if max_gap else ''}; {workers} parallel decoders\n")
+
+    tasks = [(v, str(images_dir), min_motion, scene_threshold, max_gap, stride, queue_size, jpeg_quality)
+             for v in videos]
+    results = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_task, task) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if 'error' in result:
+                print(f"  ⚠ {Path(result['video']).name}: {result['error']}")
+                metrics.count('unreadable_videos')
+                continue
+            metrics.merge(result['metrics'])
+            fps = result['decoded'] / max(result['seconds'], 1e-9)
+            print(f"  ✓ {Path(result['video']).name}: kept {result['kept']}/{result['decoded']} frames "
+                  f"({fps:.0f} frames/s)")
+    seconds = time.perf_counter() - t0
+
+    decoded = sum(r['decoded'] for r in results)
+    kept = sum(r['kept'] for r in results)
+    print(f"\n{'='*70}")
+    print(f"Frames decoded: {decoded}")
+    print(f"Frames kept:    {kept} ({kept / max(decoded, 1) * 100:.1f}%)")
+    print(f"Throughput:     {decoded / max(seconds, 1e-9):.0f} frames/s decoded, "
+          f"{kept / max(seconds, 1e-9):.1f} frames/s written ({seconds:.1f}s)")
+    print('='*70)
+
+    metrics.count('videos', len(videos))
+    metrics.finish()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract deduplicated frames from conveyor videos")
+    parser.add_argument('source', help="video file or folder of videos")
+    parser.add_argument('output', help="dataset root to write <split>/images into")
+    parser.add_argument('--split', default='train')
+    parser.add_argument('--images-subdir', default='images', help="'data' for the ZeroWaste layout")
+    parser.add_argument('--workers', type=int, default=None, help="videos decoded in parallel")
+    parser.add_argument('--min-motion', type=float, default=0.01, help="fraction of pixels changed")
+    parser.add_argument('--scene-threshold', type=float, default=0.3)
+    parser.add_argument('--max-gap', type=int, default=0)
+    parser.add_argument('--stride', type=int, default=1, help="decode every n-th frame only")
+    parser.add_argument('--queue-size', type=int, default=32)
+    parser.add_argument('--jpeg-quality', type=int, default=95)
+    args = parser.parse_args()
+
+    ingest_videos(args.source, args.output, args.split, args.images_subdir, args.workers,
+                  args.min_motion, args.scene_threshold, args.max_gap, args.stride,
+                  args.queue_size, args.jpeg_quality)
@@ -3,14 +3,84 @@
 YOLO Dataset Visualization Tool
 Visualizes images with bounding boxes to verify class mappings
 Perfect for checking if remapping was done correctly
+
+Large line-scan images are handled in bounded memory: images above
+max_megapixels are decoded at 1/2, 1/4 or 1/8 resolution by the JPEG/PNG
+decoder itself, and polygon fills are blended tile by tile directly into the
+image through one reused mask buffer (no full-frame overlay copy per polygon).
 """
 
 import os
 import cv2
 import random
+import numpy as np
 from pathlib import Path
 
-def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
+from memory_budget import ReusableBuffer, image_shape
+
+REDUCED_READ_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                      4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+_TILE_MASK = ReusableBuffer(np.uint8)
+
+
+def load_image(img_path, max_megapixels=None):
+    """
+    Decode an image, reduced by 2/4/8 when it is larger than max_megapixels
+
+    Returns:
+        (image or None, reduction factor)
+    """
+    factor = 1
+    shape = image_shape(img_path) if max_megapixels else None
+    if shape is not None:
+        pixels = shape[0] * shape[1]
+        while factor < 8 and pixels / factor**2 > max_megapixels * 1e6:
+            factor *= 2
+    return cv2.imread(img_path, REDUCED_READ_FLAGS[factor]), factor
+
+
+def blend_polygons(img, polygons, class_colors, alpha=0.3, tile=1024):
+    """
+    Fill polygons semi-transparently, in place and tile by tile
+
+    Each tile rasterizes only the polygons whose box touches it into a
+    reused tile-sized mask; pixels are blended where the mask is set, so
+    memory stays at one tile mask regardless of image size or polygon count.
+
+    Args:
+        img: BGR image, modified in place
+        polygons: List of (class_id, (n, 2) int32 pixel points)
+        class_colors: {class_id: BGR color}
+    """
+    if not polygons:
+        return
+    h, w = img.shape[:2]
+    # Class ids are stored in a uint8 mask
+    polygons = [(class_id, pts) for class_id, pts in polygons if 0 <= class_id < 255]
+    if not polygons:
+        return
+    boxes = np.array([[*pts.min(0), *pts.max(0)] for _, pts in polygons])
+    classes = np.array([class_id for class_id, _ in polygons])
+    for y0 in range(0, h, tile):
+        for x0 in range(0, w, tile):
+            y1, x1 = min(y0 + tile, h), min(x0 + tile, w)
+            hit = np.flatnonzero((boxes[:, 0] < x1) & (boxes[:, 2] >= x0) &
+                                 (boxes[:, 1] < y1) & (boxes[:, 3] >= y0))
+            if not len(hit):
+                continue
+            mask = _TILE_MASK.get((y1 - y0, x1 - x0))
+            region = img[y0:y1, x0:x1]
+            for i in hit:
+                # mask value = class id + 1 (later polygons on top)
+                cv2.fillPoly(mask, [polygons[i][1] - (x0, y0)], int(classes[i]) + 1)
+            for class_id in np.unique(classes[hit]):
+                selected = mask == class_id + 1
+                color = np.array(class_colors.get(int(class_id), (128, 128, 128)), np.float32)
+                region[selected] = (region[selected] * (1 - alpha) + color * alpha).astype(np.uint8)
+
+
+def visualize_yolo_dataset(dataset_path, num_samples=20, split='train', max_megapixels=None, tile=1024,
+                           save_dir=None):
     """
     Visualize random samples from YOLO dataset with bounding boxes
 
@@ -18,6 +88,9 @@ def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
         dataset_path: Path to your dataset (e.g., 'merged_dataset' or 'warp_remapped')
         num_samples: Number of images to display
         split: Which split to visualize ('train', 'val', 'test')
+        max_megapixels: Decode larger images at reduced resolution (None = full size)
+        tile: Tile size in pixels for polygon blending
+        save_dir: Write rendered images here instead of showing them
     """
 
     
@@ -68,7 +141,7 @@ def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
     for img_file in selected_images:
         
         img_path = os.path.join(images_dir, img_file)
-        img = cv2.imread(img_path)
+        img, reduced = load_image(img_path, max_megapixels)
 
         if img is None:
             print(f"Failed to load: {img_file}")
@@ -81,6 +154,7 @@ def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
         label_path = os.path.join(labels_dir, label_file)
 
         annotations_count = {i: 0 for i in range(len(class_names))}
+        polygons = []
 
         
         if os.path.exists(label_path):
@@ -119,39 +193,27 @@ def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
 
                 
                 elif len(parts) > 5:
-                    coords = list(map(float, parts[1:]))
-                    points = []
-
-                    for i in range(0, len(coords), 2):
-                        if i+1 < len(coords):
-                            x = int(coords[i] * w)
-                            y = int(coords[i+1] * h)
-                            points.append([x, y])
-
+                    coords = np.asarray(parts[1:], dtype=np.float64)
+                    points = (coords[:len(coords) // 2 * 2].reshape(-1, 2) * (w, h)).astype(np.int32)
                     if len(points) >= 3:
-                        import numpy as np
-                        points = np.array(points, dtype=np.int32)
-                        color = class_colors.get(class_id, (128, 128, 128))
-
-                        
-                        cv2.polylines(img, [points], True, color, 2)
-
-                        
-                        overlay = img.copy()
-                        cv2.fillPoly(overlay, [points], color)
-                        cv2.addWeighted(overlay, 0.3, img, 0.7, 0, img)
-
-                        
-                        M = cv2.moments(points)
-                        if M["m00"] != 0:
-                            cx = int(M["m10"] / M["m00"])
-                            cy = int(M["m01"] / M["m00"])
-                            label = class_names[class_id] if class_id < len(class_names) else f"Class {class_id}"
-                            cv2.putText(img, label, (cx-30, cy), 
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                        polygons.append((class_id, points))
         else:
             print(f"No label file for: {img_file}")
 
+        # Fills first (tile-wise, in place), then outlines and names on top
+        blend_polygons(img, polygons, class_colors, alpha=0.3, tile=tile)
+        for class_id, points in polygons:
+            color = class_colors.get(class_id, (128, 128, 128))
+            cv2.polylines(img, [points], True, color, 2)
+
+            M = cv2.moments(points)
+            if M["m00"] != 0:
+                cx = int(M["m10"] / M["m00"])
+                cy = int(M["m01"] / M["m00"])
+                label = class_names[class_id] if class_id < len(class_names) else f"Class {class_id}"
+                cv2.putText(img, label, (cx-30, cy), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
         
         info_text = f"{img_file} | "
         for class_id, count in annotations_count.items():
@@ -164,11 +226,15 @@ def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
         
-        cv2.imshow('YOLO Dataset Viewer', img)
+        if save_dir is None:
+            cv2.imshow('YOLO Dataset Viewer', img)
+        else:
+            os.makedirs(save_dir, exist_ok=True)
+            cv2.imwrite(os.path.join(save_dir, img_file), img)
 
         
         print(f"Image: {img_file}")
-        print(f"  Size: {w}x{h}")
+        print(f"  Size: {w * reduced}x{h * reduced}" + (f" (shown at 1/{reduced})" if reduced > 1 else ""))
         print(f"  Annotations: ", end="")
         for class_id, count in annotations_count.items():
             if count > 0:
@@ -176,12 +242,15 @@ def visualize_yolo_dataset(dataset_path, num_samples=20, split='train'):
         print("\n")
 
         
+        if save_dir is not None:
+            continue
         key = cv2.waitKey(0) & 0xFF
         if key == ord('q') or key == 27:  
             print("\nVisualization stopped by user")
             break
 
-    cv2.destroyAllWindows()
+    if save_dir is None:
+        cv2.destroyAllWindows()
     print("\nVisualization complete!")
 
 
@@ -192,10 +261,22 @@ if __name__ == "__main__":
     print("YOLO Dataset Visualization Tool")
     print("="*70 + "\n")
 
-    if len(sys.argv) > 1:
-        dataset_path = sys.argv[1]
-        split = sys.argv[2] if len(sys.argv) > 2 else 'train'
-        num_samples = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show YOLO labels on random dataset images")
+    parser.add_argument('dataset', nargs='?', help="dataset path (prompted when omitted)")
+    parser.add_argument('split', nargs='?', default='train')
+    parser.add_argument('samples', nargs='?', type=int, default=20)
+    parser.add_argument('--max-megapixels', type=float, default=None,
+                        help="decode larger images at 1/2, 1/4 or 1/8 resolution")
+    parser.add_argument('--tile', type=int, default=1024, help="tile size for polygon fills")
+    parser.add_argument('--save', default=None, help="write rendered images to this folder instead of showing")
+    args = parser.parse_args()
+
+    if args.dataset:
+        dataset_path = args.dataset
+        split = args.split
+        num_samples = args.samples
     else:
         print("Visualize YOLO annotations with bounding boxes/segmentation masks")
         print("\nExamples:")
@@ -218,7 +299,7 @@ if __name__ == "__main__":
         sys.exit(1)
 
     try:
-        visualize_yolo_dataset(dataset_path, num_samples, split)
+        visualize_yolo_dataset(dataset_path, num_samples, split, args.max_megapixels, args.tile, args.save)
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
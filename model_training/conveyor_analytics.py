@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Conveyor Analytics
+Turns the per-frame tracks of stream_inference.py into object counts: each
+track is counted once, when its box centre crosses a virtual line across
+the belt, and crossings are aggregated per class per time window.
+
+Aggregates are stored as an append-only time series, one file per camera
+stream under a store folder:
+
+    <store>/meta.json          window length, class names
+    <store>/<stream>.ts        16-byte header + fixed 16-byte records
+                               (window start [s], class, count, direction)
+
+Records are appended in window order, so a range query is two binary
+searches on a memory-mapped file, reading only the matching records.
+Each stream has its own writer process and file, so there is no locking
+between streams; a torn record from a crash is truncated on the next open.
+
+Usage:
+    python conveyor_analytics.py run best.pt cam1=rtsp://... cam2=belt2.mp4 --store counts --skip 3
+    python conveyor_analytics.py query counts --from 2026-10-19T08:00 --to 2026-10-19T12:00 --resample 3600
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'SWMTS\x00\x01\x00'
+HEADER_SIZE = 16
+RECORD = np.dtype([('t', '<i8'), ('cls', '<u2'), ('direction', 'i1'), ('pad', 'u1'), ('count', '<u4')])
+SERIES_SUFFIX = '.ts'
+
+
+# ---------------------------------------------------------------------------
+# Counting
+# ---------------------------------------------------------------------------
+
+class LineCounter:
+    """
+    Counts each track once when its box centre crosses a line
+
+    Args:
+        line: ((x1, y1), (x2, y2)) in normalized image coordinates
+        direction: +1 / -1 to count only crossings to that side of the line
+            (left-to-right of the line's direction is +1), 0 for both
+        forget_after: Frames after which an unseen track is dropped
+    """
+
+    def __init__(self, line=((0.5, 0.0), (0.5, 1.0)), direction=0, forget_after=90):
+        (self.x1, self.y1), (self.x2, self.y2) = line
+        self.direction = direction
+        self.forget_after = forget_after
+        self._side = {}       # track id -> last non-zero side
+        self._last_seen = {}
+        self._counted = set()
+
+    def update(self, tracks, frame_shape, frame_index):
+        """
+        Feed one frame of tracks ([x1, y1, x2, y2, conf, cls, id] in pixels)
+
+        Returns:
+            List of (class, direction) crossings in this frame
+        """
+        h, w = frame_shape[:2]
+        cx = (tracks[:, 0] + tracks[:, 2]) / (2 * w)
+        cy = (tracks[:, 1] + tracks[:, 3]) / (2 * h)
+        side = np.sign((self.x2 - self.x1) * (cy - self.y1) - (self.y2 - self.y1) * (cx - self.x1))
+
+        crossings = []
+        for s, cls, track_id in zip(side, tracks[:, 5].astype(int), tracks[:, 6].astype(int)):
+            self._last_seen[track_id] = frame_index
+            if s == 0:
+                continue
+            previous = self._side.get(track_id)
+            self._side[track_id] = s
+            if previous is None or previous == s or track_id in self._counted:
+                continue
+            if self.direction and s != self.direction:
+                continue
+            self._counted.add(track_id)
+            crossings.append((int(cls), int(s)))
+
+        if frame_index % self.forget_after == 0:
+            for track_id in [t for t, seen in self._last_seen.items()
+                             if frame_index - seen > self.forget_after]:
+                del self._last_seen[track_id]
+                self._side.pop(track_id, None)
+                self._counted.discard(track_id)
+        return crossings
+
+
+class WindowAggregator:
+    """Sums crossings per (class, direction) into fixed windows, handing back closed windows"""
+
+    def __init__(self, window_seconds=60):
+        self.window = int(window_seconds)
+        self.start = None
+        self.counts = {}
+
+    def add(self, timestamp, crossings):
+        """Returns the records of the windows closed by this timestamp (possibly empty)"""
+        start = int(timestamp // self.window) * self.window
+        closed = []
+        if self.start is not None and start > self.start:
+            closed = self.flush()
+        if self.start is None:
+            self.start = start
+        for key in crossings:
+            self.counts[key] = self.counts.get(key, 0) + 1
+        return closed
+
+    def flush(self):
+        """Records of the open window; windows without crossings produce none"""
+        records = np.zeros(len(self.counts), RECORD)
+        for i, ((cls, direction), count) in enumerate(sorted(self.counts.items())):
+            records[i] = (self.start, cls, direction, 0, count)
+        self.start = None
+        self.counts = {}
+        return records
+
+
+# ---------------------------------------------------------------------------
+# Time-series store
+# ---------------------------------------------------------------------------
+
+def _series_path(store, stream):
+    return Path(store) / f"{stream}{SERIES_SUFFIX}"
+
+
+class SeriesWriter:
+    """
+    Append-only writer for one stream's series file
+
+    Windows must arrive in non-decreasing order; re-opening after a restart
+    continues after the last record (a restart inside the same window adds a
+    second record for it, which queries sum).
+    """
+
+    def __init__(self, store, stream):
+        self.path = _series_path(store, stream)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size < HEADER_SIZE:
+            with open(self.path, 'wb') as f:
+                f.write(MAGIC + bytes(HEADER_SIZE - len(MAGIC)))
+        self._file = open(self.path, 'r+b')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{self.path} is not a series file")
+        # Drop a torn trailing record left by a crash
+        size = self.path.stat().st_size
+        whole = HEADER_SIZE + (size - HEADER_SIZE) // RECORD.itemsize * RECORD.itemsize
+        if whole != size:
+            self._file.truncate(whole)
+        self.last = None
+        if whole > HEADER_SIZE:
+            self._file.seek(whole - RECORD.itemsize)
+            self.last = int(np.frombuffer(self._file.read(RECORD.itemsize), RECORD)['t'][0])
+        self._file.seek(0, os.SEEK_END)
+
+    def append(self, records):
+        if not len(records):
+            return
+        if self.last is not None and records['t'][0] < self.last:
+            raise ValueError(f"{self.path.name}: window {records['t'][0]} is older than the "
+                             f"last stored window {self.last}")
+        self._file.write(records.tobytes())
+        self._file.flush()
+        self.last = int(records['t'][-1])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_meta(store, window_seconds, names):
+    """Window length and class names shared by all streams of a store"""
+    path = Path(store) / 'meta.json'
+    meta = {'window_seconds': int(window_seconds), 'names': {str(k): v for k, v in names.items()}}
+    if path.exists():
+        existing = json.loads(path.read_text())
+        if existing['window_seconds'] != meta['window_seconds']:
+            raise ValueError(f"{store} uses {existing['window_seconds']}s windows, "
+                             f"not {window_seconds}s")
+        return existing
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+def load_series(store, stream):
+    """Memory-mapped records of one stream (empty array for an empty file)"""
+    path = _series_path(store, stream)
+    n = (path.stat().st_size - HEADER_SIZE) // RECORD.itemsize
+    if n <= 0:
+        return np.zeros(0, RECORD)
+    return np.memmap(path, RECORD, 'r', offset=HEADER_SIZE, shape=(n,))
+
+
+def streams(store):
+    return sorted(p.name[:-len(SERIES_SUFFIX)] for p in Path(store).glob(f"*{SERIES_SUFFIX}"))
+
+
+def query(store, start=None, end=None, stream_names=None, classes=None, resample=None):
+    """
+    Counts in [start, end) (epoch seconds), optionally re-bucketed to resample seconds
+
+    Returns:
+        Dict {(stream, bucket start, class): count}; buckets are the stored
+        windows unless resample is given
+    """
+    out = {}
+    for stream in stream_names or streams(store):
+        records = load_series(store, stream)
+        t = records['t']
+        lo = 0 if start is None else int(np.searchsorted(t, start, 'left'))
+        hi = len(t) if end is None else int(np.searchsorted(t, end, 'left'))
+        chunk = np.asarray(records[lo:hi])
+        if classes is not None:
+            chunk = chunk[np.isin(chunk['cls'], list(classes))]
+        if not len(chunk):
+            continue
+        buckets = chunk['t'] // resample * resample if resample else chunk['t']
+        keys, inverse = np.unique(np.column_stack([buckets, chunk['cls']]), axis=0, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=chunk['count'], minlength=len(keys))
+        for (bucket, cls), count in zip(keys, sums):
+            out[(stream, int(bucket), int(cls))] = int(count)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Service
+# ---------------------------------------------------------------------------
+
+def count_stream(weights, stream, source, store, line, direction=0, window_seconds=60,
+                 detect_every=1, conf=0.25, imgsz=640, device=None, start_time=None, max_frames=None):
+    """
+    Run detector + tracker + line counter on one source and append its windows to the store
+
+    Video files are timestamped start_time (default: now) + video time; live
+    sources use the wall clock.
+
+    Returns:
+        Dict with frames, seconds and per-class totals
+    """
+    from ultralytics import YOLO
+    from stream_inference import stream_tracks
+
+    model = YOLO(weights)
+    counter = LineCounter(line, direction)
+    aggregator = WindowAggregator(window_seconds)
+    offset = time.time() if start_time is None else start_time
+    totals = {}
+    frames = 0
+    t0 = time.perf_counter()
+    with SeriesWriter(store, stream) as writer:
+        for index, timestamp, frame, tracks, _ in stream_tracks(model, source, detect_every, conf, imgsz, device,
+                                                                 max_frames=max_frames, start_time=offset):
+            crossings = counter.update(tracks, frame.shape, index)
+            for cls, _ in crossings:
+                totals[cls] = totals.get(cls, 0) + 1
+            writer.append(aggregator.add(timestamp, crossings))
+            frames += 1
+        writer.append(aggregator.flush())
+    return {'stream': stream, 'frames': frames, 'seconds': time.perf_counter() - t0, 'totals': totals}
+
+
+def _count_task(args):
+    return count_stream(*args)
+
+
+def _parse_source(spec, index):
+    """'name=source' or a bare source (named after the file stem / stream index)"""
+    if '=' in spec and not spec.split('=', 1)[0].startswith(('rtsp', 'http')):
+        return spec.split('=', 1)
+    stem = Path(spec).stem if os.path.exists(spec) else f"stream{index}"
+    return stem, spec
+
+
+def run_analytics(weights, sources, store, line=((0.5, 0.0), (0.5, 1.0)), direction=0, window_seconds=60,
+                  detect_every=1, conf=0.25, imgsz=640, device=None, start_time=None, max_frames=None):
+    """Count objects on several camera streams at once, one process per stream"""
+    from ultralytics import YOLO
+
+    named = [_parse_source(spec, i) for i, spec in enumerate(sources)]
+    if len({name for name, _ in named}) != len(named):
+        raise ValueError(f"Stream names must be unique: {[name for name, _ in named]}")
+    names = YOLO(weights).names
+    write_meta(store, window_seconds, names)
+
+    print("="*70)
+    print("Conveyor Analytics")
+    print("="*70)
+    print(f"Model:   {weights}")
+    print(f"Streams: {', '.join(f'{n}={s}' for n, s in named)}")
+    print(f"Line:    {line}  window {window_seconds}s  detector every {detect_every} frame(s)")
+    print(f"Store:   {store}\n")
+
+    tasks = [(weights, name, source, store, line, direction, window_seconds, detect_every, conf, imgsz,
+              device, start_time, max_frames) for name, source in named]
+    results = []
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = [pool.submit(_count_task, task) for task in tasks]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            counts = ', '.join(f"{names.get(c, c)}={n}" for c, n in sorted(r['totals'].items())) or 'none'
+            print(f"  ✓ {r['stream']}: {r['frames']} frames in {r['seconds']:.1f}s "
+                  f"({r['frames'] / max(r['seconds'], 1e-9):.1f} FPS), counted {counts}")
+    return results
+
+
+def print_query(store, start=None, end=None, stream_names=None, classes=None, resample=None):
+    meta = json.loads((Path(store) / 'meta.json').read_text())
+    names = meta['names']
+    t0 = time.perf_counter()
+    counts = query(store, start, end, stream_names, classes, resample)
+    ms = (time.perf_counter() - t0) * 1000
+    class_ids = sorted({cls for _, _, cls in counts})
+
+    print(f"{'window start':<20} {'stream':<12}" + ''.join(f" {names.get(str(c), c):>10}" for c in class_ids))
+    for stream, bucket in sorted({(s, b) for s, b, _ in counts}, key=lambda k: (k[1], k[0])):
+        when = datetime.fromtimestamp(bucket).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{when:<20} {stream:<12}" + ''.join(f" {counts.get((stream, bucket, c), 0):>10}"
+                                                    for c in class_ids))
+    print("\nTotal: " + ', '.join(f"{names.get(str(c), c)}={sum(n for (_, _, k), n in counts.items() if k == c)}"
+                                   for c in class_ids) + f"  (query {ms:.1f} ms)")
+    return counts
+
+
+def _epoch(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Line-crossing object counts per class and time window")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help="count objects on one or more streams")
+    p.add_argument('weights')
+    p.add_argument('sources', nargs='+', help="[name=]video file, camera index or rtsp/http URL")
+    p.add_argument('--store', required=True, help="time-series folder")
+    p.add_argument('--line', type=float, nargs=4, default=[0.5, 0.0, 0.5, 1.0], metavar=('X1', 'Y1', 'X2', 'Y2'),
+                   help="counting line in normalized coordinates (default: vertical centre line)")
+    p.add_argument('--direction', type=int, choices=[-1, 0, 1], default=0)
+    p.add_argument('--window', type=int, default=60, help="aggregation window in seconds")
+    p.add_argument('--skip', type=int, default=1, help="run the detector every N frames")
+    p.add_argument('--conf', type=float, default=0.25)
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--device', default=None)
+    p.add_argument('--start-time', default=None, help="epoch or ISO time of the first frame of video files")
+    p.add_argument('--max-frames', type=int, default=None)
+
+    q = sub.add_parser('query', help="print counts for a time range")
+    q.add_argument('store')
+    q.add_argument('--from', dest='start', default=None, help="epoch seconds or ISO time")
+    q.add_argument('--to', dest='end', default=None)
+    q.add_argument('--streams', nargs='+', default=None)
+    q.add_argument('--classes', type=int, nargs='+', default=None)
+    q.add_argument('--resample', type=int, default=None, help="bucket size in seconds")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        x1, y1, x2, y2 = args.line
+        run_analytics(args.weights, args.sources, args.store, ((x1, y1), (x2, y2)), args.direction,
+                      args.window, args.skip, args.conf, args.imgsz, args.device, _epoch(args.start_time),
+                      args.max_frames)
+    else:
+        print_query(args.store, _epoch(args.start), _epoch(args.end), args.streams, args.classes, args.resample)
@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+Fast Evaluation Engine
+Runs the detector over a split once, caches predictions + ground truth in a
+compact .npz, then computes precision / recall / mAP@0.5 / mAP@0.5:0.95 from
+the cache with vectorized IoU matrices. Re-scoring another confidence or
+NMS threshold, or a subset of images (e.g. zw_ vs warp_ prefixes), never
+touches the model.
+
+When the dataset has a merge provenance table (codes/provenance.py), scores
+can also be broken down per source dataset, per original class and per
+COCO size bucket (small/medium/large) by joining on it.
+
+Usage:
+    python evaluate.py cache best.pt data.yaml --split test --out test_preds.npz
+    python evaluate.py score test_preds.npz --conf 0.001 0.25 0.5 --by-prefix
+    python evaluate.py score test_preds.npz --by-source --by-original-class --by-size
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# COCO area ranges in pixels of the original image
+SIZE_BUCKETS = {'small': (0, 32**2), 'medium': (32**2, 96**2), 'large': (96**2, float('inf'))}
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+
+# ---------------------------------------------------------------------------
+# Caching
+# ---------------------------------------------------------------------------
+
+def _label_path(image_path):
+    """YOLO convention: .../images/x.jpg -> .../labels/x.txt"""
+    parts = list(Path(image_path).parts)
+    if 'images' in parts:
+        idx = len(parts) - 1 - parts[::-1].index('images')
+        parts[idx] = 'labels'
+    return Path(*parts).with_suffix('.txt')
+
+
+def read_ground_truth(label_path):
+    """Read a YOLO label file as (classes, xyxy boxes); polygons become their bounding box"""
+    classes, boxes = [], []
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 5:
+                    continue
+                values = np.asarray(parts[1:], dtype=np.float32)
+                if len(values) == 4:
+                    x, y, w, h = values
+                    boxes.append([x - w / 2, y - h / 2, x + w / 2, y + h / 2])
+                else:
+                    xy = values[:len(values) // 2 * 2].reshape(-1, 2)
+                    boxes.append([*xy.min(0), *xy.max(0)])
+                classes.append(int(parts[0]))
+    return np.asarray(classes, np.int16), np.asarray(boxes, np.float32).reshape(-1, 4)
+
+
+def ground_truth_table(dataset_root):
+    """
+    {(split, image name): (classes, xyxy)} from the dataset's annotations.parquet
+    (codes/annotation_table.py), or None when it is missing, stale or pyarrow is absent
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'codes'))
+    from annotation_table import image_boxes, load_annotations
+
+    table = load_annotations(dataset_root, columns=['split', 'image', 'class_id', 'x', 'y', 'w', 'h'])
+    return image_boxes(table) if table is not None else None
+
+
+def _table_key(image_path, dataset_root):
+    """(split, name) key of an image in the annotation table ('' split for flat layouts)"""
+    try:
+        parts = Path(image_path).resolve().relative_to(Path(dataset_root).resolve()).parts
+    except ValueError:
+        return None
+    return (parts[0] if len(parts) > 2 else '', parts[-1])
+
+
+def split_images(data_yaml, split):
+    """Image paths of one split of a data.yaml (folder, list file, or list of either)"""
+    import yaml
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = Path(data.get('path') or Path(data_yaml).parent)
+    entries = data[split] if isinstance(data[split], list) else [data[split]]
+    images = []
+    for entry in entries:
+        entry = Path(entry) if Path(entry).is_absolute() else root / entry
+        if entry.is_dir():
+            images.extend(sorted(p for p in entry.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS))
+        elif entry.is_file():
+            with open(entry) as f:
+                lines = [line.strip() for line in f if line.strip()]
+            # './' entries are relative to the list file (relocatable lists)
+            images.extend(Path(os.path.normpath(entry.parent / line[2:])) if line.startswith('./') else Path(line)
+                          for line in lines)
+    return images, data.get('names', {}), root
+
+
+def cache_predictions(weights, data_yaml, split='test', output=None, conf=0.001, iou=0.7,
+                      imgsz=640, batch=16, device=None):
+    """
+    Run the model once over a split and store predictions + ground truth
+
+    Predictions are kept down to conf (default 0.001, like ultralytics val),
+    so any higher threshold can be applied later from the cache.
+
+    Returns:
+        Path of the written .npz
+    """
+    from ultralytics import YOLO
+
+    images, names, dataset_root = split_images(data_yaml, split)
+    output = output or f"{split}_predictions.npz"
+    model = YOLO(weights)
+
+    print("="*70)
+    print("Caching predictions")
+    print("="*70)
+    print(f"Model: {weights}\nData:  {data_yaml} [{split}] ({len(images)} images)\n")
+
+    table = ground_truth_table(dataset_root)
+    if table is not None:
+        print(f"Ground truth from {Path(dataset_root) / 'annotations.parquet'}")
+
+    pred_boxes, pred_scores, pred_cls, pred_counts = [], [], [], []
+    gt_boxes, gt_cls, gt_counts = [], [], []
+    image_sizes = []
+
+    t0 = time.perf_counter()
+    for start in range(0, len(images), batch):
+        chunk = [str(p) for p in images[start:start + batch]]
+        results = model.predict(chunk, conf=conf, iou=iou, imgsz=imgsz, device=device,
+                                verbose=False, max_det=300)
+        for path, result in zip(chunk, results):
+            boxes = result.boxes
+            pred_boxes.append(boxes.xyxyn.cpu().numpy().astype(np.float32))
+            pred_scores.append(boxes.conf.cpu().numpy().astype(np.float32))
+            pred_cls.append(boxes.cls.cpu().numpy().astype(np.int16))
+            pred_counts.append(len(boxes))
+            image_sizes.append(result.orig_shape[:2])
+
+            found = table.get(_table_key(path, dataset_root)) if table is not None else None
+            cls, gt = found if found is not None else read_ground_truth(_label_path(path))
+            gt_cls.append(cls)
+            gt_boxes.append(gt)
+            gt_counts.append(len(cls))
+        print(f"  {min(start + batch, len(images))}/{len(images)} images", end='\r')
+    seconds = time.perf_counter() - t0
+
+    meta = {
+        'weights': os.path.abspath(weights), 'data': os.path.abspath(data_yaml), 'split': split,
+        'dataset_root': str(Path(dataset_root).resolve()),
+        'conf': conf, 'nms_iou': iou, 'imgsz': imgsz,
+        'names': {int(k): v for k, v in (names.items() if isinstance(names, dict) else enumerate(names))},
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    np.savez_compressed(
+        output,
+        image_names=np.asarray([p.name for p in images]),
+        image_sizes=np.asarray(image_sizes, np.int32).reshape(-1, 2),
+        pred_offsets=np.concatenate([[0], np.cumsum(pred_counts)]).astype(np.int64),
+        pred_boxes=np.concatenate(pred_boxes) if pred_boxes else np.zeros((0, 4), np.float32),
+        pred_scores=np.concatenate(pred_scores) if pred_scores else np.zeros(0, np.float32),
+        pred_cls=np.concatenate(pred_cls) if pred_cls else np.zeros(0, np.int16),
+        gt_offsets=np.concatenate([[0], np.cumsum(gt_counts)]).astype(np.int64),
+        gt_boxes=np.concatenate(gt_boxes) if gt_boxes else np.zeros((0, 4), np.float32),
+        gt_cls=np.concatenate(gt_cls) if gt_cls else np.zeros(0, np.int16),
+        meta=np.asarray(json.dumps(meta)),
+    )
+    print(f"\n✓ Cached {sum(pred_counts)} predictions / {sum(gt_counts)} labels "
+          f"in {seconds:.1f}s -> {output} ({os.path.getsize(output) / 1024:.0f} KB)")
+    return output
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def box_iou(a, b):
+    """Pairwise IoU of xyxy boxes: (N, 4) x (M, 4) -> (N, M)"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def nms(boxes, scores, classes, iou_threshold):
+    """Greedy class-aware NMS; returns kept indices sorted by score"""
+    order = np.argsort(-scores)
+    # Offset boxes per class so one IoU matrix handles all classes at once
+    shifted = boxes + classes[:, None].astype(np.float32) * 4.0
+    iou = box_iou(shifted[order], shifted[order])
+    keep = np.ones(len(order), bool)
+    for i in range(len(order)):
+        if keep[i]:
+            keep[i + 1:] &= iou[i, i + 1:] <= iou_threshold
+    return order[keep]
+
+
+def match_predictions(pred_cls, gt_cls, iou):
+    """
+    Greedy IoU matching at every threshold in IOU_THRESHOLDS (same rule as
+    ultralytics val): highest IoU first, each prediction and label used once.
+
+    Args:
+        iou: (n_pred, n_gt) IoU matrix
+
+    Returns:
+        (n_pred, 10) int array: index of the matched label, -1 for a false positive
+    """
+    matched = np.full((len(pred_cls), len(IOU_THRESHOLDS)), -1, np.int64)
+    iou = iou * (pred_cls[:, None] == gt_cls[None, :])
+    for i, threshold in enumerate(IOU_THRESHOLDS):
+        matches = np.argwhere(iou >= threshold)
+        if matches.shape[0]:
+            if matches.shape[0] > 1:
+                matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+            matched[matches[:, 0], i] = matches[:, 1]
+    return matched
+
+
+def compute_ap(recall, precision):
+    """COCO-style 101-point interpolated AP from a recall/precision curve"""
+    # Precision drops to 0 past the last reached recall (not interpolated up to recall 1)
+    mrec = np.concatenate(([0.0], recall, [recall[-1] if len(recall) else 1.0], [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0], [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    return _trapezoid(np.interp(x, mrec, mpre), x)
+
+
+def _smooth(y, fraction=0.05):
+    """Box filter used to pick the max-F1 confidence (as in ultralytics)"""
+    nf = round(len(y) * fraction * 2) // 2 + 1
+    p = np.ones(nf // 2)
+    yp = np.concatenate((p * y[0], y, p * y[-1]), 0)
+    return np.convolve(yp, np.ones(nf) / nf, mode='valid')
+
+
+def ap_per_class(tp, conf, pred_cls, gt_cls, eps=1e-16):
+    """
+    Precision/recall at the max-F1 confidence and AP at each IoU threshold, per class
+
+    Returns:
+        Dict with 'classes', 'p', 'r', 'ap' ((n_classes, 10)) and 'n_labels'
+    """
+    order = np.argsort(-conf)
+    tp, conf, pred_cls = tp[order], conf[order], pred_cls[order]
+    classes, n_labels = np.unique(gt_cls, return_counts=True)
+
+    px = np.linspace(0, 1, 1000)
+    ap = np.zeros((len(classes), tp.shape[1]))
+    p_curve = np.zeros((len(classes), 1000))
+    r_curve = np.zeros((len(classes), 1000))
+    for ci, c in enumerate(classes):
+        mask = pred_cls == c
+        if not mask.any():
+            continue
+        tpc = tp[mask].cumsum(0)
+        fpc = (1 - tp[mask]).cumsum(0)
+        recall = tpc / (n_labels[ci] + eps)
+        precision = tpc / (tpc + fpc)
+        r_curve[ci] = np.interp(-px, -conf[mask], recall[:, 0], left=0)
+        p_curve[ci] = np.interp(-px, -conf[mask], precision[:, 0], left=1)
+        for j in range(tp.shape[1]):
+            ap[ci, j] = compute_ap(recall[:, j], precision[:, j])
+
+    f1 = 2 * p_curve * r_curve / (p_curve + r_curve + eps)
+    best = _smooth(f1.mean(0), 0.1).argmax() if len(classes) else 0
+    return {'classes': classes, 'p': p_curve[:, best], 'r': r_curve[:, best], 'ap': ap, 'n_labels': n_labels}
+
+
+def _subset_ap(tp, valid, conf, pred_cls, gt_cls):
+    """
+    mAP per IoU threshold where only rows flagged valid[:, j] take part at threshold j
+
+    Returns:
+        (10,) array of AP averaged over the classes present in gt_cls
+    """
+    order = np.argsort(-conf)
+    tp, valid, pred_cls = tp[order], valid[order], pred_cls[order]
+    classes, n_labels = np.unique(gt_cls, return_counts=True)
+    ap = np.zeros((len(classes), tp.shape[1]))
+    for ci, c in enumerate(classes):
+        of_class = pred_cls == c
+        for j in range(tp.shape[1]):
+            t = tp[of_class & valid[:, j], j]
+            if len(t):
+                tpc = np.cumsum(t)
+                fpc = np.cumsum(~t)
+                ap[ci, j] = compute_ap(tpc / n_labels[ci], tpc / (tpc + fpc))
+    return ap.mean(0) if len(classes) else np.zeros(tp.shape[1])
+
+
+class PredictionCache:
+    """
+    Cached predictions + ground truth with memoized prediction->label matches
+
+    Matching depends on the confidence/NMS thresholds but not on which images
+    or labels are scored, so subsets (per source, size bucket, original class)
+    reuse the same match arrays.
+    """
+
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            self.arrays = {k: data[k] for k in data.files}
+        self.meta = json.loads(str(self.arrays['meta']))
+        self.image_names = self.arrays['image_names']
+        self.pred_image = np.repeat(np.arange(len(self)), np.diff(self.arrays['pred_offsets']))
+        self.gt_image = np.repeat(np.arange(len(self)), np.diff(self.arrays['gt_offsets']))
+        self.image_source = None
+        self.gt_original_class = None
+        self._match_cache = {}
+
+    def __len__(self):
+        return len(self.image_names)
+
+    def _image_slice(self, kind, i):
+        offsets = self.arrays[f'{kind}_offsets']
+        return slice(offsets[i], offsets[i + 1])
+
+    def matches(self, conf=None, nms_iou=None):
+        """
+        Per-image kept prediction indices and their matched labels for one threshold setting
+
+        Returns:
+            (kept: list of index arrays into pred_*,
+             matched: list of (k, 10) arrays of global label indices into gt_*, -1 = false positive)
+        """
+        conf = self.meta['conf'] if conf is None else conf
+        if nms_iou is not None and nms_iou > self.meta['nms_iou']:
+            raise ValueError(f"Cache was built with NMS IoU {self.meta['nms_iou']}; "
+                             f"a looser {nms_iou} needs a new cache")
+        key = (round(conf, 6), nms_iou)
+        if key in self._match_cache:
+            return self._match_cache[key]
+
+        a = self.arrays
+        kept, matched = [], []
+        for i in range(len(self)):
+            ps = self._image_slice('pred', i)
+            gs = self._image_slice('gt', i)
+            idx = np.arange(ps.start, ps.stop)[a['pred_scores'][ps] >= conf]
+            if nms_iou is not None and len(idx) > 1:
+                idx = idx[nms(a['pred_boxes'][idx], a['pred_scores'][idx], a['pred_cls'][idx], nms_iou)]
+            gt_boxes = a['gt_boxes'][gs]
+            if len(idx) and len(gt_boxes):
+                m = match_predictions(a['pred_cls'][idx], a['gt_cls'][gs], box_iou(a['pred_boxes'][idx], gt_boxes))
+                m[m >= 0] += gs.start
+            else:
+                m = np.full((len(idx), len(IOU_THRESHOLDS)), -1, np.int64)
+            kept.append(idx)
+            matched.append(m)
+        self._match_cache[key] = (kept, matched)
+        return kept, matched
+
+    def score(self, conf=None, nms_iou=None, images=None):
+        """
+        Metrics for a threshold setting over all images or a subset
+
+        Args:
+            conf: Confidence threshold (>= the cache's conf)
+            nms_iou: Optional stricter NMS IoU re-applied on cached boxes
+            images: Optional boolean mask / index array selecting images
+
+        Returns:
+            Dict of precision, recall, map50, map (0.5:0.95) and per-class AP
+        """
+        kept, matched = self.matches(conf, nms_iou)
+        selected = np.arange(len(self)) if images is None else np.arange(len(self))[images]
+        a = self.arrays
+
+        idx = np.concatenate([kept[i] for i in selected]) if len(selected) else np.zeros(0, np.int64)
+        tp = (np.concatenate([matched[i] for i in selected]) >= 0 if len(selected)
+              else np.zeros((0, len(IOU_THRESHOLDS)), bool))
+        gt_cls = (np.concatenate([a['gt_cls'][self._image_slice('gt', i)] for i in selected])
+                  if len(selected) else np.zeros(0, np.int16))
+
+        result = ap_per_class(tp.astype(np.float64), a['pred_scores'][idx], a['pred_cls'][idx], gt_cls)
+        ap = result['ap']
+        return {
+            'images': int(len(selected)),
+            'labels': int(len(gt_cls)),
+            'predictions': int(len(idx)),
+            'precision': float(result['p'].mean()) if len(ap) else 0.0,
+            'recall': float(result['r'].mean()) if len(ap) else 0.0,
+            'map50': float(ap[:, 0].mean()) if len(ap) else 0.0,
+            'map': float(ap.mean()) if len(ap) else 0.0,
+            'per_class': {int(c): float(ap[k].mean()) for k, c in enumerate(result['classes'])},
+        }
+
+    def score_labels(self, gt_mask, pred_mask=None, conf=None, nms_iou=None):
+        """
+        Metrics restricted to a subset of labels (COCO area-range rules)
+
+        Predictions matched to a label outside the subset are ignored.
+        Unmatched predictions count as false positives only where pred_mask
+        is true (e.g. their own area falls in the same size bucket); without
+        a pred_mask nothing counts against precision, so only recall is
+        reported.
+
+        Args:
+            gt_mask: Boolean mask over all cached labels
+            pred_mask: Boolean mask over all cached predictions, or None
+        """
+        kept, matched = self.matches(conf, nms_iou)
+        a = self.arrays
+        idx = np.concatenate(kept)
+        m = np.concatenate(matched)
+        in_subset = (m >= 0) & gt_mask[np.maximum(m, 0)]
+        n_labels = int(gt_mask.sum())
+
+        result = {
+            'images': int(len(np.unique(self.gt_image[gt_mask]))),
+            'labels': n_labels,
+            'recall50': float(in_subset[:, 0].sum() / n_labels) if n_labels else 0.0,
+            'recall': float(in_subset.sum(0).mean() / n_labels) if n_labels else 0.0,
+        }
+        if pred_mask is not None:
+            valid = in_subset | ((m < 0) & pred_mask[idx][:, None])
+            ap = _subset_ap(in_subset, valid, a['pred_scores'][idx], a['pred_cls'][idx], a['gt_cls'][gt_mask])
+            result.update({'map50': float(ap[0]), 'map': float(ap.mean())})
+        return result
+
+    # ----- subsets -----
+
+    def prefix_mask(self, prefix):
+        return np.char.startswith(self.image_names.astype(str), prefix)
+
+    def prefixes(self):
+        """Distinct source prefixes (name up to the first '_', e.g. zw, warp)"""
+        return sorted({n.split('_', 1)[0] + '_' for n in self.image_names.astype(str) if '_' in n})
+
+    def attach_provenance(self, path=None):
+        """
+        Join the cache with a dataset provenance table (codes/provenance.py)
+
+        Args:
+            path: provenance.db, or None to use the one in the cached dataset root
+
+        Returns:
+            Number of cached images found in the table
+        """
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'codes'))
+        from provenance import ProvenanceTable, provenance_path
+
+        path = path or provenance_path(self.meta.get('dataset_root', ''))
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No provenance table at {path}")
+
+        with ProvenanceTable(path) as table:
+            rows = table.lookup(self.image_names.astype(str))
+
+        offsets = self.arrays['gt_offsets']
+        self.image_source = np.asarray([rows[n]['source'] if n in rows else '' for n in self.image_names.astype(str)])
+        self.gt_original_class = np.full(len(self.gt_image), -1, np.int64)
+        for i, name in enumerate(self.image_names.astype(str)):
+            classes = rows.get(name, {}).get('original_classes')
+            # Only trust the join when the label file still has one line per recorded class
+            if classes is not None and len(classes) == offsets[i + 1] - offsets[i]:
+                self.gt_original_class[offsets[i]:offsets[i + 1]] = classes
+        return len(rows)
+
+    def sources(self):
+        return sorted(set(self.image_source) - {''})
+
+    def source_mask(self, source):
+        return self.image_source == source
+
+    def area_px(self, kind):
+        """Box areas in original-image pixels for 'pred' or 'gt' boxes"""
+        if 'image_sizes' not in self.arrays:
+            raise ValueError("Cache has no image sizes; rebuild it with this version of evaluate.py")
+        boxes = self.arrays[f'{kind}_boxes']
+        image = self.pred_image if kind == 'pred' else self.gt_image
+        h, w = self.arrays['image_sizes'][image].T
+        return (boxes[:, 2] - boxes[:, 0]) * w * (boxes[:, 3] - boxes[:, 1]) * h
+
+
+def _print_row(label, m):
+    print(f"  {label:<24} {m['images']:>6} {m['labels']:>7} {m['precision']:>7.3f} {m['recall']:>7.3f} "
+          f"{m['map50']:>7.3f} {m['map']:>9.3f}")
+
+
+def score_cache(path, confs=(None,), nms_iou=None, prefixes=None, by_prefix=False,
+                by_source=False, by_original_class=False, by_size=False, provenance=None):
+    """
+    Print metrics for each confidence threshold with the requested breakdowns
+
+    Per-source and per-original-class breakdowns join on the merge provenance
+    table; size buckets use the cached image sizes.
+    """
+    cache = PredictionCache(path)
+    print("="*70)
+    print(f"Scoring {path} ({len(cache)} images, split={cache.meta['split']})")
+    print("="*70)
+    if by_prefix and not prefixes:
+        prefixes = cache.prefixes()
+    if by_source or by_original_class:
+        found = cache.attach_provenance(provenance)
+        print(f"Provenance: {found}/{len(cache)} images joined")
+
+    results = []
+    for conf in confs:
+        t0 = time.perf_counter()
+        overall = cache.score(conf, nms_iou)
+        rows = [('all', overall)]
+        for prefix in prefixes or []:
+            rows.append((f"{prefix}*", cache.score(conf, nms_iou, cache.prefix_mask(prefix))))
+        if by_source:
+            for source in cache.sources():
+                rows.append((f"source={source}", cache.score(conf, nms_iou, cache.source_mask(source))))
+
+        size_rows = []
+        if by_size:
+            gt_area, pred_area = cache.area_px('gt'), cache.area_px('pred')
+            for bucket, (lo, hi) in SIZE_BUCKETS.items():
+                size_rows.append((bucket, cache.score_labels((gt_area >= lo) & (gt_area < hi),
+                                                             (pred_area >= lo) & (pred_area < hi), conf, nms_iou)))
+
+        class_rows = []
+        if by_original_class:
+            label_source = cache.image_source[cache.gt_image]
+            for source in cache.sources():
+                for original in np.unique(cache.gt_original_class[label_source == source]):
+                    if original >= 0:
+                        mask = (label_source == source) & (cache.gt_original_class == original)
+                        class_rows.append((f"{source}:{original}", cache.score_labels(mask, None, conf, nms_iou)))
+        ms = (time.perf_counter() - t0) * 1000
+
+        print(f"\nconf={conf if conf is not None else cache.meta['conf']} nms_iou={nms_iou or cache.meta['nms_iou']} "
+              f"({ms:.0f} ms)")
+        print(f"  {'subset':<24} {'images':>6} {'labels':>7} {'P':>7} {'R':>7} {'mAP50':>7} {'mAP50-95':>9}")
+        for label, metrics in rows:
+            _print_row(label, metrics)
+        if size_rows:
+            print(f"\n  {'size (COCO area)':<24} {'images':>6} {'labels':>7} {'R50':>7} {'R':>7} {'mAP50':>7} {'mAP50-95':>9}")
+            for label, m in size_rows:
+                print(f"  {label:<24} {m['images']:>6} {m['labels']:>7} {m['recall50']:>7.3f} {m['recall']:>7.3f} "
+                      f"{m['map50']:>7.3f} {m['map']:>9.3f}")
+        if class_rows:
+            print(f"\n  {'original class':<24} {'images':>6} {'labels':>7} {'R50':>7} {'R50-95':>7}")
+            for label, m in class_rows:
+                print(f"  {label:<24} {m['images']:>6} {m['labels']:>7} {m['recall50']:>7.3f} {m['recall']:>7.3f}")
+        results.append({'conf': conf, 'rows': rows, 'sizes': size_rows, 'original_classes': class_rows})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache predictions once, score them many times")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_cache = sub.add_parser('cache', help="run the model over a split and cache predictions")
+    p_cache.add_argument('weights')
+    p_cache.add_argument('data')
+    p_cache.add_argument('--split', default='test')
+    p_cache.add_argument('--out', default=None)
+    p_cache.add_argument('--conf', type=float, default=0.001)
+    p_cache.add_argument('--iou', type=float, default=0.7)
+    p_cache.add_argument('--imgsz', type=int, default=640)
+    p_cache.add_argument('--batch', type=int, default=16)
+    p_cache.add_argument('--device', default=None)
+
+    p_score = sub.add_parser('score', help="compute metrics from a cache")
+    p_score.add_argument('cache')
+    p_score.add_argument('--conf', type=float, nargs='+', default=[None])
+    p_score.add_argument('--nms-iou', type=float, default=None)
+    p_score.add_argument('--prefix', nargs='+', default=None, help="score these filename prefixes separately")
+    p_score.add_argument('--by-prefix', action='store_true', help="break down by every filename prefix")
+    p_score.add_argument('--by-source', action='store_true', help="break down by provenance source dataset")
+    p_score.add_argument('--by-original-class', action='store_true',
+                         help="recall per original (pre-merge) class, from the provenance table")
+    p_score.add_argument('--by-size', action='store_true', help="COCO small/medium/large buckets")
+    p_score.add_argument('--provenance', default=None,
+                         help="provenance.db (default: the one in the cached dataset root)")
+
+    args = parser.parse_args()
+    if args.command == 'cache':
+        cache_predictions(args.weights, args.data, args.split, args.out, args.conf, args.iou,
+                          args.imgsz, args.batch, args.device)
+    else:
+        score_cache(args.cache, args.conf, args.nms_iou, args.prefix, args.by_prefix,
+                    args.by_source, args.by_original_class, args.by_size, args.provenance)
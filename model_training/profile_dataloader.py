@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Dataloader Throughput Profiler (CPU only)
+Replays the exact training dataset from a data.yaml through the same
+ultralytics dataset/dataloader used by 01_swm_large.py, without a GPU.
+
+1. Per-image breakdown on a sample: file read (I/O), JPEG/PNG decode,
+   load+resize, and the full train-mode __getitem__ (augmentation).
+2. Sweep over dataloader workers x cache modes (none/ram/disk), reporting
+   samples/sec and peak memory of the process tree, so batch/workers/cache
+   can be picked before booking GPU time.
+
+Note: cache=disk writes .npy files next to the images, like training does.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+
+CACHE_MODES = {'none': False, 'ram': 'ram', 'disk': 'disk'}
+
+
+def _tree_rss_mb():
+    """RSS of this process plus its children (dataloader workers), in MB"""
+    try:
+        import psutil
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    proc = psutil.Process()
+    rss = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss / 1024**2
+
+
+def build_dataset(data_yaml, split='train', imgsz=640, batch=6, cache='none', fraction=1.0, augment=True):
+    """Build the ultralytics YOLODataset exactly as DetectionTrainer does for this split"""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+
+    data = check_det_dataset(data_yaml)
+    cfg = get_cfg(overrides={
+        'data': data_yaml, 'imgsz': imgsz, 'batch': batch,
+        'cache': CACHE_MODES[cache], 'fraction': fraction,
+    })
+    # Data-yaml augmentation keys (hsv_h, degrees, mosaic, ...) override the defaults
+    for key, value in data.items():
+        if hasattr(cfg, key) and key not in ('path', 'train', 'val', 'test', 'nc', 'names'):
+            setattr(cfg, key, value)
+    mode = 'train' if augment else 'val'
+    return build_yolo_dataset(cfg, data[split], batch, data, mode=mode, rect=False, stride=32)
+
+
+def component_breakdown(dataset, samples=50, seed=0):
+    """
+    Time each step of loading one training sample, in milliseconds per image
+
+    Returns:
+        Dict of step -> mean ms
+    """
+    rng = random.Random(seed)
+    indices = rng.sample(range(len(dataset)), min(samples, len(dataset)))
+    timings = {'read_io': [], 'decode': [], 'load_resize': [], 'getitem_augment': []}
+
+    for i in indices:
+        path = dataset.im_files[i]
+
+        t0 = time.perf_counter()
+        with open(path, 'rb') as f:
+            raw = f.read()
+        t1 = time.perf_counter()
+        cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+        t2 = time.perf_counter()
+        timings['read_io'].append(t1 - t0)
+        timings['decode'].append(t2 - t1)
+
+        # Drop any cached copy so load_image() really reads from disk
+        if dataset.ims[i] is not None and dataset.cache != 'ram':
+            dataset.ims[i] = None
+        t3 = time.perf_counter()
+        dataset.load_image(i)
+        t4 = time.perf_counter()
+        dataset[i]
+        t5 = time.perf_counter()
+        timings['load_resize'].append(t4 - t3)
+        timings['getitem_augment'].append(t5 - t4)
+
+    return {k: round(float(np.mean(v)) * 1000, 2) for k, v in timings.items()}
+
+
+def measure_loader(dataset, batch, workers, batches=50, warmup=5):
+    """Iterate the training dataloader and measure samples/sec and peak memory"""
+    from ultralytics.data import build_dataloader
+
+    loader = build_dataloader(dataset, batch, workers, shuffle=True, rank=-1)
+    it = iter(loader)
+    peak = _tree_rss_mb()
+
+    for _ in range(warmup):
+        next(it)
+
+    samples = 0
+    t0 = time.perf_counter()
+    for n in range(batches):
+        try:
+            b = next(it)
+        except StopIteration:
+            it = iter(loader)
+            b = next(it)
+        samples += len(b['im_file'])
+        if n % 5 == 0:
+            peak = max(peak, _tree_rss_mb())
+    seconds = time.perf_counter() - t0
+
+    del it, loader
+    gc.collect()
+    return {
+        'samples_per_sec': round(samples / seconds, 2),
+        'batch_ms': round(seconds / batches * 1000, 1),
+        'peak_rss_mb': round(peak, 1),
+    }
+
+
+def profile_dataloader(data_yaml, workers_list=(0, 2, 4, 8), caches=('none', 'ram', 'disk'),
+                       imgsz=640, batch=6, batches=50, fraction=1.0, split='train', output=None):
+    """
+    Run the component breakdown and the workers x cache sweep
+
+    Args:
+        data_yaml: data.yaml used for training (e.g. swm_final_split/data.yaml)
+        workers_list: Dataloader worker counts to try
+        caches: Cache modes to try ('none', 'ram', 'disk')
+        imgsz, batch: Same values as the planned training run
+        batches: Batches timed per configuration (after 5 warm-up batches)
+        fraction: Fraction of the split to use (faster sweeps on big sets)
+        output: Optional JSON-lines file to append results to
+    """
+    print("="*70)
+    print("Dataloader Throughput Profiler (CPU)")
+    print("="*70)
+    print(f"Data: {data_yaml} [{split}]  imgsz={imgsz} batch={batch} fraction={fraction}")
+    print(f"CPU cores: {os.cpu_count()}\n")
+
+    dataset = build_dataset(data_yaml, split, imgsz, batch, 'none', fraction)
+    print(f"Images: {len(dataset)}")
+
+    breakdown = component_breakdown(dataset)
+    print("\nPer-image cost (ms, single process):")
+    for step, ms in breakdown.items():
+        print(f"  {step:<18} {ms:8.2f}")
+    augment_ms = breakdown['getitem_augment']
+    io_decode_ms = breakdown['read_io'] + breakdown['decode']
+    print(f"  -> {'augmentation' if augment_ms > io_decode_ms else 'I/O + decode'} dominates")
+    del dataset
+
+    results = []
+    print(f"\n{'cache':<6} {'workers':>7} {'samples/s':>10} {'batch ms':>9} {'peak MB':>9}")
+    print('-'*45)
+    for cache in caches:
+        dataset = build_dataset(data_yaml, split, imgsz, batch, cache, fraction)
+        for workers in workers_list:
+            result = measure_loader(dataset, batch, workers, batches)
+            result.update({'cache': cache, 'workers': workers})
+            results.append(result)
+            print(f"{cache:<6} {workers:>7} {result['samples_per_sec']:>10.1f} "
+                  f"{result['batch_ms']:>9.1f} {result['peak_rss_mb']:>9.1f}")
+        del dataset
+        gc.collect()
+
+    best = max(results, key=lambda r: r['samples_per_sec'])
+    print(f"\nBest: cache={best['cache']} workers={best['workers']} "
+          f"({best['samples_per_sec']:.1f} samples/s, {best['peak_rss_mb']:.0f} MB)")
+
+    if output:
+        with open(output, 'a') as f:
+            f.write(json.dumps({
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'data': os.path.abspath(data_yaml),
+                'imgsz': imgsz, 'batch': batch, 'fraction': fraction,
+                'breakdown_ms': breakdown, 'sweep': results,
+            }) + '\n')
+        print(f"Results appended to {output}")
+    return breakdown, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU-only dataloader throughput profiler")
+    parser.add_argument('data', help="path to data.yaml")
+    parser.add_argument('--split', default='train')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=6)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('--cache', nargs='+', choices=list(CACHE_MODES), default=list(CACHE_MODES))
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--fraction', type=float, default=1.0)
+    parser.add_argument('--output', default=None, help="append results as JSON lines")
+    args = parser.parse_args()
+
+    profile_dataloader(args.data, args.workers, args.cache, args.imgsz, args.batch,
+                       args.batches, args.fraction, args.split, args.output)
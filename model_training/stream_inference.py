@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Real-Time Stream Inference
+Runs the trained detector on a video file, camera or RTSP stream every N
+frames and carries boxes through the frames in between with a lightweight
+SORT-style tracker (constant-velocity Kalman filter + greedy IoU matching),
+so every frame gets per-object boxes with stable track ids.
+
+Reports end-to-end FPS and per-frame latency (frame read -> tracks out),
+split into detector and tracker time.
+
+Usage:
+    python stream_inference.py best.pt conveyor.mp4 --skip 1 2 4 8      # compare skip settings
+    python stream_inference.py best.pt 0 --skip 3 --show                # webcam, live view
+"""
+
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# ---------------------------------------------------------------------------
+# Tracking
+# ---------------------------------------------------------------------------
+
+def iou_matrix(a, b):
+    """Pairwise IoU of xyxy boxes: (N, 4) x (M, 4) -> (N, M)"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class KalmanBoxTracker:
+    """
+    One tracked object: Kalman filter over [cx, cy, area, aspect, vx, vy, v_area]
+
+    Aspect ratio is assumed constant, the rest move with constant velocity
+    (same model as SORT).
+    """
+
+    _F = np.eye(7)
+    _F[0, 4] = _F[1, 5] = _F[2, 6] = 1
+    _H = np.eye(4, 7)
+    _R = np.diag([1.0, 1.0, 10.0, 10.0])
+    _Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+
+    def __init__(self, box, conf, cls, track_id):
+        self.x = np.zeros(7)
+        self.x[:4] = self._to_z(box)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+        self.id = track_id
+        self.cls = int(cls)
+        self.conf = float(conf)
+        self.hits = 1
+        self.age = 0
+        self.since_update = 0
+
+    @staticmethod
+    def _to_z(box):
+        w, h = box[2] - box[0], box[3] - box[1]
+        return np.array([box[0] + w / 2, box[1] + h / 2, w * h, w / max(h, 1e-6)])
+
+    def box(self):
+        """Current xyxy estimate"""
+        cx, cy, s, r = self.x[:4]
+        w = np.sqrt(max(s * r, 0.0))
+        h = s / w if w > 0 else 0.0
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    def predict(self, steps=1):
+        """Advance steps frames with the constant-velocity model; returns the predicted xyxy box"""
+        for _ in range(steps):
+            # Keep the area from going negative when it is shrinking fast
+            if self.x[2] + self.x[6] <= 0:
+                self.x[6] = 0.0
+            self.x = self._F @ self.x
+            self.P = self._F @ self.P @ self._F.T + self._Q
+        self.age += steps
+        self.since_update += steps
+        return self.box()
+
+    def update(self, box, conf, cls):
+        y = self._to_z(box) - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(7) - K @ self._H) @ self.P
+        self.conf = float(conf)
+        self.cls = int(cls)
+        self.hits += 1
+        self.since_update = 0
+
+
+class Tracker:
+    """
+    Multi-object tracker fed with detections every few frames
+
+    Call step(detections) on frames where the detector ran and step(None) on
+    skipped frames; both advance every track by one frame (or by frames=n).
+
+    Args:
+        iou_threshold: Minimum IoU (same class) to match a detection to a track
+        max_distance: Fallback match when the centres are within this many box
+            diagonals (same class); catches fast objects at large skips
+        max_age: Frames a track survives without a matching detection
+        min_hits: Detections needed before a track is reported
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=1.0, max_age=30, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.tracks = []
+        self._next_id = 1
+
+    def _greedy(self, cost, max_cost, detections, matched_tracks, matched_dets):
+        """Match lowest-cost (track, detection) pairs first, up to max_cost"""
+        for flat in np.argsort(cost, axis=None):
+            ti, di = np.unravel_index(flat, cost.shape)
+            if cost[ti, di] > max_cost:
+                break
+            if ti in matched_tracks or di in matched_dets:
+                continue
+            self.tracks[ti].update(detections[di, :4], detections[di, 4], detections[di, 5])
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+
+    def step(self, detections=None, frames=1):
+        """
+        Advance one processed frame, optionally correcting with detections
+
+        Args:
+            detections: (n, 6) array [x1, y1, x2, y2, conf, cls] or None on skipped frames
+            frames: Source frames since the previous step (> 1 when a live reader
+                dropped frames), so motion and max_age follow the camera's frame rate
+
+        Returns:
+            (m, 7) array [x1, y1, x2, y2, conf, cls, track_id] of confirmed tracks
+        """
+        predicted = np.array([t.predict(frames) for t in self.tracks]).reshape(-1, 4)
+
+        if detections is not None:
+            matched_tracks, matched_dets = set(), set()
+            if len(self.tracks) and len(detections):
+                same_cls = np.array([t.cls for t in self.tracks])[:, None] == detections[None, :, 5]
+                # Pass 1: IoU with the predicted boxes
+                iou = np.where(same_cls, iou_matrix(predicted, detections[:, :4]), 0)
+                self._greedy(-iou, -self.iou_threshold, detections, matched_tracks, matched_dets)
+                # Pass 2: centre distance in box diagonals, for objects that moved past any
+                # overlap while the detector was skipped (new tracks have no velocity yet)
+                centre_t = (predicted[:, :2] + predicted[:, 2:]) / 2
+                centre_d = (detections[:, :2] + detections[:, 2:4]) / 2
+                diag = np.hypot(*(predicted[:, 2:] - predicted[:, :2]).T)[:, None] + 1e-9
+                dist = np.linalg.norm(centre_t[:, None] - centre_d[None], axis=2) / diag
+                self._greedy(np.where(same_cls, dist, np.inf), self.max_distance, detections,
+                             matched_tracks, matched_dets)
+            for di in range(len(detections)):
+                if di not in matched_dets:
+                    d = detections[di]
+                    self.tracks.append(KalmanBoxTracker(d[:4], d[4], d[5], self._next_id))
+                    self._next_id += 1
+
+        self.tracks = [t for t in self.tracks if t.since_update <= self.max_age]
+        out = [[*t.box(), t.conf, t.cls, t.id] for t in self.tracks if t.hits >= self.min_hits]
+        return np.array(out, np.float64).reshape(-1, 7)
+
+
+# ---------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------
+
+class LatestFrameReader:
+    """
+    Background capture for live sources that keeps only the newest frame
+
+    A live camera does not wait for the detector; without this, frames pile
+    up in the driver buffer and latency grows without bound.
+    """
+
+    def __init__(self, capture):
+        self.capture = capture
+        self._frame = None
+        self._stamp = 0.0
+        self._index = -1
+        self._cond = threading.Condition()
+        self._done = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        index = 0
+        while not self._done:
+            ok, frame = self.capture.read()
+            with self._cond:
+                if not ok:
+                    self._done = True
+                else:
+                    self._frame, self._stamp, self._index = frame, time.perf_counter(), index
+                    index += 1
+                self._cond.notify()
+
+    def read(self, last_index):
+        """Block until a frame newer than last_index arrives; returns (index, frame, capture time) or None"""
+        with self._cond:
+            while self._index <= last_index and not self._done:
+                self._cond.wait()
+            if self._index <= last_index:
+                return None
+            return self._index, self._frame, self._stamp
+
+    def stop(self):
+        self._done = True
+        self._thread.join(1.0)
+
+
+def _open_source(source):
+    """Camera index ('0'), file path or stream URL -> (capture, is_live)"""
+    if str(source).isdigit():
+        return cv2.VideoCapture(int(source)), True
+    live = str(source).startswith(('rtsp://', 'rtmp://', 'http://', 'https://'))
+    return cv2.VideoCapture(str(source)), live
+
+
+def stream_tracks(model, source, detect_every=1, conf=0.25, imgsz=640, device=None, tracker=None,
+                  max_frames=None, start_time=0.0):
+    """
+    Generator over (frame index, timestamp, frame, tracks, timings) for a video source
+
+    The detector runs on every detect_every-th processed frame; the tracker
+    predicts boxes for the frames in between. Live sources drop frames while
+    busy, so the skip counts frames actually processed, and the tracker is
+    advanced by the number of camera frames that elapsed. timestamp is start_time + video time in
+    seconds for files and wall-clock time for live sources. timings holds 'detect_ms',
+    'track_ms' and 'latency_ms' (frame captured -> tracks ready).
+    """
+    capture, live = _open_source(source)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video source {source}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    tracker = tracker or Tracker(max_age=max(30, 3 * detect_every))
+    reader = LatestFrameReader(capture) if live else None
+
+    index = -1
+    processed = 0
+    try:
+        while max_frames is None or index + 1 < max_frames:
+            previous = index
+            if reader is not None:
+                item = reader.read(index)
+                if item is None:
+                    break
+                index, frame, captured = item
+                timestamp = time.time()
+            else:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                index += 1
+                captured = time.perf_counter()
+                timestamp = start_time + index / fps
+
+            detect_ms = 0.0
+            detections = None
+            if processed % detect_every == 0:
+                t0 = time.perf_counter()
+                boxes = model.predict(frame, conf=conf, imgsz=imgsz, device=device, verbose=False)[0].boxes
+                detections = np.column_stack([boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(),
+                                              boxes.cls.cpu().numpy()]).reshape(-1, 6)
+                detect_ms = (time.perf_counter() - t0) * 1000
+
+            t1 = time.perf_counter()
+            tracks = tracker.step(detections, frames=index - previous if previous >= 0 else 1)
+            processed += 1
+            done = time.perf_counter()
+            yield index, timestamp, frame, tracks, {
+                'detect_ms': detect_ms,
+                'track_ms': (done - t1) * 1000,
+                'latency_ms': (done - captured) * 1000,
+            }
+    finally:
+        if reader is not None:
+            reader.stop()
+        capture.release()
+
+
+def draw_tracks(frame, tracks, names):
+    for x1, y1, x2, y2, conf, cls, track_id in tracks:
+        p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+        cv2.rectangle(frame, p1, p2, (0, 255, 0), 2)
+        cv2.putText(frame, f"#{int(track_id)} {names.get(int(cls), int(cls))} {conf:.2f}",
+                    (p1[0], max(p1[1] - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return frame
+
+
+def run_stream(weights, source, detect_every=1, conf=0.25, imgsz=640, device=None, max_frames=None,
+               show=False, output_video=None):
+    """
+    Run stream inference once and return throughput / latency statistics
+
+    Returns:
+        Dict with frames, fps, latency percentiles, mean detector/tracker ms and tracks seen
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    # Warm-up so model fusing / first-call allocation is not timed
+    model.predict(np.zeros((imgsz, imgsz, 3), np.uint8), imgsz=imgsz, device=device, verbose=False)
+
+    writer = None
+    latencies, detect_ms, track_ms = [], [], []
+    track_ids = set()
+    t0 = time.perf_counter()
+    for index, _, frame, tracks, timings in stream_tracks(model, source, detect_every, conf, imgsz,
+                                                          device, max_frames=max_frames):
+        latencies.append(timings['latency_ms'])
+        track_ms.append(timings['track_ms'])
+        if timings['detect_ms']:
+            detect_ms.append(timings['detect_ms'])
+        track_ids.update(int(t) for t in tracks[:, 6])
+
+        if show or output_video:
+            draw_tracks(frame, tracks, model.names)
+        if output_video:
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*'mp4v'), 30, (w, h))
+            writer.write(frame)
+        if show:
+            cv2.imshow('SWM stream', frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    seconds = time.perf_counter() - t0
+    if writer is not None:
+        writer.release()
+    if show:
+        cv2.destroyAllWindows()
+
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'detect_every': detect_every,
+        'frames': len(track_ms),
+        'fps': len(track_ms) / max(seconds, 1e-9),
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p95_ms': float(np.percentile(latencies, 95)),
+        'latency_max_ms': float(latencies.max()),
+        'detect_ms': float(np.mean(detect_ms)) if detect_ms else 0.0,
+        'track_ms': float(np.mean(track_ms)) if track_ms else 0.0,
+        'tracks': len(track_ids),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detector + tracker inference on a video or live stream")
+    parser.add_argument('weights', help="trained detector, e.g. DOWNLOAD_LARGE_best.pt")
+    parser.add_argument('source', help="video file, camera index or rtsp/http URL")
+    parser.add_argument('--skip', type=int, nargs='+', default=[1],
+                        help="run the detector every N frames; several values are benchmarked in turn")
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--show', action='store_true')
+    parser.add_argument('--output-video', default=None, help="write an annotated video (last skip setting)")
+    args = parser.parse_args()
+
+    print("="*78)
+    print("Stream Inference")
+    print("="*78)
+    print(f"Model: {args.weights}\nSource: {args.source}\n")
+    print(f"{'skip':>5} {'frames':>7} {'FPS':>7} {'lat p50':>8} {'lat p95':>8} {'lat max':>8} "
+          f"{'det ms':>7} {'trk ms':>7} {'tracks':>7}")
+    for i, skip in enumerate(args.skip):
+        last = i == len(args.skip) - 1
+        r = run_stream(args.weights, args.source, skip, args.conf, args.imgsz, args.device,
+                       args.max_frames, args.show and last, args.output_video if last else None)
+        print(f"{skip:>5} {r['frames']:>7} {r['fps']:>7.1f} {r['latency_p50_ms']:>8.1f} "
+              f"{r['latency_p95_ms']:>8.1f} {r['latency_max_ms']:>8.1f} {r['detect_ms']:>7.1f} "
+              f"{r['track_ms']:>7.2f} {r['tracks']:>7}")
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+SWM Training Entry Point
+Config-file driven YOLOv8 training with command-line overrides.
+
+- batch / workers / cache set to 'auto' are chosen from available GPU/RAM/
+  disk and the dataset size
+- resume: auto picks up the newest valid checkpoint (last.pt, then the
+  save_period epochN.pt files) instead of deleting it and starting fresh
+- no pip installs or hard-coded Kaggle paths; everything lives in the config,
+  relative to the config file, and a dataset with a dataset_manifest.tsv is
+  verified against it before training (codes/relocate.py)
+
+Usage:
+    python train.py --config swm_large.yaml --set train.epochs=50 --set dataset=/data/swm_final_split
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+import yaml
+
+DEFAULT_CONFIG = Path(__file__).resolve().parent / 'swm_large.yaml'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PATH_KEYS = ('dataset', 'data', 'output_dir')
+
+
+def load_config(config_path, overrides=()):
+    """
+    Load a YAML config and apply "dotted.key=value" overrides (values parsed as YAML)
+
+    Relative dataset/data/output_dir paths in the file are relative to the
+    config file's folder (Windows separators accepted); overridden values
+    are relative to the working directory.
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f) or {}
+    base = Path(config_path).resolve().parent
+    for key in PATH_KEYS:
+        if config.get(key):
+            config[key] = os.path.normpath(base / str(config[key]).replace('\\', '/'))
+    for override in overrides:
+        key, _, value = override.partition('=')
+        node = config
+        parts = key.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = yaml.safe_load(value)
+    config.setdefault('train', {})
+    return config
+
+
+def write_data_yaml(config):
+    """Return the data.yaml to train on, generating one from config['dataset'] if needed"""
+    if config.get('data'):
+        return str(config['data'])
+    output_dir = Path(config['output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    data_yaml = output_dir / 'data.yaml'
+    with open(data_yaml, 'w') as f:
+        yaml.dump({
+            'path': str(config['dataset']),
+            'train': 'train/images',
+            'val': 'val/images',
+            'test': 'test/images',
+            'nc': len(config['names']),
+            'names': config['names'],
+        }, f)
+    return str(data_yaml)
+
+
+def _train_images(data_yaml):
+    """List the training image paths referenced by a data.yaml (folder or file list)"""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = Path(data.get('path') or Path(data_yaml).parent)
+    entries = data['train'] if isinstance(data['train'], list) else [data['train']]
+    images = []
+    for entry in entries:
+        entry = Path(entry) if Path(entry).is_absolute() else root / entry
+        if entry.is_dir():
+            images.extend(p for p in entry.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+        elif entry.is_file():
+            with open(entry) as f:
+                lines = [line.strip() for line in f if line.strip()]
+            # './' entries are relative to the list file (relocatable lists)
+            images.extend(Path(os.path.normpath(entry.parent / line[2:])) if line.startswith('./') else Path(line)
+                          for line in lines)
+    return images
+
+
+def verify_dataset(config, data_yaml):
+    """
+    Check the training dataset against its dataset_manifest.tsv, if it has one
+
+    'quick' compares file sizes, 'full' re-hashes files (see codes/relocate.py);
+    catches an incomplete copy after moving the dataset before training on it.
+    """
+    mode = config.get('verify_dataset', 'quick')
+    root = Path(config['dataset']) if not config.get('data') else Path(data_yaml).parent
+    if not mode or not (root / 'dataset_manifest.tsv').exists():
+        return
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'codes'))
+    from relocate import is_valid, verify_dataset as verify
+
+    if not is_valid(verify(root, full=mode == 'full', extra=False)):
+        print(f"❌ {root} does not match its manifest (copy incomplete?); set verify_dataset=false to skip")
+        sys.exit(1)
+
+
+def precomputed_augmentation(train_cfg, data_yaml, settings):
+    """Zero the online augmentations a data.yaml says were already baked into its images"""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f) or {}
+    baked = [key for key in data.get('precomputed_augmentation') or {} if key not in train_cfg]
+    for key in baked:
+        settings[key] = 0.0
+    if baked:
+        print(f"Precomputed augmentation in dataset, online off: {', '.join(baked)}")
+    return settings
+
+
+def system_resources():
+    """Available RAM, per-GPU free memory and CPU count"""
+    import psutil
+    import torch
+
+    resources = {
+        'cpu_count': os.cpu_count() or 1,
+        'ram_available': psutil.virtual_memory().available,
+        'gpu_free': None,
+    }
+    if torch.cuda.is_available():
+        free, _ = torch.cuda.mem_get_info(0)
+        resources['gpu_free'] = free
+        resources['gpu_name'] = torch.cuda.get_device_name(0)
+    return resources
+
+
+def auto_settings(train_cfg, data_yaml, resources):
+    """
+    Resolve 'auto' values for batch, workers, cache and device
+
+    - device: GPU 0 when CUDA is available, else cpu
+    - batch: ultralytics AutoBatch (-1, sized to GPU memory) on GPU; on CPU
+      one image per 2 GB of free RAM, capped at 16
+    - workers: one per core up to 8, but no more than one per 2 GB free RAM
+      (each worker holds its own mosaic buffers)
+    - cache: 'ram' when the resized dataset fits in 40% of free RAM,
+      'disk' when it fits in half the free disk space, else off
+    """
+    settings = dict(train_cfg)
+    gb = 1024**3
+    on_gpu = resources['gpu_free'] is not None
+
+    if settings.get('device', 'auto') == 'auto':
+        settings['device'] = 0 if on_gpu else 'cpu'
+
+    if settings.get('batch', 'auto') == 'auto':
+        settings['batch'] = -1 if on_gpu else max(1, min(16, int(resources['ram_available'] // (2 * gb))))
+
+    if settings.get('workers', 'auto') == 'auto':
+        settings['workers'] = max(0, min(8, resources['cpu_count'], int(resources['ram_available'] // (2 * gb))))
+
+    if settings.get('cache', 'auto') == 'auto':
+        imgsz = settings.get('imgsz', 640)
+        n_images = len(_train_images(data_yaml))
+        # Cached images are resized so the long side is imgsz (assume 16:9 sources)
+        estimate = n_images * imgsz * int(imgsz * 9 / 16) * 3
+        disk_free = shutil.disk_usage(Path(data_yaml).resolve().parent).free
+        if estimate < 0.4 * resources['ram_available']:
+            settings['cache'] = 'ram'
+        elif estimate < 0.5 * disk_free:
+            settings['cache'] = 'disk'
+        else:
+            settings['cache'] = False
+        print(f"Dataset: {n_images} train images, ~{estimate / gb:.1f} GB when cached")
+
+    return settings
+
+
+def _checkpoint_epoch(path):
+    """Epoch stored in a checkpoint, -1 if training had finished, None if unreadable"""
+    import torch
+    try:
+        ckpt = torch.load(path, map_location='cpu', weights_only=False)
+    except Exception as e:
+        print(f"  ⚠ Unreadable checkpoint {path.name}: {e}")
+        return None
+    return ckpt.get('epoch', -1) if isinstance(ckpt, dict) else None
+
+
+def find_resume_checkpoint(run_dir):
+    """
+    Newest checkpoint in run_dir/weights that can be resumed from
+
+    last.pt is tried first, then epochN.pt files (save_period) newest first,
+    so one corrupted file falls back to the previous checkpoint instead of
+    discarding the run.
+
+    Returns:
+        (checkpoint path or None, finished) where finished means the run
+        already completed all epochs
+    """
+    weights = Path(run_dir) / 'weights'
+    if not weights.is_dir():
+        return None, False
+
+    def epoch_number(p):
+        match = re.search(r'epoch(\d+)', p.stem)
+        return int(match.group(1)) if match else -1
+
+    candidates = [weights / 'last.pt'] + sorted(weights.glob('epoch*.pt'), key=epoch_number, reverse=True)
+    for ckpt in candidates:
+        if not ckpt.exists():
+            continue
+        epoch = _checkpoint_epoch(ckpt)
+        if epoch is None:
+            continue
+        if epoch == -1:
+            print(f"  {ckpt.name}: training already finished")
+            return None, True
+        print(f"  Resuming from {ckpt.name} (epoch {epoch + 1})")
+        return ckpt, False
+    return None, False
+
+
+def run_dirs(output_dir, name):
+    """
+    output_dir/name and the numbered folders ultralytics created next to it, newest first
+
+    Older ultralytics releases number repeats name2, name3, ...; 8.4+ uses name-2, name-3, ...
+    """
+    pattern = re.compile(rf'{re.escape(name)}(-?\d+)?')
+    dirs = [d for d in Path(output_dir).glob('*') if d.is_dir() and pattern.fullmatch(d.name)]
+
+    def newest(d):
+        return max((p.stat().st_mtime for p in d.glob('weights/*.pt')), default=d.stat().st_mtime)
+    return sorted(dirs, key=newest, reverse=True)
+
+
+def find_resume_run(output_dir, name):
+    """
+    (run dir, checkpoint, finished) of the newest run of name with a checkpoint
+
+    All name* run folders are searched, so a run that continued in name2
+    (e.g. because name died before its first checkpoint) is resumed there
+    instead of starting name3. Falls back to (output_dir/name, None, False).
+    """
+    for run_dir in run_dirs(output_dir, name):
+        checkpoint, finished = find_resume_checkpoint(run_dir)
+        if checkpoint is not None or finished:
+            return run_dir, checkpoint, finished
+    return Path(output_dir) / name, None, False
+
+
+def train(config):
+    """Train (or resume), evaluate on the test split and export the weights"""
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        print("❌ ultralytics is not installed: pip install ultralytics opencv-python")
+        sys.exit(1)
+
+    output_dir = Path(config['output_dir'])
+    name = config['name']
+    run_dir = output_dir / name
+    data_yaml = write_data_yaml(config)
+    verify_dataset(config, data_yaml)
+
+    print("="*60)
+    print(" SWM TRAINING")
+    print("="*60)
+    resources = system_resources()
+    print(f"GPU: {resources.get('gpu_name', 'not available')}")
+    print(f"CPU cores: {resources['cpu_count']}, free RAM: {resources['ram_available'] / 1024**3:.1f} GB")
+
+    settings = auto_settings(config["train"], data_yaml, resources)
+    settings = precomputed_augmentation(config["train"], data_yaml, settings)
+    print(f"batch={settings['batch']} workers={settings['workers']} cache={settings['cache']} "
+          f"device={settings['device']}")
+
+    checkpoint, finished = None, False
+    if config.get('resume', 'auto') in ('auto', True):
+        run_dir, checkpoint, finished = find_resume_run(output_dir, name)
+        if checkpoint is None and not finished and config.get('resume') is True:
+            print("❌ resume=true but no resumable checkpoint found")
+            sys.exit(1)
+
+    if finished:
+        print("Nothing to train (set resume=false or a new name to start another run)")
+    elif checkpoint is not None:
+        # Ultralytics restores epochs/optimizer/etc. from the checkpoint's own train args
+        model = YOLO(str(checkpoint))
+        model.train(resume=True)
+    else:
+        print("Starting fresh training")
+        model = YOLO(config['model'])
+        # A run folder without checkpoints (died in its first epoch) is reused; one with
+        # checkpoints is kept and ultralytics appends a number to the name
+        reuse = not any((run_dir / 'weights').glob('*.pt'))
+        model.train(data=data_yaml, project=str(output_dir), name=name, exist_ok=reuse, **settings)
+        run_dir = Path(model.trainer.save_dir)
+
+    best = run_dir / 'weights' / 'best.pt'
+    evaluate = config.get('evaluate') or {}
+    if best.exists() and evaluate.get('split'):
+        metrics = YOLO(str(best)).val(data=data_yaml, split=evaluate['split'])
+        print(f"\n{'='*60}")
+        print(f" TRAINING COMPLETE!")
+        print(f"{'='*60}")
+        print(f"mAP@0.5: {metrics.box.map50:.3f} ({metrics.box.map50*100:.1f}%)")
+        print(f"mAP@0.5-95: {metrics.box.map:.3f} ({metrics.box.map*100:.1f}%)")
+        print(f"Precision: {metrics.box.mp:.3f} ({metrics.box.mp*100:.1f}%)")
+        print(f"Recall: {metrics.box.mr:.3f} ({metrics.box.mr*100:.1f}%)")
+        print(f"{'='*60}\n")
+
+        if evaluate.get('cache_predictions'):
+            from evaluate import cache_predictions
+            cache_predictions(str(best), data_yaml, evaluate['split'],
+                              str(output_dir / f"{evaluate['split']}_predictions.npz"),
+                              imgsz=settings.get('imgsz', 640), device=settings['device'])
+
+    prefix = config.get('export_prefix')
+    if prefix:
+        for weight in ('best', 'last'):
+            src = run_dir / 'weights' / f'{weight}.pt'
+            if src.exists():
+                shutil.copy(src, output_dir / f'{prefix}_{weight}.pt')
+                print(f" Saved: {prefix}_{weight}.pt")
+
+    return run_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the SWM plastic detector")
+    parser.add_argument('--config', default=str(DEFAULT_CONFIG))
+    parser.add_argument('--set', dest='overrides', action='append', default=[],
+                        help="override a config value, e.g. --set train.epochs=50")
+    args = parser.parse_args(argv)
+    return train(load_config(args.config, args.overrides))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+TrashNet Classification -> YOLO Detection Converter
+TrashNet has one object per photo, sorted into class folders
+(cardboard/ glass/ metal/ paper/ plastic/ trash/). Each image gets one box:
+
+  - whole:    the full image
+  - saliency: the largest region that stands out from the background colour
+              (estimated from the image border), since TrashNet objects are
+              shot on a plain board; falls back to the whole image when no
+              clear region is found
+
+Classes go through check_mappings.TN_MAP and then onto the 4-class scheme
+of merge_yolo_datasets (rigid_plastic, soft_plastic, cardboard, metal).
+TrashNet classes without a 4-class counterpart (glass, paper, trash) are
+skipped, or kept as negatives with unmapped='negative'.
+
+Output is a <split>/images + labels dataset with a provenance.db, ready to be
+passed to merge_yolo_datasets as a third source. Images are processed in a
+process pool, written atomically and journaled, so a re-run resumes.
+"""
+
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'codes'))
+from check_mappings import TARGET_NAMES, TN_MAP
+from checkpoint import ProgressJournal
+from pipeline_metrics import PipelineMetrics, get_metrics
+from provenance import ProvenanceTable
+from split_dataset import TRAIN_RATIO, VAL_RATIO
+
+TRASHNET_CLASSES = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
+CLASS_NAMES = ['rigid_plastic', 'soft_plastic', 'cardboard', 'metal']
+# check_mappings target id -> 4-class id (GLASS and PAPER have no counterpart)
+TARGET_TO_4_CLASSES = {0: 0, 1: 1, 4: 2, 3: 3}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+BOX_MODES = ('whole', 'saliency')
+
+
+def trashnet_class_to_yolo(trashnet_id):
+    """TrashNet folder class id -> 4-class id, or None when it has no counterpart"""
+    return TARGET_TO_4_CLASSES.get(TN_MAP.get(trashnet_id, -1))
+
+
+def saliency_box(image, min_area=0.02, margin=0.02):
+    """
+    Normalized (x_center, y_center, w, h) of the main object, or None
+
+    The background colour is the median of the image border in Lab; pixels
+    far from it (Otsu threshold on the distance) form the foreground, and the
+    largest connected region after a morphological clean-up is the object.
+    """
+    h, w = image.shape[:2]
+    scale = 256 / max(h, w)
+    small = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1 else image
+    lab = cv2.cvtColor(small, cv2.COLOR_BGR2LAB).astype(np.float32)
+    border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+    distance = np.linalg.norm(lab - np.median(border, axis=0), axis=2)
+    distance = cv2.normalize(distance, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    _, mask = cv2.threshold(distance, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask = cv2.morphologyEx(cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel), cv2.MORPH_CLOSE, kernel)
+
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    if n < 2:
+        return None
+    x, y, bw, bh, area = stats[1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])]
+    sh, sw = mask.shape
+    if area < min_area * sh * sw:
+        return None
+    x1, y1 = max(x / sw - margin, 0.0), max(y / sh - margin, 0.0)
+    x2, y2 = min((x + bw) / sw + margin, 1.0), min((y + bh) / sh + margin, 1.0)
+    return (x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1
+
+
+def convert_image(src_image, name, class_id, box_mode, images_dest_dir, labels_dest_dir):
+    """
+    Copy one TrashNet image and write its single-box label (process pool worker)
+
+    Returns:
+        Dict of per-image counters (with worker timings under 'metrics'),
+        or None if the image cannot be read
+    """
+    metrics = PipelineMetrics('convert_trashnet.worker')
+    counts = {'saliency_fallback': 0}
+    lines = []
+    if class_id is not None:
+        box = None
+        if box_mode == 'saliency':
+            with metrics.stage('image_decode'):
+                image = cv2.imread(src_image)
+            if image is None:
+                return None
+            with metrics.stage('box_estimate'):
+                box = saliency_box(image)
+            counts['saliency_fallback'] = int(box is None)
+        if box is None:
+            box = (0.5, 0.5, 1.0, 1.0)
+        lines.append(f"{class_id} {box[0]:.6f} {box[1]:.6f} {box[2]:.6f} {box[3]:.6f}\n")
+
+    metrics.copy_file(src_image, os.path.join(images_dest_dir, name))
+    metrics.write_text(os.path.join(labels_dest_dir, os.path.splitext(name)[0] + '.txt'), ''.join(lines))
+    counts['metrics'] = metrics.as_dict()
+    return counts
+
+
+def _convert_image_task(args):
+    return args[1], convert_image(*args)
+
+
+def find_images(input_dir):
+    """(class folder, path) for every image in the TrashNet class folders, at any depth"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(input_dir):
+        dirnames.sort()
+        folder = os.path.basename(dirpath).lower()
+        if folder not in TRASHNET_CLASSES:
+            continue
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                found.append((folder, os.path.join(dirpath, name)))
+    return found
+
+
+def assign_split(key, seed=0):
+    """Stable split from a hash of the image's class/file name"""
+    u = int.from_bytes(hashlib.md5(f"{seed}:{key}".encode()).digest()[:8], 'big') / 2**64
+    if u < TRAIN_RATIO:
+        return 'train'
+    return 'val' if u < TRAIN_RATIO + VAL_RATIO else 'test'
+
+
+def convert_trashnet(input_dir, output_dir='trashnet_yolo', box_mode='saliency', unmapped='skip',
+                     workers=None, seed=0):
+    """
+    Convert TrashNet class folders into a 4-class YOLO detection dataset
+
+    Args:
+        input_dir: TrashNet root (e.g. trashnet/ or trashnet/dataset-resized/)
+        output_dir: Output YOLO dataset (<split>/images + labels, provenance.db)
+        box_mode: 'whole' or 'saliency'
+        unmapped: 'skip' or 'negative' for classes without a 4-class counterpart
+        workers: Number of worker processes (default: CPU count)
+        seed: Changes the train/val/test assignment
+    """
+    if box_mode not in BOX_MODES:
+        raise ValueError(f"Unknown box mode {box_mode!r}, expected one of {BOX_MODES}")
+    metrics = get_metrics('convert_trashnet').start(
+        input=os.path.abspath(input_dir), box_mode=box_mode, unmapped=unmapped,
+        workers=workers or os.cpu_count())
+
+    print("="*70)
+    print("TrashNet to YOLO Converter")
+    print("="*70)
+    print("\nClass mapping (TrashNet -> check_mappings -> YOLO):")
+    for tn_id, tn_name in enumerate(TRASHNET_CLASSES):
+        target = TN_MAP.get(tn_id, -1)
+        yolo_id = trashnet_class_to_yolo(tn_id)
+        print(f"  {tn_name:<10} -> {TARGET_NAMES.get(target, 'dropped'):<14} -> "
+              f"{CLASS_NAMES[yolo_id] if yolo_id is not None else unmapped}")
+    print(f"Boxes: {box_mode}\n")
+
+    with metrics.stage('file_discovery'):
+        images = find_images(input_dir)
+    if not images:
+        raise FileNotFoundError(f"No TrashNet class folders ({', '.join(TRASHNET_CLASSES)}) under {input_dir}")
+
+    for split in ['train', 'val', 'test']:
+        os.makedirs(os.path.join(output_dir, split, 'images'), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, split, 'labels'), exist_ok=True)
+
+    with ProgressJournal(output_dir, 'convert_trashnet') as journal:
+        if journal.resumed:
+            print(f"↻ Resuming: {len(journal)} images already converted "
+                  f"({journal.stale_temp_files} partial files cleaned up)")
+        provenance = ProvenanceTable(output_dir)
+
+        tasks, rows = [], []
+        names = set()
+        skipped = 0
+        for folder, path in images:
+            tn_id = TRASHNET_CLASSES.index(folder)
+            class_id = trashnet_class_to_yolo(tn_id)
+            if class_id is None and unmapped == 'skip':
+                skipped += 1
+                continue
+            name = os.path.basename(path)
+            if name in names:
+                name = f"{folder}_{name}"
+            names.add(name)
+            split = assign_split(f"{folder}/{os.path.basename(path)}", seed)
+            rows.append((name, split, f"{folder}/{os.path.basename(path)}", tn_id, class_id))
+            if f"{split}/{name}" not in journal:
+                tasks.append((path, name, class_id, box_mode, os.path.join(output_dir, split, 'images'),
+                              os.path.join(output_dir, split, 'labels')))
+        if len(tasks) < len(rows):
+            print(f"  Skipping {len(rows) - len(tasks)} images converted by a previous run")
+
+        print(f"Converting {len(tasks)} images ({skipped} unmapped skipped)...")
+        failed = set()
+        fallbacks = 0
+        split_of = {name: split for name, split, _, _, _ in rows}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+            for done, (name, counts) in enumerate(pool.map(_convert_image_task, tasks, chunksize=chunksize), 1):
+                if counts is None:
+                    print(f"  ⚠ Unreadable image: {name}")
+                    metrics.count('unreadable_images')
+                    failed.add(name)
+                    continue
+                journal.mark(f"{split_of[name]}/{name}")
+                metrics.merge(counts['metrics'])
+                fallbacks += counts['saliency_fallback']
+                if done % 500 == 0:
+                    print(f"  Processed {done} images...")
+
+        # Every converted image (including resumed ones) gets a provenance row
+        per_split = {'train': 0, 'val': 0, 'test': 0}
+        per_class = [0] * len(CLASS_NAMES)
+        for name, split, original_name, tn_id, class_id in rows:
+            if name in failed:
+                continue
+            provenance.add(name, 'trashnet', None, original_name, [tn_id] if class_id is not None else [])
+            per_split[split] += 1
+            if class_id is not None:
+                per_class[class_id] += 1
+        provenance.close()
+        metrics.count('images', sum(per_split.values()))
+        metrics.count('saliency_fallback', fallbacks)
+
+        yaml_path = os.path.join(output_dir, 'data.yaml')
+        with open(yaml_path, 'w') as f:
+            f.write("# YOLO Dataset Configuration (TrashNet, generated boxes)\n\n")
+            f.write("train: train/images\n")
+            f.write("val: val/images\n")
+            f.write("test: test/images\n\n")
+            f.write("# Classes\n")
+            f.write(f"nc: {len(CLASS_NAMES)}\n")
+            f.write("names:\n")
+            for idx, class_name in enumerate(CLASS_NAMES):
+                f.write(f"  {idx}: {class_name}\n")
+        with open(os.path.join(output_dir, 'classes.txt'), 'w') as f:
+            for class_name in CLASS_NAMES:
+                f.write(f"{class_name}\n")
+
+        print(f"\n{'='*70}")
+        print("✓ CONVERSION COMPLETE!")
+        print('='*70)
+        print(f"Output: {os.path.abspath(output_dir)}")
+        print("Images: " + ', '.join(f"{split} {n}" for split, n in per_split.items()))
+        print("Boxes:  " + ', '.join(f"{CLASS_NAMES[i]} {n}" for i, n in enumerate(per_class)))
+        if box_mode == 'saliency':
+            print(f"Whole-image fallbacks: {fallbacks}")
+        print(f"\nMerge with: merge_yolo_datasets([...,'{output_dir}'], ..., [..., 'trashnet'])")
+        print('='*70)
+
+    metrics.finish()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert TrashNet class folders to YOLO detection labels")
+    parser.add_argument('input', nargs='?', default='.', help="TrashNet root with the class folders")
+    parser.add_argument('output', nargs='?', default='trashnet_yolo')
+    parser.add_argument('--boxes', choices=BOX_MODES, default='saliency')
+    parser.add_argument('--unmapped', choices=['skip', 'negative'], default='skip',
+                        help="glass/paper/trash images: drop them or keep them as negatives")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    convert_trashnet(args.input, args.output, args.boxes, args.unmapped, args.workers, args.seed)
@@ -9,12 +9,17 @@ Remaps WaRP dataset to match your 4-class scheme:
 """
 
 import os
-import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'codes'))
+from checkpoint import ProgressJournal
+from pipeline_metrics import get_metrics
 
 def remap_warp_to_4_classes(input_base_dir, output_base_dir='warp_remapped'):
     """
     Remap WaRP dataset (28 classes) to 4 classes
     """
+    metrics = get_metrics('remap').start(input=os.path.abspath(input_base_dir))
 
     # Target classes in your specified order
     target_classes = ['rigid_plastic', 'soft_plastic', 'cardboard', 'metal']
@@ -87,148 +92,168 @@ def remap_warp_to_4_classes(input_base_dir, output_base_dir='warp_remapped'):
     total_files_processed = 0
     total_annotations_remapped = 0
 
-    for split in splits:
-        print(f"{'='*70}")
-        print(f"Processing {split.upper()} split...")
-        print('='*70)
-
-        # Paths
-        labels_src_dir = os.path.join(input_base_dir, split, 'labels')
-        images_src_dir = os.path.join(input_base_dir, split, 'images')
-
-        labels_dest_dir = os.path.join(output_base_dir, split, 'labels')
-        images_dest_dir = os.path.join(output_base_dir, split, 'images')
-
-        # Check if source exists
-        if not os.path.exists(labels_src_dir):
-            print(f"⚠ Warning: {labels_src_dir} not found. Skipping {split}.")
-            continue
-
-        # Create output directories
-        os.makedirs(labels_dest_dir, exist_ok=True)
-        os.makedirs(images_dest_dir, exist_ok=True)
-
-        # Get all label files
-        label_files = [f for f in os.listdir(labels_src_dir) if f.endswith('.txt')]
-        print(f"Found {len(label_files)} label files\n")
-
-        files_processed = 0
-        annotations_in_split = 0
-
-        for label_file in label_files:
-            src_label_path = os.path.join(labels_src_dir, label_file)
-            dest_label_path = os.path.join(labels_dest_dir, label_file)
-
-            # Read and remap labels
-            with open(src_label_path, 'r') as f:
-                lines = f.readlines()
-
-            remapped_lines = []
-            for line in lines:
-                line = line.strip()
-                if not line:
+    # Finished files are journaled so a re-run after a crash only does the rest
+    with ProgressJournal(output_base_dir, 'remap') as journal:
+        if journal.resumed:
+            print(f"↻ Resuming: {len(journal)} files already remapped "
+                  f"({journal.stale_temp_files} partial files cleaned up)\n")
+
+        for split in splits:
+            print(f"{'='*70}")
+            print(f"Processing {split.upper()} split...")
+            print('='*70)
+
+            # Paths
+            labels_src_dir = os.path.join(input_base_dir, split, 'labels')
+            images_src_dir = os.path.join(input_base_dir, split, 'images')
+
+            labels_dest_dir = os.path.join(output_base_dir, split, 'labels')
+            images_dest_dir = os.path.join(output_base_dir, split, 'images')
+
+            # Check if source exists
+            if not os.path.exists(labels_src_dir):
+                print(f"⚠ Warning: {labels_src_dir} not found. Skipping {split}.")
+                continue
+
+            # Create output directories
+            os.makedirs(labels_dest_dir, exist_ok=True)
+            os.makedirs(images_dest_dir, exist_ok=True)
+
+            # Get all label files
+            with metrics.stage('file_discovery'):
+                label_files = [f for f in os.listdir(labels_src_dir) if f.endswith('.txt')]
+            print(f"Found {len(label_files)} label files\n")
+
+            files_processed = 0
+            annotations_in_split = 0
+
+            for label_file in label_files:
+                journal_key = f"{split}/{label_file}"
+                if journal_key in journal:
+                    files_processed += 1
+                    annotations_in_split += int(journal.get(journal_key) or 0)
                     continue
 
-                parts = line.split()
-                if len(parts) < 5:  # At least class_id + 4 coordinates
-                    continue
+                src_label_path = os.path.join(labels_src_dir, label_file)
+                dest_label_path = os.path.join(labels_dest_dir, label_file)
+                annotations_before = annotations_in_split
+
+                # Read and remap labels
+                with metrics.stage('label_transform'):
+                    with open(src_label_path, 'r') as f:
+                        lines = f.readlines()
+
+                    remapped_lines = []
+                    for line in lines:
+                        line = line.strip()
+                        if not line:
+                            continue
+
+                        parts = line.split()
+                        if len(parts) < 5:  # At least class_id + 4 coordinates
+                            continue
+
+                        old_class_id = int(parts[0])
+
+                        # Remap class ID
+                        new_class_id = warp_to_target.get(old_class_id, 0)  # Default to rigid_plastic
+
+                        # Keep all coordinates unchanged
+                        coords = ' '.join(parts[1:])
+                        remapped_lines.append(f"{new_class_id} {coords}\n")
+                        annotations_in_split += 1
+
+                # Write remapped labels
+                metrics.write_text(dest_label_path, ''.join(remapped_lines))
+
+                # Copy corresponding image
+                image_file = label_file.replace('.txt', '.jpg')
+
+                # Try different image extensions
+                with metrics.stage('file_discovery'):
+                    if not os.path.exists(os.path.join(images_src_dir, image_file)):
+                        for ext in ['.png', '.PNG', '.JPG', '.jpeg', '.JPEG']:
+                            alt_image = label_file.replace('.txt', ext)
+                            if os.path.exists(os.path.join(images_src_dir, alt_image)):
+                                image_file = alt_image
+                                break
+
+                src_image_path = os.path.join(images_src_dir, image_file)
+                dest_image_path = os.path.join(images_dest_dir, image_file)
+
+                if os.path.exists(src_image_path):
+                    metrics.copy_file(src_image_path, dest_image_path)
+                else:
+                    print(f"  ⚠ Image not found: {image_file}")
+                    metrics.count('missing_images')
+
+                journal.mark(journal_key, annotations_in_split - annotations_before)
+                files_processed += 1
+                if files_processed % 500 == 0:
+                    print(f"  Processed {files_processed} files...")
+
+            total_files_processed += files_processed
+            total_annotations_remapped += annotations_in_split
+            metrics.count('label_files', files_processed)
+            metrics.count('annotations', annotations_in_split)
+
+            print(f"\n✓ {split.upper()} complete:")
+            print(f"  - Files: {files_processed}")
+            print(f"  - Annotations remapped: {annotations_in_split}\n")
+
+        # Create new data.yaml
+        yaml_path = os.path.join(output_base_dir, 'data.yaml')
+        with open(yaml_path, 'w') as f:
+            f.write("# WaRP Dataset Remapped to 4 Classes\n")
+            f.write("# Original: 28 classes -> New: 4 classes\n")
+            f.write("# Classes: rigid_plastic, soft_plastic, cardboard, metal\n\n")
+            f.write("train: train/images\n")
+            f.write("test: test/images\n\n")
+            f.write("# Classes\n")
+            f.write(f"nc: {len(target_classes)}\n")
+            f.write("names:\n")
+            for idx, class_name in enumerate(target_classes):
+                f.write(f"  {idx}: {class_name}\n")
+
+        # Create classes.txt
+        classes_path = os.path.join(output_base_dir, 'classes.txt')
+        with open(classes_path, 'w') as f:
+            for class_name in target_classes:
+                f.write(f"{class_name}\n")
+
+        # Create detailed mapping reference
+        mapping_path = os.path.join(output_base_dir, 'class_mapping_reference.txt')
+        with open(mapping_path, 'w') as f:
+            f.write("WaRP Dataset Class Remapping Reference\n")
+            f.write("="*70 + "\n\n")
+            f.write("Original WaRP (28 classes) -> New (4 classes)\n\n")
+
+            for target_id, target_name in enumerate(target_classes):
+                f.write(f"\n{target_id}: {target_name.upper()}\n")
+                f.write("-" * 40 + "\n")
+                for old_id, new_id in sorted(warp_to_target.items()):
+                    if new_id == target_id:
+                        f.write(f"  WaRP class {old_id:2d}: {warp_class_names[old_id]}\n")
+
+        print(f"{'='*70}")
+        print("✓ REMAPPING COMPLETE!")
+        print('='*70)
+        print(f"\nOutput directory: {os.path.abspath(output_base_dir)}")
+        print(f"Total files processed: {total_files_processed}")
+        print(f"Total annotations remapped: {total_annotations_remapped}")
+        print("\nGenerated files:")
+        print("  ✓ data.yaml (4-class configuration)")
+        print("  ✓ classes.txt (4 classes in order)")
+        print("  ✓ class_mapping_reference.txt (detailed mapping)")
+        print("  ✓ train/images/ and train/labels/")
+        print("  ✓ test/images/ and test/labels/")
+        print('='*70)
+        print("\nYour 4 classes are:")
+        for idx, cls in enumerate(target_classes):
+            print(f"  {idx}: {cls}")
+        print()
 
-                old_class_id = int(parts[0])
-
-                # Remap class ID
-                new_class_id = warp_to_target.get(old_class_id, 0)  # Default to rigid_plastic
-
-                # Keep all coordinates unchanged
-                coords = ' '.join(parts[1:])
-                remapped_lines.append(f"{new_class_id} {coords}\n")
-                annotations_in_split += 1
-
-            # Write remapped labels
-            with open(dest_label_path, 'w') as f:
-                f.writelines(remapped_lines)
-
-            # Copy corresponding image
-            image_file = label_file.replace('.txt', '.jpg')
-
-            # Try different image extensions
-            if not os.path.exists(os.path.join(images_src_dir, image_file)):
-                for ext in ['.png', '.PNG', '.JPG', '.jpeg', '.JPEG']:
-                    alt_image = label_file.replace('.txt', ext)
-                    if os.path.exists(os.path.join(images_src_dir, alt_image)):
-                        image_file = alt_image
-                        break
-
-            src_image_path = os.path.join(images_src_dir, image_file)
-            dest_image_path = os.path.join(images_dest_dir, image_file)
-
-            if os.path.exists(src_image_path):
-                shutil.copy2(src_image_path, dest_image_path)
-            else:
-                print(f"  ⚠ Image not found: {image_file}")
-
-            files_processed += 1
-            if files_processed % 500 == 0:
-                print(f"  Processed {files_processed} files...")
-
-        total_files_processed += files_processed
-        total_annotations_remapped += annotations_in_split
-
-        print(f"\n✓ {split.upper()} complete:")
-        print(f"  - Files: {files_processed}")
-        print(f"  - Annotations remapped: {annotations_in_split}\n")
-
-    # Create new data.yaml
-    yaml_path = os.path.join(output_base_dir, 'data.yaml')
-    with open(yaml_path, 'w') as f:
-        f.write("# WaRP Dataset Remapped to 4 Classes\n")
-        f.write("# Original: 28 classes -> New: 4 classes\n")
-        f.write("# Classes: rigid_plastic, soft_plastic, cardboard, metal\n\n")
-        f.write(f"path: {os.path.abspath(output_base_dir)}\n")
-        f.write("train: train/images\n")
-        f.write("test: test/images\n\n")
-        f.write("# Classes\n")
-        f.write(f"nc: {len(target_classes)}\n")
-        f.write("names:\n")
-        for idx, class_name in enumerate(target_classes):
-            f.write(f"  {idx}: {class_name}\n")
-
-    # Create classes.txt
-    classes_path = os.path.join(output_base_dir, 'classes.txt')
-    with open(classes_path, 'w') as f:
-        for class_name in target_classes:
-            f.write(f"{class_name}\n")
-
-    # Create detailed mapping reference
-    mapping_path = os.path.join(output_base_dir, 'class_mapping_reference.txt')
-    with open(mapping_path, 'w') as f:
-        f.write("WaRP Dataset Class Remapping Reference\n")
-        f.write("="*70 + "\n\n")
-        f.write("Original WaRP (28 classes) -> New (4 classes)\n\n")
-
-        for target_id, target_name in enumerate(target_classes):
-            f.write(f"\n{target_id}: {target_name.upper()}\n")
-            f.write("-" * 40 + "\n")
-            for old_id, new_id in sorted(warp_to_target.items()):
-                if new_id == target_id:
-                    f.write(f"  WaRP class {old_id:2d}: {warp_class_names[old_id]}\n")
-
-    print(f"{'='*70}")
-    print("✓ REMAPPING COMPLETE!")
-    print('='*70)
-    print(f"\nOutput directory: {os.path.abspath(output_base_dir)}")
-    print(f"Total files processed: {total_files_processed}")
-    print(f"Total annotations remapped: {total_annotations_remapped}")
-    print("\nGenerated files:")
-    print("  ✓ data.yaml (4-class configuration)")
-    print("  ✓ classes.txt (4 classes in order)")
-    print("  ✓ class_mapping_reference.txt (detailed mapping)")
-    print("  ✓ train/images/ and train/labels/")
-    print("  ✓ test/images/ and test/labels/")
-    print('='*70)
-    print("\nYour 4 classes are:")
-    for idx, cls in enumerate(target_classes):
-        print(f"  {idx}: {cls}")
-    print()
+    metrics.finish()
 
     return output_base_dir
 
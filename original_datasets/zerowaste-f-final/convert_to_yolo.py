@@ -1,11 +1,230 @@
 import json
 import os
-import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def create_yolo_dataset(input_base_dir, output_base_dir='yolo_dataset'):
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'codes'))
+from checkpoint import ProgressJournal
+from memory_budget import ReusableBuffer, install_budget, make_budget, worker_budget
+from pipeline_metrics import PipelineMetrics, get_metrics
+
+# Decoded RLE masks are kept in one scratch buffer per worker process; it is
+# released again after a mask larger than this
+KEEP_BUFFER_BYTES = 64 * 1024**2
+_MASK_BUFFER = ReusableBuffer(np.uint8)
+
+
+def rle_counts_from_string(counts):
+    """
+    Decode a compressed COCO RLE string into a list of run lengths
+    (same LEB128-style scheme as pycocotools' rleFrString)
+    """
+    runs = []
+    pos = 0
+    while pos < len(counts):
+        value = 0
+        shift = 0
+        more = True
+        while more:
+            c = ord(counts[pos]) - 48
+            value |= (c & 0x1f) << (5 * shift)
+            more = c & 0x20
+            pos += 1
+            shift += 1
+            if not more and (c & 0x10):
+                value |= -1 << (5 * shift)
+        if len(runs) > 2:
+            value += runs[-2]
+        runs.append(value)
+    return runs
+
+
+def rle_to_segments(rle, buffer=None):
+    """
+    Outer contours of a COCO RLE mask ({'size': [h, w], 'counts': ...}) as
+    flat [x1, y1, x2, y2, ...] lists, decoded in bounded memory
+
+    COCO RLE is column-major, so only the columns spanned by foreground runs
+    are materialized, into a reused buffer, and contours are traced on that
+    column-major block directly (x/y swapped back afterwards): no full-frame
+    mask and no transposed copy. The block size is reserved from the worker's
+    memory budget while it is in use.
+    """
+    height, width = rle['size']
+    counts = rle['counts']
+    if isinstance(counts, bytes):
+        counts = counts.decode('ascii')
+    if isinstance(counts, str):
+        counts = rle_counts_from_string(counts)
+
+    # Runs alternate background/foreground, starting with background
+    ends = np.minimum(np.cumsum(counts, dtype=np.int64), height * width)
+    starts = np.concatenate([[0], ends[:-1]])
+    fg_starts, fg_ends = starts[1::2], ends[1::2]
+    keep = fg_ends > fg_starts
+    fg_starts, fg_ends = fg_starts[keep], fg_ends[keep]
+    if not len(fg_starts):
+        return []
+
+    x0 = int(fg_starts[0] // height)
+    x1 = int((fg_ends[-1] - 1) // height) + 1
+    buffer = buffer if buffer is not None else _MASK_BUFFER
+    with worker_budget().reserve((x1 - x0) * height):
+        block = buffer.get((x1 - x0, height))  # rows are image columns
+        flat = block.reshape(-1)
+        base = x0 * height
+        for start, end in zip((fg_starts - base).tolist(), (fg_ends - base).tolist()):
+            flat[start:end] = 1
+        contours, _ = cv2.findContours(block, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    buffer.trim(KEEP_BUFFER_BYTES)
+    return [(c.reshape(-1, 2)[:, ::-1] + [x0, 0]).reshape(-1).astype(np.float64)
+            for c in contours if len(c) >= 3]
+
+
+def merge_multi_segment(segments):
+    """
+    Merge a multi-part polygon into a single polygon
+
+    Consecutive parts are joined at their closest pair of vertices and the
+    outline is walked forward then back, so every part is kept in one YOLO line
+    (same approach as ultralytics' merge_multi_segment).
+
+    Args:
+        segments: List of flat [x1, y1, x2, y2, ...] coordinate lists
+
+    Returns:
+        (N, 2) float array of merged polygon vertices
+    """
+    segments = [np.asarray(s, dtype=np.float64).reshape(-1, 2) for s in segments]
+    if len(segments) == 1:
+        return segments[0]
+
+    # Closest vertex pair between each consecutive pair of parts
+    idx_list = [[] for _ in range(len(segments))]
+    for i in range(1, len(segments)):
+        dist = ((segments[i - 1][:, None, :] - segments[i][None, :, :]) ** 2).sum(-1)
+        a, b = np.unravel_index(np.argmin(dist), dist.shape)
+        idx_list[i - 1].append(a)
+        idx_list[i].append(b)
+
+    merged = []
+    for k in range(2):
+        if k == 0:
+            # Forward pass: rotate each part to start at its first link vertex
+            for i, idx in enumerate(idx_list):
+                if len(idx) == 2 and idx[0] > idx[1]:
+                    idx = idx[::-1]
+                    segments[i] = segments[i][::-1, :]
+                segments[i] = np.roll(segments[i], -idx[0], axis=0)
+                segments[i] = np.concatenate([segments[i], segments[i][:1]])
+                if i in (0, len(idx_list) - 1):
+                    merged.append(segments[i])
+                else:
+                    idx = [0, idx[1] - idx[0]]
+                    merged.append(segments[i][idx[0]:idx[1] + 1])
+        else:
+            # Backward pass: close the outline through the remaining vertices
+            for i in range(len(idx_list) - 1, -1, -1):
+                if i not in (0, len(idx_list) - 1):
+                    idx = idx_list[i]
+                    nidx = abs(idx[1] - idx[0])
+                    merged.append(segments[i][nidx:])
+    return np.concatenate(merged)
+
+
+def annotation_to_polygon(ann):
+    """
+    Convert one COCO annotation's segmentation to a single (N, 2) pixel polygon
+
+    Returns:
+        (polygon or None, kind) where kind is 'polygon', 'multi_polygon' or 'rle'
+    """
+    segmentation = ann.get('segmentation')
+    if not segmentation:
+        return None, 'empty'
+
+    if isinstance(segmentation, dict):
+        parts = rle_to_segments(segmentation)
+        kind = 'rle'
+    else:
+        parts = [s for s in segmentation if len(s) >= 6]
+        kind = 'multi_polygon' if len(parts) > 1 else 'polygon'
+
+    if not parts:
+        return None, kind
+    return merge_multi_segment(parts), kind
+
+
+def convert_image(img, annotations, category_to_yolo, images_src_dir, images_dest_dir, labels_dest_dir):
+    """
+    Copy one image and write its YOLO segmentation label (process pool worker)
+
+    Returns:
+        Dict of per-image counters (with worker timings under 'metrics'),
+        or None if the source image is missing
+    """
+    metrics = PipelineMetrics('convert_to_yolo.worker')
+    img_filename = img['file_name']
+    img_size = np.array([img['width'], img['height']], dtype=np.float64)
+
+    src_image = os.path.join(images_src_dir, img_filename)
+    if not os.path.exists(src_image):
+        return None
+    metrics.copy_file(src_image, os.path.join(images_dest_dir, img_filename))
+
+    counts = {'annotations': 0, 'multi_polygon': 0, 'rle': 0}
+    lines = []
+    with metrics.stage('label_transform'):
+        for ann in annotations:
+            class_id = category_to_yolo.get(ann['category_id'])
+            if class_id is None:
+                continue
+
+            polygon, kind = annotation_to_polygon(ann)
+            if polygon is None:
+                continue
+
+            # Normalize coordinates
+            normalized = np.clip(polygon / img_size, 0.0, 1.0).reshape(-1)
+            lines.append(f"{class_id} " + " ".join(f"{coord:.6f}" for coord in normalized))
+            counts['annotations'] += 1
+            if kind in counts:
+                counts[kind] += 1
+
+    label_filename = os.path.splitext(img_filename)[0] + '.txt'
+    metrics.write_text(os.path.join(labels_dest_dir, label_filename),
+                       ''.join(line + '\n' for line in lines))
+
+    counts['metrics'] = metrics.as_dict()
+    return counts
+
+
+def _convert_image_task(args):
+    return args[0]['file_name'], convert_image(*args)
+
+
+def create_yolo_dataset(input_base_dir, output_base_dir='yolo_dataset', workers=None, memory_mb=None):
     """
     Convert COCO format to YOLO format for all splits
+
+    Multi-part polygons are merged into one outline and RLE masks are decoded
+    into polygons, so no annotation parts are dropped. Outputs are written
+    atomically and journaled, so re-running after a crash resumes where the
+    previous run stopped.
+
+    Args:
+        input_base_dir: Folder containing <split>/labels.json and <split>/data/
+        output_base_dir: Output directory for the YOLO dataset
+        workers: Number of worker processes (default: CPU count)
+        memory_mb: Budget shared by all workers for decoded RLE masks
+            (default: unlimited); a worker waits when the others hold it
     """
+    metrics = get_metrics('convert_to_yolo').start(
+        input=os.path.abspath(input_base_dir), workers=workers or os.cpu_count(), memory_mb=memory_mb)
+    budget = make_budget(memory_mb)
     
     class_names = ['rigid_plastic', 'soft_plastic', 'cardboard', 'metal']
     
@@ -27,130 +246,136 @@ def create_yolo_dataset(input_base_dir, output_base_dir='yolo_dataset'):
     
     splits = ['train', 'val', 'test']
     
-    for split in splits:
-        print(f"\n{'='*70}")
-        print(f"Processing {split.upper()} split...")
-        print('='*70)
-        
-        # Paths for this split
-        json_path = os.path.join(input_base_dir, split, 'labels.json')
-        images_src_dir = os.path.join(input_base_dir, split, 'data')
-        
-        # Check if files exist
-        if not os.path.exists(json_path):
-            print(f"⚠ Skipping: {json_path} not found")
-            continue
+    with ProgressJournal(output_base_dir, 'convert_to_yolo') as journal:
+        if journal.resumed:
+            print(f"↻ Resuming: {len(journal)} images already converted "
+                  f"({journal.stale_temp_files} partial files cleaned up)")
+    
+        for split in splits:
+            print(f"\n{'='*70}")
+            print(f"Processing {split.upper()} split...")
+            print('='*70)
         
-        # Create output directories
-        images_dest_dir = os.path.join(output_base_dir, split, 'images')
-        labels_dest_dir = os.path.join(output_base_dir, split, 'labels')
-        os.makedirs(images_dest_dir, exist_ok=True)
-        os.makedirs(labels_dest_dir, exist_ok=True)
+            # Paths for this split
+            json_path = os.path.join(input_base_dir, split, 'labels.json')
+            images_src_dir = os.path.join(input_base_dir, split, 'data')
         
-        # Load JSON
-        print(f"Loading {json_path}...")
-        with open(json_path, 'r') as f:
-            coco_data = json.load(f)
+            # Check if files exist
+            if not os.path.exists(json_path):
+                print(f"⚠ Skipping: {json_path} not found")
+                continue
         
-        image_info = {img['id']: img for img in coco_data['images']}
+            # Create output directories
+            images_dest_dir = os.path.join(output_base_dir, split, 'images')
+            labels_dest_dir = os.path.join(output_base_dir, split, 'labels')
+            os.makedirs(images_dest_dir, exist_ok=True)
+            os.makedirs(labels_dest_dir, exist_ok=True)
         
-        # Group annotations by image
-        annotations_by_image = {}
-        for ann in coco_data['annotations']:
-            img_id = ann['image_id']
-            if img_id not in annotations_by_image:
-                annotations_by_image[img_id] = []
-            annotations_by_image[img_id].append(ann)
+            # Load JSON
+            print(f"Loading {json_path}...")
+            with metrics.stage('json_parse'):
+                with open(json_path, 'r') as f:
+                    coco_data = json.load(f)
+            metrics.count('json_bytes', os.path.getsize(json_path))
         
-        print(f"Converting {len(annotations_by_image)} images...")
-        converted_images = 0
-        total_annotations = 0
+            with metrics.stage('file_discovery'):
+                image_info = {img['id']: img for img in coco_data['images']}
+
+                # Group annotations by image
+                annotations_by_image = {}
+                for ann in coco_data['annotations']:
+                    img_id = ann['image_id']
+                    if img_id not in annotations_by_image:
+                        annotations_by_image[img_id] = []
+                    annotations_by_image[img_id].append(ann)
         
-        for img_id, annotations in annotations_by_image.items():
-            img = image_info[img_id]
-            img_filename = img['file_name']
-            img_width = img['width']
-            img_height = img['height']
-            
-            # Copy image
-            src_image = os.path.join(images_src_dir, img_filename)
-            dest_image = os.path.join(images_dest_dir, img_filename)
-            
-            if os.path.exists(src_image):
-                shutil.copy2(src_image, dest_image)
-            else:
-                print(f"  ⚠ Image not found: {img_filename}")
-                continue
-            
-            # Create label file
-            label_filename = os.path.splitext(img_filename)[0] + '.txt'
-            label_path = os.path.join(labels_dest_dir, label_filename)
-            
-            with open(label_path, 'w') as f:
-                for ann in annotations:
-                    coco_cat_id = ann['category_id']
-                    class_id = category_to_yolo.get(coco_cat_id)
-                    
-                    if class_id is None:
-                        continue
-                    
-                    segmentation = ann['segmentation'][0] if ann['segmentation'] else []
-                    if not segmentation:
+            print(f"Converting {len(annotations_by_image)} images...")
+            converted_images = 0
+            total_annotations = 0
+            multi_polygon_annotations = 0
+            rle_annotations = 0
+
+            tasks = [
+                (image_info[img_id], annotations, category_to_yolo,
+                 images_src_dir, images_dest_dir, labels_dest_dir)
+                for img_id, annotations in annotations_by_image.items()
+                if f"{split}/{image_info[img_id]['file_name']}" not in journal
+            ]
+            if len(tasks) < len(annotations_by_image):
+                print(f"  Skipping {len(annotations_by_image) - len(tasks)} images converted by a previous run")
+                for img in coco_data['images']:
+                    info = journal.get(f"{split}/{img['file_name']}")
+                    if info:
+                        annotations, multi_polygon, rle = map(int, info.split(','))
+                        converted_images += 1
+                        total_annotations += annotations
+                        multi_polygon_annotations += multi_polygon
+                        rle_annotations += rle
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=install_budget, initargs=(budget,)) as pool:
+                chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+                for img_filename, counts in pool.map(_convert_image_task, tasks, chunksize=chunksize):
+                    if counts is None:
+                        print(f"  ⚠ Image not found: {img_filename}")
+                        metrics.count('missing_images')
                         continue
-                    
-                    # Normalize coordinates
-                    normalized_coords = []
-                    for i in range(0, len(segmentation), 2):
-                        x = max(0.0, min(1.0, segmentation[i] / img_width))
-                        y = max(0.0, min(1.0, segmentation[i + 1] / img_height))
-                        normalized_coords.extend([x, y])
-                    
-                    line = f"{class_id} " + " ".join([f"{coord:.6f}" for coord in normalized_coords])
-                    f.write(line + '\n')
-                    total_annotations += 1
-            
-            converted_images += 1
-            if converted_images % 100 == 0:
-                print(f"  Processed {converted_images} images...")
+
+                    journal.mark(f"{split}/{img_filename}",
+                                 f"{counts['annotations']},{counts['multi_polygon']},{counts['rle']}")
+                    metrics.merge(counts['metrics'])
+                    total_annotations += counts['annotations']
+                    multi_polygon_annotations += counts['multi_polygon']
+                    rle_annotations += counts['rle']
+
+                    converted_images += 1
+                    if converted_images % 100 == 0:
+                        print(f"  Processed {converted_images} images...")
         
-        print(f"\n✓ {split.upper()} complete:")
-        print(f"  - Images: {converted_images}")
-        print(f"  - Annotations: {total_annotations}")
+            print(f"\n✓ {split.upper()} complete:")
+            print(f"  - Images: {converted_images}")
+            print(f"  - Annotations: {total_annotations}")
+            print(f"  - Multi-part polygons merged: {multi_polygon_annotations} (previously truncated to first part)")
+            print(f"  - RLE masks decoded: {rle_annotations} (previously unsupported)")
+            metrics.count('images', converted_images)
+            metrics.count('annotations', total_annotations)
     
-    # Create data.yaml
-    yaml_path = os.path.join(output_base_dir, 'data.yaml')
-    with open(yaml_path, 'w') as f:
-        f.write("# YOLO Dataset Configuration\n\n")
-        f.write(f"path: {os.path.abspath(output_base_dir)}\n")
-        f.write("train: train/images\n")
-        f.write("val: val/images\n")
-        f.write("test: test/images\n\n")
-        f.write("# Classes\n")
-        f.write(f"nc: {len(class_names)}\n")
-        f.write("names:\n")
-        for idx, class_name in enumerate(class_names):
-            f.write(f"  {idx}: {class_name}\n")
+        # Create data.yaml
+        yaml_path = os.path.join(output_base_dir, 'data.yaml')
+        with open(yaml_path, 'w') as f:
+            f.write("# YOLO Dataset Configuration\n\n")
+            f.write("train: train/images\n")
+            f.write("val: val/images\n")
+            f.write("test: test/images\n\n")
+            f.write("# Classes\n")
+            f.write(f"nc: {len(class_names)}\n")
+            f.write("names:\n")
+            for idx, class_name in enumerate(class_names):
+                f.write(f"  {idx}: {class_name}\n")
     
-    # Create classes.txt
-    classes_path = os.path.join(output_base_dir, 'classes.txt')
-    with open(classes_path, 'w') as f:
-        for class_name in class_names:
-            f.write(f"{class_name}\n")
+        # Create classes.txt
+        classes_path = os.path.join(output_base_dir, 'classes.txt')
+        with open(classes_path, 'w') as f:
+            for class_name in class_names:
+                f.write(f"{class_name}\n")
     
-    print(f"\n{'='*70}")
-    print("✓ CONVERSION COMPLETE!")
-    print('='*70)
-    print(f"Output: {os.path.abspath(output_base_dir)}")
-    print("\nFiles created:")
-    print("  - data.yaml")
-    print("  - classes.txt")
-    print("  - train/images/ and train/labels/")
-    print("  - val/images/ and val/labels/")
-    print("  - test/images/ and test/labels/")
-    print('='*70)
+        print(f"\n{'='*70}")
+        print("✓ CONVERSION COMPLETE!")
+        print('='*70)
+        print(f"Output: {os.path.abspath(output_base_dir)}")
+        print("\nFiles created:")
+        print("  - data.yaml")
+        print("  - classes.txt")
+        print("  - train/images/ and train/labels/")
+        print("  - val/images/ and val/labels/")
+        print("  - test/images/ and test/labels/")
+        print('='*70)
+
+    metrics.finish()
 
 
 # Run the conversion
 # Current directory is D:\swm\original_datasets\zerowaste-f-final
 # So we use '.' for current directory
-create_yolo_dataset('.', 'yolo_dataset')
+# (guarded so process pool workers can re-import this module safely)
+if __name__ == "__main__":
+    create_yolo_dataset('.', 'yolo_dataset')